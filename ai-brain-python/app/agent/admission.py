@@ -0,0 +1,168 @@
+from typing import Dict, List, Optional
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+
+
+# Lower value is admitted first when chat slots are contended
+URGENCY_PRIORITY = {"high": 0, "medium": 1, "low": 2}
+
+
+class AdmissionRejected(Exception):
+    """Raised when a chat turn cannot be admitted; maps to 429"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """An admitted chat turn holding a global slot and its user's lock"""
+
+    def __init__(self, user_key: str, priority: int, waited: float):
+        self.user_key = user_key
+        self.priority = priority
+        self.waited = waited
+        self.started_at = time.monotonic()
+        self.released = False
+
+
+class AdmissionController:
+    """Global concurrency limit with a bounded priority wait queue.
+
+    At most CHAT_MAX_CONCURRENCY turns run at once; up to CHAT_QUEUE_SIZE
+    more wait for a slot, most urgent conversations first. Turns from the
+    same user run one at a time in arrival order, with at most
+    CHAT_USER_QUEUE of them pending. Anything beyond that, or waiting
+    longer than CHAT_QUEUE_TIMEOUT seconds, is rejected with a Retry-After
+    estimate.
+    """
+
+    def __init__(self):
+        self.max_active = int(os.getenv("CHAT_MAX_CONCURRENCY", 32))
+        self.max_waiting = int(os.getenv("CHAT_QUEUE_SIZE", 128))
+        self.max_user_pending = int(os.getenv("CHAT_USER_QUEUE", 4))
+        self.wait_timeout = float(os.getenv("CHAT_QUEUE_TIMEOUT", 30))
+        self._active = 0
+        self._waiters: List = []  # heap of [priority, seq, future]
+        self._seq = itertools.count()
+        self._users: Dict[str, List] = {}  # user key -> [lock, pending turns]
+        self._service_seconds = 1.0  # moving average of slot hold time
+        self._counters = {"admitted": 0, "rejected_full": 0, "rejected_user": 0, "timed_out": 0}
+        self._admitted_by_urgency = {urgency: 0 for urgency in URGENCY_PRIORITY}
+        self._wait_seconds = 0.0
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free, from queue depth and hold time"""
+        backlog = (len(self._waiters) + 1) / max(1, self.max_active)
+        return max(1, math.ceil(self._service_seconds * backlog))
+
+    async def acquire(self, user_key: str, urgency: Optional[str] = None) -> Ticket:
+        """Wait for this user's previous turn and a global slot"""
+        urgency = urgency if urgency in URGENCY_PRIORITY else "low"
+        priority = URGENCY_PRIORITY[urgency]
+        entry = self._users.get(user_key)
+        if entry is None:
+            entry = self._users[user_key] = [asyncio.Lock(), 0]
+        if entry[1] >= self.max_user_pending:
+            self._counters["rejected_user"] += 1
+            raise AdmissionRejected("Too many pending messages for this user", self.retry_after())
+
+        entry[1] += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(entry[0].acquire(), self.wait_timeout)
+            try:
+                remaining = self.wait_timeout - (time.monotonic() - started)
+                await self._acquire_slot(priority, max(0.0, remaining))
+            except BaseException:
+                entry[0].release()
+                raise
+        except asyncio.TimeoutError:
+            self._counters["timed_out"] += 1
+            self._leave(user_key, entry)
+            raise AdmissionRejected("Timed out waiting for a free slot", self.retry_after())
+        except BaseException:
+            self._leave(user_key, entry)
+            raise
+
+        waited = time.monotonic() - started
+        self._counters["admitted"] += 1
+        self._admitted_by_urgency[urgency] += 1
+        self._wait_seconds += waited
+        return Ticket(user_key, priority, waited)
+
+    def release(self, ticket: Ticket):
+        """Free the ticket's slot and user lock; safe to call more than once"""
+        if ticket.released:
+            return
+        ticket.released = True
+        held = time.monotonic() - ticket.started_at
+        self._service_seconds = 0.8 * self._service_seconds + 0.2 * held
+        self._release_slot()
+        entry = self._users.get(ticket.user_key)
+        if entry is not None:
+            entry[0].release()
+            self._leave(ticket.user_key, entry)
+
+    async def _acquire_slot(self, priority: int, timeout: float):
+        if self._active < self.max_active and not self._waiters:
+            self._active += 1
+            return
+        if len(self._waiters) >= self.max_waiting:
+            self._counters["rejected_full"] += 1
+            raise AdmissionRejected("Server busy, queue is full", self.retry_after())
+
+        waiter = [priority, next(self._seq), asyncio.get_running_loop().create_future()]
+        heapq.heappush(self._waiters, waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter[2]), timeout)
+        except BaseException:
+            if waiter[2].done():
+                # The slot was handed over just as we gave up: pass it on
+                self._release_slot()
+            else:
+                waiter[2].cancel()
+                self._waiters.remove(waiter)
+                heapq.heapify(self._waiters)
+            raise
+
+    def _release_slot(self):
+        """Hand the slot to the most urgent waiter, or free it"""
+        while self._waiters:
+            waiter = heapq.heappop(self._waiters)
+            if not waiter[2].done():
+                waiter[2].set_result(None)
+                return
+        self._active -= 1
+
+    def _leave(self, user_key: str, entry: List):
+        entry[1] -= 1
+        if entry[1] <= 0 and self._users.get(user_key) is entry:
+            del self._users[user_key]
+
+    def stats(self) -> Dict:
+        admitted = self._counters["admitted"]
+        return {
+            "active": self._active,
+            "waiting": len(self._waiters),
+            "waiting_by_priority": {
+                urgency: sum(1 for waiter in self._waiters if waiter[0] == priority)
+                for urgency, priority in URGENCY_PRIORITY.items()
+            },
+            "users_pending": len(self._users),
+            "max_active": self.max_active,
+            "max_waiting": self.max_waiting,
+            **self._counters,
+            "admitted_by_urgency": dict(self._admitted_by_urgency),
+            "avg_wait_ms": round(self._wait_seconds / admitted * 1000, 1) if admitted else 0.0,
+            "avg_service_ms": round(self._service_seconds * 1000, 1),
+            "retry_after": self.retry_after()
+        }
+
+
+# Singleton instance
+admission = AdmissionController()
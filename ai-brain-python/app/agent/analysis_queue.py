@@ -0,0 +1,228 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+from langchain_core.messages import BaseMessage
+from .analyzer import analyze_conversation
+from .memory import memory
+from .outbox import outbox
+from urllib.parse import urlsplit
+import asyncio
+import httpx
+import os
+import time
+import uuid
+
+
+class AnalysisJob:
+    """A queued conversation analysis and its eventual result"""
+
+    def __init__(self, messages: List[BaseMessage], known_entities: Dict,
+                 conversation_id: Optional[str] = None, callback_url: Optional[str] = None,
+                 context: Optional[Dict] = None, offset: int = 0, session_id: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.messages = messages
+        self.known_entities = known_entities
+        self.conversation_id = conversation_id
+        self.offset = offset  # messages the session trimmed before ``messages``
+        self.session_id = session_id  # server-side session that gets the extracted entities
+        self.callback_url = callback_url
+        self.context = context or {}
+        self.status = "queued"
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "analysis_id": self.id,
+            "status": self.status,
+            "metadata": self.result,
+            "error": self.error,
+            **self.context
+        }
+
+
+class AnalysisQueue:
+    """Bounded in-process worker pool for deferred conversation analysis.
+
+    Finished jobs are kept for ANALYSIS_RESULT_TTL seconds (at most
+    ANALYSIS_MAX_RESULTS of them) so callers can poll for them, and are
+    POSTed to the job's callback URL, or to ANALYSIS_CALLBACK_URL. A
+    caller-supplied callback must be under one of the comma-separated
+    ANALYSIS_CALLBACK_ALLOWLIST URLs.
+    """
+
+    def __init__(self):
+        self.workers = int(os.getenv("ANALYSIS_WORKERS", 4))
+        self.max_queue = int(os.getenv("ANALYSIS_QUEUE_SIZE", 1000))
+        self.result_ttl = float(os.getenv("ANALYSIS_RESULT_TTL", 600))
+        self.max_results = int(os.getenv("ANALYSIS_MAX_RESULTS", 10000))
+        self.callback_url = os.getenv("ANALYSIS_CALLBACK_URL") or None
+        self.callback_allowlist = [
+            url.strip() for url in os.getenv("ANALYSIS_CALLBACK_ALLOWLIST", "").split(",") if url.strip()
+        ]
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._jobs: "OrderedDict[str, AnalysisJob]" = OrderedDict()
+        self._finished: "OrderedDict[str, float]" = OrderedDict()  # job id -> finished_at, in finishing order
+        self._http: Optional[httpx.AsyncClient] = None
+        self._writes: Set[asyncio.Task] = set()
+        self._busy = 0
+        self._counters = {"submitted": 0, "rejected": 0, "completed": 0, "failed": 0, "callbacks_failed": 0}
+        self._analysis_seconds = 0.0
+        self._wait_seconds = 0.0
+
+    def _ensure_started(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def callback_allowed(self, url: str) -> bool:
+        """Whether a caller-supplied callback URL is under an allowlisted URL (same scheme, host and port)"""
+        try:
+            target = urlsplit(url)
+            for allowed in map(urlsplit, self.callback_allowlist):
+                if (
+                    (target.scheme, target.hostname, target.port) == (allowed.scheme, allowed.hostname, allowed.port)
+                    and (target.path + "/").startswith(allowed.path.rstrip("/") + "/")
+                ):
+                    return True
+        except ValueError:
+            pass
+        return False
+
+    def _evict(self):
+        """Drop expired and excess finished jobs (first finished first); queued and running jobs stay"""
+        now = time.time()
+        while self._finished:
+            job_id, finished_at = next(iter(self._finished.items()))
+            if len(self._jobs) <= self.max_results and now - finished_at <= self.result_ttl:
+                break
+            del self._finished[job_id]
+            self._jobs.pop(job_id, None)
+
+    def submit(self, messages: List[BaseMessage], known_entities: Dict,
+               conversation_id: Optional[str] = None, callback_url: Optional[str] = None,
+               context: Optional[Dict] = None, offset: int = 0,
+               session_id: Optional[str] = None) -> Optional[str]:
+        """Queue an analysis; returns its id, or None if the queue is full"""
+        self._ensure_started()
+        job = AnalysisJob(messages, known_entities, conversation_id, callback_url or self.callback_url, context,
+                          offset, session_id)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._counters["rejected"] += 1
+            return None
+        self._evict()
+        self._jobs[job.id] = job
+        self._counters["submitted"] += 1
+        if memory.shared:
+            task = asyncio.create_task(self._publish(job))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+        return job.id
+
+    async def _publish(self, job: AnalysisJob):
+        """Copy the job's status to the shared session backend, for polls that reach another worker"""
+        try:
+            await memory.save_record(f"analysis:{job.id}", job.to_dict())
+        except Exception as e:
+            print(f"Analysis status write error: {e}")
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        self._evict()
+        return self._jobs.get(job_id)
+
+    async def lookup(self, job_id: str) -> Optional[Dict]:
+        """Status and result of a job run by this or (with a shared session backend) any worker"""
+        job = self.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if memory.shared:
+            return await memory.get_record(f"analysis:{job_id}")
+        return None
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            self._busy += 1
+            job.status = "running"
+            job.started_at = time.time()
+            self._wait_seconds += job.started_at - job.created_at
+            try:
+                job.result = await analyze_conversation(
+                    job.messages, job.known_entities, conversation_id=job.conversation_id, offset=job.offset
+                )
+                job.status = "done"
+                self._counters["completed"] += 1
+                await outbox.enqueue(job.context.get("user_id"), job.context.get("platform"), job.result,
+                                     job.conversation_id, job.known_entities)
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+                self._counters["failed"] += 1
+            finally:
+                job.finished_at = time.time()
+                self._finished[job.id] = job.finished_at
+                self._analysis_seconds += job.finished_at - job.started_at
+                # The transcript is no longer needed once analyzed
+                job.messages = []
+                self._busy -= 1
+                self._queue.task_done()
+
+            if job.session_id and job.status == "done":
+                try:
+                    await memory.merge_entities(job.session_id, job.result.get("new_entities", {}))
+                except Exception as e:
+                    print(f"Analysis session update error: {e}")
+
+            if memory.shared:
+                await self._publish(job)
+
+            if job.callback_url:
+                await self._deliver(job)
+
+    async def _deliver(self, job: AnalysisJob):
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=float(os.getenv("ANALYSIS_CALLBACK_TIMEOUT", 10)))
+        try:
+            resp = await self._http.post(job.callback_url, json=job.to_dict())
+            resp.raise_for_status()
+        except Exception as e:
+            self._counters["callbacks_failed"] += 1
+            print(f"Analysis callback error ({job.callback_url}): {e}")
+
+    def stats(self) -> Dict:
+        finished = self._counters["completed"] + self._counters["failed"]
+        return {
+            "workers": self.workers,
+            "busy_workers": self._busy,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "max_queue": self.max_queue,
+            "stored_results": len(self._jobs),
+            **self._counters,
+            "avg_wait_seconds": round(self._wait_seconds / finished, 4) if finished else 0.0,
+            "avg_analysis_seconds": round(self._analysis_seconds / finished, 4) if finished else 0.0
+        }
+
+    async def stop(self, drain_timeout: float = 0):
+        """Optionally finish queued jobs, then cancel the workers and close the callback client"""
+        if self._queue is not None and drain_timeout > 0:
+            try:
+                await asyncio.wait_for(self._queue.join(), drain_timeout)
+            except asyncio.TimeoutError:
+                print(f"Analysis queue not drained after {drain_timeout:g}s; {self._queue.qsize()} jobs dropped")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+# Singleton instance
+analysis_queue = AnalysisQueue()
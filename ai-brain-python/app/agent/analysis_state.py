@@ -0,0 +1,121 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from langchain_core.messages import BaseMessage
+from .rules import score_components
+import hashlib
+import os
+import time
+
+
+def analyzed_end(messages: List[BaseMessage]) -> int:
+    """Index just after the last user message"""
+    for i in range(len(messages) - 1, -1, -1):
+        if messages[i].type == "human":
+            return i + 1
+    return 0
+
+
+def anchor(messages: List[BaseMessage], end: int) -> Optional[str]:
+    """Hash of the user message just before ``end`` (None if there is none)"""
+    if end <= 0 or end > len(messages) or messages[end - 1].type != "human":
+        return None
+    return hashlib.sha256(str(messages[end - 1].content).encode()).hexdigest()
+
+
+class AnalysisState:
+    """Compact running analysis of one conversation"""
+
+    def __init__(self):
+        self.entities: Dict[str, str] = {}
+        self.intent = "general_inquiry"
+        self.sentiment = "neutral"
+        self.lead_score = 0
+        self.urgency = "low"
+        self.score_components: Dict[str, int] = {}
+        self.analyzed_count = 0  # user messages already folded into this state
+        self.analyzed_end = 0  # absolute message index just after the last analyzed user message
+        self.anchor: Optional[str] = None  # hash of that user message
+        self.turns_since_full = 0
+        self.last_result: Dict = {}
+        self.updated_at = time.time()
+
+    def summary(self) -> Dict:
+        """What the incremental analyzer prompt sees instead of the transcript"""
+        return {
+            "known_entities": self.entities,
+            "intent": self.intent,
+            "sentiment": self.sentiment,
+            "lead_score": self.lead_score,
+            "urgency": self.urgency,
+            "score_components": self.score_components,
+            "user_messages_analyzed": self.analyzed_count
+        }
+
+    def position(self, messages: List[BaseMessage], offset: int = 0) -> Optional[int]:
+        """Index in ``messages`` where the unanalyzed messages start, or None if the history changed.
+
+        ``offset`` is the absolute index of messages[0] (messages the session
+        trimmed). A history capped by the caller without an offset shifts
+        left as it grows, so the last analyzed user message is searched for.
+        """
+        if self.anchor is None:
+            return None
+        end = self.analyzed_end - offset
+        if anchor(messages, end) == self.anchor:
+            return end
+        for end in range(min(end, len(messages)) - 1, 0, -1):
+            if anchor(messages, end) == self.anchor:
+                return end
+        return None
+
+    def update(self, result: Dict, known_entities: Dict, messages: List[BaseMessage], offset: int,
+               analyzed: int, full: bool):
+        """Fold an analysis of ``analyzed`` more user messages (all of them if full) into the running state"""
+        self.entities = {**self.entities, **known_entities, **result.get("new_entities", {})}
+        self.intent = result["intent"]
+        self.sentiment = result["sentiment"]
+        self.lead_score = result["lead_score"]
+        self.urgency = result["urgency"]
+        self.score_components = score_components(self.entities, self.intent, self.sentiment)
+        self.analyzed_count = analyzed if full else self.analyzed_count + analyzed
+        end = analyzed_end(messages)
+        self.analyzed_end = offset + end
+        self.anchor = anchor(messages, end)
+        self.turns_since_full = 0 if full else self.turns_since_full + 1
+        self.last_result = result
+        self.updated_at = time.time()
+
+
+class AnalysisStateStore:
+    """LRU/TTL-bounded map of conversation id -> AnalysisState"""
+
+    def __init__(self):
+        self.max_size = int(os.getenv("ANALYSIS_STATE_MAX", 10000))
+        self.ttl = float(os.getenv("ANALYSIS_STATE_TTL", 86400))
+        self._states: "OrderedDict[str, AnalysisState]" = OrderedDict()
+
+    def get(self, conversation_id: str) -> Optional[AnalysisState]:
+        state = self._states.get(conversation_id)
+        if state is None:
+            return None
+        if time.time() - state.updated_at > self.ttl:
+            del self._states[conversation_id]
+            return None
+        self._states.move_to_end(conversation_id)
+        return state
+
+    def put(self, conversation_id: str, state: AnalysisState):
+        self._states[conversation_id] = state
+        self._states.move_to_end(conversation_id)
+        while len(self._states) > self.max_size:
+            self._states.popitem(last=False)
+
+    def clear(self, conversation_id: str):
+        self._states.pop(conversation_id, None)
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+
+# Singleton instance
+analysis_states = AnalysisStateStore()
@@ -1,47 +1,21 @@
 from typing import List, Dict, Optional
 from langchain_core.messages import BaseMessage, SystemMessage
-from langchain_openai import ChatOpenAI
+from .registry import registry
+from .analysis_state import AnalysisState, analysis_states
+from .resilience import resilience
+from .rules import apply_rules, needs_llm
+from app.metrics import ANALYZER_SECONDS, track_llm
 import json
+import os
 
 
-def analyze_conversation_with_ai(messages: List[BaseMessage], known_entities: Dict) -> Dict:
-    """Complete AI-powered conversation analysis using GPT-4o-mini"""
-    
-    # Extract only user messages
-    user_messages = [
-        msg.content for msg in messages 
-        if msg.__class__.__name__ == "HumanMessage" and hasattr(msg, 'content')
-    ]
-    
-    if not user_messages:
-        return {
-            "new_entities": {},
-            "intent": "general_inquiry",
-            "sentiment": "neutral",
-            "confidence": 0.5,
-            "lead_score": 0,
-            "urgency": "low",
-            "suggested_action": "continue_conversation",
-            "should_notify_sales": False
-        }
-    
-    conversation = "\n".join([f"User: {msg}" for msg in user_messages])
-    
-    analysis_prompt = f"""You are an expert lead qualification analyst for LeadgenLite, a lead generation platform.
+ANALYST_INTRO = "You are an expert lead qualification analyst for LeadgenLite, a lead generation platform."
 
-Analyze the following user conversation and provide a comprehensive analysis.
-
-**Already Known Information:**
-{json.dumps(known_entities, indent=2)}
-
-**User Conversation:**
-{conversation}
-
-**Your Task:**
+ANALYSIS_INSTRUCTIONS = """**Your Task:**
 Provide a detailed JSON analysis with the following structure:
 
-{{
-  "new_entities": {{
+{
+  "new_entities": {
     // Extract ONLY information the user explicitly mentioned about THEMSELVES
     // Do NOT include: product names, features, or information from responses
     // Only include fields where user provided NEW information not in "Already Known"
@@ -54,7 +28,7 @@ Provide a detailed JSON analysis with the following structure:
     "budget": "user's budget or price range (if mentioned)",
     "team_size": "user's team size as number or range (if mentioned)",
     "use_case": "what user wants to use product for (if mentioned)"
-  }},
+  },
   
   "intent": "primary intent - choose ONE:",
   // Options:
@@ -103,7 +77,7 @@ Provide a detailed JSON analysis with the following structure:
   // false otherwise
   
   "reasoning": "brief explanation of your analysis (1-2 sentences)"
-}}
+}
 
 **Critical Rules:**
 1. Extract ONLY what the USER said about THEMSELVES
@@ -113,62 +87,425 @@ Provide a detailed JSON analysis with the following structure:
 5. Be precise with intent - choose the PRIMARY intent
 6. Calculate lead_score accurately using the formula provided
 
-Return ONLY valid JSON, no markdown, no explanations outside the JSON.
+Return ONLY valid JSON, no markdown, no explanations outside the JSON."""
+
+EMPTY_ANALYSIS = {
+    "new_entities": {},
+    "intent": "general_inquiry",
+    "sentiment": "neutral",
+    "confidence": 0.5,
+    "lead_score": 0,
+    "urgency": "low",
+    "suggested_action": "continue_conversation",
+    "should_notify_sales": False
+}
+
+# How each analysis was produced, for monitoring
+ANALYSIS_COUNTERS = {
+    "full": 0, "incremental": 0, "local": 0, "cached": 0, "fallback": 0,
+    "combined": 0, "combined_invalid": 0, "fast_path": 0, "deadline": 0
+}
+
+ENTITY_FIELDS = ("name", "email", "phone", "company", "job_title", "plan_interest", "budget", "team_size", "use_case")
+INTENTS = ("pricing_inquiry", "demo_request", "feature_inquiry", "support", "complaint", "general_inquiry")
+SENTIMENTS = ("positive", "neutral", "negative")
+URGENCIES = ("high", "medium", "low")
+
+# Combined mode (COMBINED_ANALYSIS=true): the agent's final answer is a call to a
+# reply tool that carries the analysis too, so a turn needs no separate analyzer call
+COMBINED_INSTRUCTIONS = """**Response Format:**
+Always answer the user by calling reply_with_analysis (call the other tools first if you need them) with:
+- reply: your message to the user, written exactly as you normally would
+- analysis: a lead analysis of the USER's messages in this conversation
+
+Already known about the user (do not repeat in new_entities):
+{known_entities}
+
+Analysis fields:
+- new_entities: details the user stated about THEMSELVES that are not already known; null when not mentioned. Never product names, features or prices.
+- intent: pricing_inquiry, demo_request, feature_inquiry, support, complaint or general_inquiry (the PRIMARY intent)
+- sentiment: positive, neutral or negative
+- confidence: 0.0-1.0
+- lead_score: 0-100 (name +10, email +15, phone +10, company +5; demo_request +30, pricing_inquiry +25, feature +20, general +10, support +5; positive +15, neutral +10; plan_interest +10, budget +5)
+- urgency: high (demo request, positive pricing inquiry, complaint), medium (budget or plan interest) or low
+- suggested_action: schedule_demo, send_pricing_proposal or sales_follow_up (score 70+); send_pricing_info, send_feature_guide or nurture_lead (50-69); continue_conversation (below 50)
+- should_notify_sales: true if lead_score >= 70"""
+
+COMBINED_TOOL_NAME = "reply_with_analysis"
+
+# Final-answer tool for combined mode; strict so the arguments always match the schema
+COMBINED_REPLY_TOOL = {
+    "type": "function",
+    "function": {
+        "name": COMBINED_TOOL_NAME,
+        "description": "Send your final reply to the user together with the lead analysis",
+        "strict": True,
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "reply": {"type": "string"},
+                "analysis": {
+                    "type": "object",
+                    "properties": {
+                        "new_entities": {
+                            "type": "object",
+                            "properties": {field: {"type": ["string", "null"]} for field in ENTITY_FIELDS},
+                            "required": list(ENTITY_FIELDS),
+                            "additionalProperties": False
+                        },
+                        "intent": {"type": "string", "enum": list(INTENTS)},
+                        "sentiment": {"type": "string", "enum": list(SENTIMENTS)},
+                        "confidence": {"type": "number"},
+                        "lead_score": {"type": "integer"},
+                        "urgency": {"type": "string", "enum": list(URGENCIES)},
+                        "suggested_action": {"type": "string"},
+                        "should_notify_sales": {"type": "boolean"}
+                    },
+                    "required": [
+                        "new_entities", "intent", "sentiment", "confidence", "lead_score",
+                        "urgency", "suggested_action", "should_notify_sales"
+                    ],
+                    "additionalProperties": False
+                }
+            },
+            "required": ["reply", "analysis"],
+            "additionalProperties": False
+        }
+    }
+}
+
+FALLBACK_ANALYSIS = {
+    "new_entities": {},
+    "intent": "general_inquiry",
+    "sentiment": "neutral",
+    "confidence": 0.3,
+    "lead_score": 10,
+    "urgency": "low",
+    "suggested_action": "continue_conversation",
+    "should_notify_sales": False,
+    "fallback": True  # not from the model; never cached
+}
+
+
+def extract_user_messages(messages: List[BaseMessage]) -> List[str]:
+    """Extract only user messages"""
+    return [
+        msg.content for msg in messages 
+        if msg.__class__.__name__ == "HumanMessage" and hasattr(msg, 'content')
+    ]
+
+
+def rules_enabled() -> bool:
+    return os.getenv("RULE_SCORING", "true").lower() == "true"
+
+
+def finalize_analysis(result: Dict, known_entities: Dict, user_messages: List[str]) -> Dict:
+    """Apply code-computed scoring to a model result (its entities are taken as they are)"""
+    if not rules_enabled():
+        return result
+    return apply_rules(result, known_entities, "\n".join(user_messages), extract=False)
+
+
+def build_analysis_prompt(user_messages: List[str], known_entities: Dict) -> str:
+    """Prompt for a full analysis of the whole user transcript"""
+    conversation = "\n".join([f"User: {msg}" for msg in user_messages])
+    
+    return f"""{ANALYST_INTRO}
+
+Analyze the following user conversation and provide a comprehensive analysis.
+
+**Already Known Information:**
+{json.dumps(known_entities, indent=2)}
+
+**User Conversation:**
+{conversation}
+
+{ANALYSIS_INSTRUCTIONS}
 """
+
+
+def build_incremental_prompt(state: AnalysisState, new_messages: List[str], known_entities: Dict) -> str:
+    """Prompt that updates a running analysis with only the new user messages"""
+    summary = state.summary()
+    summary["known_entities"] = {**summary["known_entities"], **known_entities}
+    conversation = "\n".join([f"User: {msg}" for msg in new_messages])
     
+    return f"""{ANALYST_INTRO}
+
+You are updating an existing analysis of an ongoing conversation. Earlier user messages have already been analyzed; their results are summarized below.
+
+**Current Analysis State (earlier messages):**
+{json.dumps(summary, indent=2)}
+
+**New User Messages:**
+{conversation}
+
+Treat "known_entities" in the state as "Already Known Information". Extract new_entities ONLY from the new messages. Intent, sentiment, lead_score and urgency must describe the conversation as a whole (state plus new messages).
+
+{ANALYSIS_INSTRUCTIONS}
+"""
+
+
+def parse_json_content(content: str):
+    """Parse a JSON model answer, tolerating markdown code fences"""
+    content = content.strip()
+    
+    # Remove markdown code blocks if present
+    if content.startswith("```"):
+        lines = content.split("\n")
+        content = "\n".join(lines[1:-1]) if len(lines) > 2 else content
+        if content.startswith("json"):
+            content = content[4:].strip()
+    
+    return json.loads(content)
+
+
+def normalize_analysis(analysis: Dict) -> Dict:
+    """Coerce a raw model analysis into the Metadata fields"""
+    # Remove reasoning field (internal only)
+    if "reasoning" in analysis:
+        del analysis["reasoning"]
+    
+    # Convert all entity values to strings
+    new_entities = analysis.get("new_entities", {})
+    for key, value in new_entities.items():
+        if value is not None:
+            new_entities[key] = str(value)
+    
+    # Ensure all required fields exist
+    return {
+        "new_entities": new_entities,
+        "intent": analysis.get("intent", "general_inquiry"),
+        "sentiment": analysis.get("sentiment", "neutral"),
+        "confidence": round(float(analysis.get("confidence", 0.5)), 2),
+        "lead_score": int(analysis.get("lead_score", 0)),
+        "urgency": analysis.get("urgency", "low"),
+        "suggested_action": analysis.get("suggested_action", "continue_conversation"),
+        "should_notify_sales": bool(analysis.get("should_notify_sales", False))
+    }
+
+
+async def run_analysis_prompt(prompt: str) -> Dict:
+    """Call the analyzer model and normalize its JSON answer (raises on failure)"""
+    llm = registry.chat_model()
+    
+    async def attempt():
+        with track_llm("analyzer", registry.model_name) as call:
+            call["response"] = await llm.ainvoke([SystemMessage(content=prompt)])
+            return call["response"]
+    
+    result = await resilience.call("analyzer", attempt)
+    return normalize_analysis(parse_json_content(result.content))
+
+
+def combined_enabled() -> bool:
+    return os.getenv("COMBINED_ANALYSIS", "false").lower() == "true"
+
+
+def combined_instructions(known_entities: Dict) -> str:
+    """System prompt addendum asking the agent to answer through the reply tool"""
+    return COMBINED_INSTRUCTIONS.format(known_entities=json.dumps(known_entities, ensure_ascii=False))
+
+
+def validate_combined(data) -> Optional[Dict]:
+    """Normalized analysis from reply_with_analysis arguments, or None if they do not validate"""
     try:
-        llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-        result = llm.invoke([SystemMessage(content=analysis_prompt)])
-        
-        # Parse JSON response
-        content = result.content.strip()
-        
-        # Remove markdown code blocks if present
-        if content.startswith("```"):
-            lines = content.split("\n")
-            content = "\n".join(lines[1:-1]) if len(lines) > 2 else content
-            if content.startswith("json"):
-                content = content[4:].strip()
-        
-        analysis = json.loads(content)
-        
-        # Remove reasoning field (internal only)
-        if "reasoning" in analysis:
-            del analysis["reasoning"]
-        
-        # Convert all entity values to strings
-        new_entities = analysis.get("new_entities", {})
-        for key, value in new_entities.items():
-            if value is not None:
-                new_entities[key] = str(value)
-        
-        # Ensure all required fields exist
-        return {
-            "new_entities": new_entities,
-            "intent": analysis.get("intent", "general_inquiry"),
-            "sentiment": analysis.get("sentiment", "neutral"),
-            "confidence": round(float(analysis.get("confidence", 0.5)), 2),
-            "lead_score": int(analysis.get("lead_score", 0)),
-            "urgency": analysis.get("urgency", "low"),
-            "suggested_action": analysis.get("suggested_action", "continue_conversation"),
-            "should_notify_sales": bool(analysis.get("should_notify_sales", False))
+        analysis = dict(data["analysis"])
+        if (
+            analysis["intent"] not in INTENTS
+            or analysis["sentiment"] not in SENTIMENTS
+            or analysis["urgency"] not in URGENCIES
+        ):
+            raise ValueError("unknown intent, sentiment or urgency")
+        analysis["new_entities"] = {
+            key: value for key, value in (analysis.get("new_entities") or {}).items()
+            if key in ENTITY_FIELDS and value not in (None, "")
         }
-        
+        return normalize_analysis(analysis)
+    except (KeyError, TypeError, ValueError) as e:
+        print(f"Combined analysis rejected: {e}")
+        return None
+
+
+def split_combined_reply(response):
+    """(reply text, analysis or None) for a final combined answer; None while the agent calls tools"""
+    for call in response.tool_calls:
+        if call["name"] == COMBINED_TOOL_NAME:
+            analysis = validate_combined(call["args"])
+            if analysis is None:
+                ANALYSIS_COUNTERS["combined_invalid"] += 1
+            return str(call["args"].get("reply", "")), analysis
+    
+    for call in getattr(response, "invalid_tool_calls", None) or []:
+        if call.get("name") == COMBINED_TOOL_NAME:
+            # Arguments were not valid JSON; salvage the reply text if possible
+            ANALYSIS_COUNTERS["combined_invalid"] += 1
+            try:
+                return str(json.loads(call.get("args") or "")["reply"]), None
+            except (ValueError, KeyError, TypeError):
+                return "", None
+    
+    if response.tool_calls:
+        return None
+    # The model answered in plain text instead of calling the reply tool
+    ANALYSIS_COUNTERS["combined_invalid"] += 1
+    return response.content, None
+
+
+def fallback_analysis(user_messages: List[str], known_entities: Dict,
+                      state: Optional[AnalysisState] = None, source: str = "fallback") -> Dict:
+    """Analysis without the model: carried-over intent, pattern-extracted entities, rule score"""
+    result = dict(FALLBACK_ANALYSIS)
+    known = known_entities
+    if state is not None and state.last_result:
+        result.update(intent=state.intent, sentiment=state.sentiment)
+        known = {**state.entities, **known_entities}
+    ANALYSIS_COUNTERS[source] += 1
+    if not rules_enabled():
+        return result
+    return apply_rules(result, known, "\n".join(user_messages))
+
+
+def deadline_analysis(messages: List[BaseMessage], known_entities: Dict, conversation_id: Optional[str],
+                      offset: int = 0) -> Dict:
+    """Rule-based metadata for a turn with no time left for the analyzer"""
+    state = analysis_states.get(conversation_id) if conversation_id else None
+    position = state.position(messages, offset) if state is not None else None
+    if position is not None:
+        return fallback_analysis(extract_user_messages(messages[position:]), known_entities, state,
+                                 source="deadline")
+    return fallback_analysis(extract_user_messages(messages), known_entities, source="deadline")
+
+
+async def analyze_conversation_with_ai(messages: List[BaseMessage], known_entities: Dict) -> Dict:
+    """Complete AI-powered conversation analysis using GPT-4o-mini"""
+    user_messages = extract_user_messages(messages)
+    
+    if not user_messages:
+        return dict(EMPTY_ANALYSIS)
+    
+    try:
+        result = await run_analysis_prompt(build_analysis_prompt(user_messages, known_entities))
+        ANALYSIS_COUNTERS["full"] += 1
+        return finalize_analysis(result, known_entities, user_messages)
     except Exception as e:
         print(f"AI analysis error: {e}")
-        # Fallback to basic analysis
-        return {
+        return fallback_analysis(user_messages, known_entities)
+
+
+async def analyze_conversation_incremental(messages: List[BaseMessage], known_entities: Dict,
+                                           conversation_id: str, offset: int = 0) -> Dict:
+    """Analyze only the user messages added since the last turn of this conversation.
+
+    A full re-analysis runs on the first turn, when the history no longer
+    matches the stored state, and every ANALYSIS_FULL_EVERY turns to
+    correct drift. Short follow-ups that cannot change intent or sentiment
+    are scored locally without calling the model. ``offset`` is the number
+    of older messages the session trimmed before ``messages``.
+    """
+    user_messages = extract_user_messages(messages)
+    
+    if not user_messages:
+        return dict(EMPTY_ANALYSIS)
+    
+    state = analysis_states.get(conversation_id)
+    position = state.position(messages, offset) if state is not None else None
+    full_every = int(os.getenv("ANALYSIS_FULL_EVERY", 10))
+    full = position is None or state.turns_since_full + 1 >= full_every
+    new_messages = user_messages if full else extract_user_messages(messages[position:])
+    
+    if not full and not new_messages:
+        # Nothing new since the last analysis; still counts toward the next full one
+        state.turns_since_full += 1
+        ANALYSIS_COUNTERS["cached"] += 1
+        return {**state.last_result, "new_entities": {}}
+    
+    if full:
+        state = AnalysisState()
+        known = known_entities
+    else:
+        known = {**state.entities, **known_entities}
+    
+    if not full and rules_enabled() and not needs_llm(new_messages):
+        # Intent and sentiment carry over; only entities and score can change
+        result = apply_rules({
             "new_entities": {},
-            "intent": "general_inquiry",
-            "sentiment": "neutral",
-            "confidence": 0.3,
-            "lead_score": 10,
-            "urgency": "low",
-            "suggested_action": "continue_conversation",
-            "should_notify_sales": False
-        }
+            "intent": state.intent,
+            "sentiment": state.sentiment,
+            "confidence": state.last_result.get("confidence", 0.5)
+        }, known, "\n".join(new_messages))
+        ANALYSIS_COUNTERS["local"] += 1
+    else:
+        try:
+            if full:
+                prompt = build_analysis_prompt(user_messages, known_entities)
+            else:
+                prompt = build_incremental_prompt(state, new_messages, known_entities)
+            result = await run_analysis_prompt(prompt)
+        except Exception as e:
+            print(f"AI analysis error: {e}")
+            # The stored state is left untouched
+            return fallback_analysis(new_messages, known_entities, None if full else state)
+        ANALYSIS_COUNTERS["full" if full else "incremental"] += 1
+        result = finalize_analysis(result, known, new_messages)
+    
+    state.update(result, known_entities, messages, offset, len(new_messages), full)
+    analysis_states.put(conversation_id, state)
+    return result
+
+
+def remember_analysis(messages: List[BaseMessage], known_entities: Dict, conversation_id: str,
+                      result: Dict, source: str = "cached", offset: int = 0) -> Dict:
+    """Record an analysis obtained without the analyzer (from a cache or combined mode)"""
+    if os.getenv("INCREMENTAL_ANALYSIS", "true").lower() == "true":
+        state = AnalysisState()
+        state.update(result, known_entities, messages, offset, len(extract_user_messages(messages)), full=True)
+        analysis_states.put(conversation_id, state)
+    ANALYSIS_COUNTERS[source] += 1
+    return dict(result)
+
+
+def accept_combined_analysis(messages: List[BaseMessage], known_entities: Dict, conversation_id: str,
+                             result: Dict, offset: int = 0) -> Dict:
+    """Finalize the analysis returned with a combined reply and record it"""
+    result = finalize_analysis(result, known_entities, extract_user_messages(messages))
+    return remember_analysis(messages, known_entities, conversation_id, result, source="combined", offset=offset)
+
+
+def fast_path_analysis(messages: List[BaseMessage], known_entities: Dict, conversation_id: str,
+                       sentiment: str, offset: int = 0) -> Dict:
+    """Default analysis for a turn answered by the fast path.
+
+    A trivial message adds no entities and does not change the intent, so
+    the conversation's running analysis carries over (rescored for the
+    known entities); a new conversation starts as a general inquiry.
+    """
+    user_messages = extract_user_messages(messages)
+    state = analysis_states.get(conversation_id)
+    position = state.position(messages, offset) if state is not None and state.last_result else None
+    if position is not None:
+        result = {**state.last_result, "new_entities": {}}
+        known = {**state.entities, **known_entities}
+        analyzed = len(extract_user_messages(messages[position:]))
+    else:
+        state = AnalysisState()
+        result = {**EMPTY_ANALYSIS, "sentiment": sentiment, "confidence": 0.9}
+        known = known_entities
+        analyzed = len(user_messages)
+    result = finalize_analysis(result, known, user_messages[-1:])
+    
+    if os.getenv("INCREMENTAL_ANALYSIS", "true").lower() == "true":
+        state.update(result, known_entities, messages, offset, analyzed, full=position is None)
+        analysis_states.put(conversation_id, state)
+    ANALYSIS_COUNTERS["fast_path"] += 1
+    return result
 
 
-def analyze_conversation(messages: List[BaseMessage], known_entities: Dict) -> Dict:
+async def analyze_conversation(messages: List[BaseMessage], known_entities: Dict,
+                               conversation_id: Optional[str] = None, offset: int = 0) -> Dict:
     """Main entry point for conversation analysis"""
-    return analyze_conversation_with_ai(messages, known_entities)
+    if conversation_id and os.getenv("INCREMENTAL_ANALYSIS", "true").lower() == "true":
+        with ANALYZER_SECONDS.time(mode="incremental"):
+            return await analyze_conversation_incremental(messages, known_entities, conversation_id, offset)
+    with ANALYZER_SECONDS.time(mode="full"):
+        return await analyze_conversation_with_ai(messages, known_entities)
@@ -0,0 +1,171 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from langchain_core.messages import BaseMessage
+from .catalog import catalog
+from .registry import registry
+from .rules import EMAIL_RE, PHONE_RE
+import hashlib
+import json
+import os
+import re
+import time
+
+
+# Tools without side effects; answers that used any other tool are not cached
+CACHEABLE_TOOLS = {"get_pricing", "get_features", "calculate_roi", "get_company_info"}
+
+_WORD_RE = re.compile(r"[a-z0-9₹$]+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return " ".join(_WORD_RE.findall(text.lower()))
+
+
+def tools_fingerprint() -> str:
+    """Hash of the tool schemas the agent sees"""
+    from langchain_core.utils.function_calling import convert_to_openai_tool
+    from .tools_enhanced import TOOLS
+    schemas = [convert_to_openai_tool(t) for t in TOOLS]
+    return hashlib.sha256(json.dumps(schemas, sort_keys=True).encode()).hexdigest()
+
+
+class CachedAnswer:
+    def __init__(self, key: str, response: str):
+        self.key = key
+        self.tokens = frozenset(key.split())
+        self.response = response
+        self.metadata: Optional[Dict] = None
+        self.created_at = time.time()
+
+
+class AnswerCache:
+    """LRU/TTL cache of agent replies to first-turn messages.
+
+    Keyed on the normalized message text. With ANSWER_CACHE_SIMILARITY set
+    (0-1), a miss falls back to the most similar cached question by word
+    overlap (Jaccard), found through an inverted word index. The cache is
+    cleared whenever the system prompt, the tool schemas or the product
+    catalog change.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("ANSWER_CACHE", "true").lower() == "true"
+        self.max_size = int(os.getenv("ANSWER_CACHE_SIZE", 1000))
+        self.ttl = float(os.getenv("ANSWER_CACHE_TTL", 3600))
+        self.max_chars = int(os.getenv("ANSWER_CACHE_MAX_CHARS", 200))
+        self.similarity = float(os.getenv("ANSWER_CACHE_SIMILARITY", 0))
+        self._entries: "OrderedDict[str, CachedAnswer]" = OrderedDict()
+        self._index: Dict[str, set] = {}
+        self._version: Optional[Tuple] = None
+        self._tools_version: Optional[str] = None
+        self.counters = {"hits": 0, "similar_hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+
+    def _current_version(self) -> Tuple:
+        if self._tools_version is None:
+            self._tools_version = tools_fingerprint()
+        return (registry.prompt.version, self._tools_version, catalog.version)
+
+    def _check_version(self):
+        version = self._current_version()
+        if version != self._version:
+            if self._version is not None:
+                self.counters["invalidations"] += 1
+            self.clear()
+            self._version = version
+
+    def warm_up(self):
+        """Compute the cache version (tool schema hash) before the first lookup"""
+        self._check_version()
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for token in entry.tokens:
+            keys = self._index.get(token)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._index[token]
+
+    def _similar(self, key: str) -> Optional[CachedAnswer]:
+        tokens = frozenset(key.split())
+        candidates = set()
+        for token in tokens:
+            candidates |= self._index.get(token, set())
+        best, best_score = None, 0.0
+        for candidate in candidates:
+            entry = self._entries[candidate]
+            score = len(tokens & entry.tokens) / len(tokens | entry.tokens)
+            if score > best_score:
+                best, best_score = entry, score
+        return best if best_score >= self.similarity else None
+
+    def cacheable(self, message: str, history: List) -> bool:
+        """Only short first-turn messages without personal details are cached"""
+        return (
+            self.enabled
+            and not history
+            and len(message) <= self.max_chars
+            and not EMAIL_RE.search(message)
+            and not PHONE_RE.search(message)
+        )
+
+    def get(self, message: str) -> Optional[CachedAnswer]:
+        self._check_version()
+        key = normalize(message)
+        entry = self._entries.get(key)
+        if entry is not None and time.time() - entry.created_at > self.ttl:
+            self._remove(key)
+            entry = None
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return entry
+        if self.similarity > 0:
+            entry = self._similar(key)
+            if entry is not None and time.time() - entry.created_at <= self.ttl:
+                self.counters["similar_hits"] += 1
+                return entry
+        self.counters["misses"] += 1
+        return None
+
+    def put(self, message: str, response: str, messages: List[BaseMessage]) -> Optional[CachedAnswer]:
+        """Cache a reply unless the agent used a tool with side effects"""
+        for msg in messages:
+            for call in getattr(msg, "tool_calls", None) or []:
+                if call["name"] not in CACHEABLE_TOOLS:
+                    return None
+        self._check_version()
+        key = normalize(message)
+        if not key:
+            return None
+        self._remove(key)
+        entry = CachedAnswer(key, response)
+        self._entries[key] = entry
+        for token in entry.tokens:
+            self._index.setdefault(token, set()).add(key)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+        self.counters["stores"] += 1
+        return entry
+
+    def clear(self):
+        self._entries.clear()
+        self._index.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.counters["hits"] + self.counters["similar_hits"] + self.counters["misses"]
+        hits = self.counters["hits"] + self.counters["similar_hits"]
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            **self.counters,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+        }
+
+
+# Singleton instance
+answer_cache = AnswerCache()
@@ -0,0 +1,114 @@
+from typing import Dict, List, Optional
+import hashlib
+import json
+import os
+import time
+
+
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "catalog.json")
+
+PLAN_NOT_FOUND = {"error": "Plan not found. Available plans: {plans}"}
+FEATURES_NOT_FOUND = {"error": "Plan not found"}
+
+
+def serialize(payload: Dict) -> str:
+    """Serialize a tool payload the way ToolNode would"""
+    return json.dumps(payload, ensure_ascii=False)
+
+
+class CatalogSnapshot:
+    """Immutable, indexed view of one version of the catalog file.
+
+    Tool payloads are serialized once here, so tool calls only do lookups.
+    """
+
+    def __init__(self, data: Dict, version: str):
+        self.version = version
+        self.pricing: Dict[str, Dict] = {k.lower(): v for k, v in data.get("pricing", {}).items()}
+        self.features: Dict[str, Dict] = {k.lower(): v for k, v in data.get("features", {}).items()}
+        self.company: Dict = data.get("company", {})
+        
+        plans = ", ".join(self.pricing)
+        self.pricing_not_found = {"error": PLAN_NOT_FOUND["error"].format(plans=plans)}
+        
+        self.pricing_json = {plan: serialize(info) for plan, info in self.pricing.items()}
+        self.features_json = {plan: serialize(info) for plan, info in self.features.items()}
+        self.features_json["all"] = serialize(self.features)
+        self.company_json = serialize(self.company)
+        self.pricing_not_found_json = serialize(self.pricing_not_found)
+        self.features_not_found_json = serialize(FEATURES_NOT_FOUND)
+
+
+class Catalog:
+    """Product catalog loaded from a JSON data file.
+
+    The file is checked for changes at most every CATALOG_CHECK_INTERVAL
+    seconds and reloaded atomically: a new snapshot is built completely
+    before it replaces the old one, and a broken file keeps the old one.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("CATALOG_PATH", DEFAULT_CATALOG_PATH)
+        self.check_interval = float(os.getenv("CATALOG_CHECK_INTERVAL", 2))
+        self._mtime: Optional[int] = None
+        self._checked_at = 0.0
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self.reloads = 0
+
+    def _load(self, mtime: int):
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        snapshot = CatalogSnapshot(json.loads(raw), hashlib.sha256(raw).hexdigest())
+        self._snapshot = snapshot
+        self._mtime = mtime
+        self.reloads += 1
+
+    @property
+    def snapshot(self) -> CatalogSnapshot:
+        now = time.monotonic()
+        if self._snapshot is None or now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+                if mtime != self._mtime:
+                    self._load(mtime)
+            except Exception as e:
+                if self._snapshot is None:
+                    raise
+                print(f"Catalog reload error: {e}")
+        return self._snapshot
+
+    @property
+    def version(self) -> str:
+        return self.snapshot.version
+
+    def plans(self) -> List[str]:
+        return list(self.snapshot.pricing)
+
+    def get_pricing(self, plan: str) -> Dict:
+        snapshot = self.snapshot
+        return snapshot.pricing.get(plan.lower(), snapshot.pricing_not_found)
+
+    def get_pricing_json(self, plan: str) -> str:
+        snapshot = self.snapshot
+        return snapshot.pricing_json.get(plan.lower(), snapshot.pricing_not_found_json)
+
+    def get_features(self, plan: str = "all") -> Dict:
+        snapshot = self.snapshot
+        if plan.lower() == "all":
+            return snapshot.features
+        return snapshot.features.get(plan.lower(), FEATURES_NOT_FOUND)
+
+    def get_features_json(self, plan: str = "all") -> str:
+        snapshot = self.snapshot
+        return snapshot.features_json.get(plan.lower(), snapshot.features_not_found_json)
+
+    def get_company_info(self) -> Dict:
+        return self.snapshot.company
+
+    def get_company_info_json(self) -> str:
+        return self.snapshot.company_json
+
+
+# Singleton instance
+catalog = Catalog()
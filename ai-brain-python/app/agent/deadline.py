@@ -0,0 +1,62 @@
+from typing import Dict, Optional
+import math
+import os
+import time
+
+
+# Degradations a turn can report, cheapest first
+DEGRADATIONS = (
+    "tool_rounds_capped",   # AGENT_MAX_TOOL_ROUNDS reached; final answer forced without tools
+    "tools_skipped",        # too little time left for tools; final answer forced without tools
+    "partial_answer",       # too little time left for the model; canned partial reply
+    "fallback_reply",       # the model call failed or the circuit breaker is open
+    "analysis_deferred",    # rule-based metadata now, full analysis queued (see analysis_id)
+    "analysis_skipped",     # rule-based metadata only
+    "analysis_fallback",    # the analyzer failed; rule-based metadata
+)
+
+
+class DeadlinePolicy:
+    """Per-turn time budget and the thresholds at which a turn degrades.
+
+    A turn gets deadline_ms from the request, or CHAT_DEADLINE seconds.
+    With less than DEADLINE_FINAL_ANSWER_SECONDS left the agent must answer
+    without calling more tools; with less than DEADLINE_MIN_MODEL_SECONDS
+    it does not call the model at all; with less than
+    DEADLINE_ANALYSIS_SECONDS left after the reply, the analyzer is not
+    waited for.
+    """
+
+    def __init__(self):
+        self.default_seconds = float(os.getenv("CHAT_DEADLINE", 30))
+        self.max_tool_rounds = int(os.getenv("AGENT_MAX_TOOL_ROUNDS", 3))
+        self.final_answer_seconds = float(os.getenv("DEADLINE_FINAL_ANSWER_SECONDS", 6))
+        self.min_model_seconds = float(os.getenv("DEADLINE_MIN_MODEL_SECONDS", 1.5))
+        self.analysis_seconds = float(os.getenv("DEADLINE_ANALYSIS_SECONDS", 2))
+        self.counters = {name: 0 for name in DEGRADATIONS}
+
+    def deadline(self, budget_ms: Optional[int] = None) -> float:
+        """time.monotonic() value by which the turn should be answered"""
+        seconds = budget_ms / 1000 if budget_ms else self.default_seconds
+        return time.monotonic() + seconds
+
+    @staticmethod
+    def remaining(deadline: Optional[float]) -> float:
+        if deadline is None:
+            return math.inf
+        return deadline - time.monotonic()
+
+    def record(self, degradations):
+        for name in degradations:
+            self.counters[name] += 1
+
+    def stats(self) -> Dict:
+        return {
+            "default_seconds": self.default_seconds,
+            "max_tool_rounds": self.max_tool_rounds,
+            "degradations": dict(self.counters)
+        }
+
+
+# Singleton instance
+deadlines = DeadlinePolicy()
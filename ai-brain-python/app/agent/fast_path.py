@@ -0,0 +1,296 @@
+"""Local fast path for trivial turns ("hi", "thanks", "ok", "bye").
+
+A keyword table and a small TF-IDF logistic regression decide, in
+microseconds, whether a message is a canned intent. Those turns get a
+templated reply and default metadata without calling the model; anything
+substantive, long, carrying entities, below FAST_PATH_THRESHOLD or using
+words none of the intent examples use goes to the agent.
+
+The intents, replies and seed examples live in app/data/fast_path.json.
+More labelled examples ({"text": ..., "label": ...} per line, label is an
+intent or "other") can be mined from exported conversations and loaded
+with FAST_PATH_EXAMPLES:
+
+    python -m app.agent.fast_path label conversations.csv --output fast_path_examples.jsonl
+    # review the "label" column, then
+    python -m app.agent.fast_path evaluate fast_path_examples.jsonl
+"""
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+import json
+import math
+import os
+import random
+import re
+
+
+DEFAULT_DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "fast_path.json")
+
+OTHER = "other"
+
+_WORD_RE = re.compile(r"[a-z']+")
+_REPEAT_RE = re.compile(r"(.)\1{2,}")
+# Digits, emails, URLs and questions are never trivial
+_SUBSTANTIVE_RE = re.compile(r"[0-9@?]|https?:|www\.")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, squeeze stretched letters ("heyyy" -> "heyy") and keep only words"""
+    text = _REPEAT_RE.sub(r"\1\1", text.lower())
+    return " ".join(word.strip("'") for word in _WORD_RE.findall(text))
+
+
+def features(text: str) -> Counter:
+    """Word unigrams plus character trigrams, so "thanx" still looks like "thanks" """
+    counts: Counter = Counter()
+    for word in text.split():
+        counts["w:" + word] += 1
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            counts["c:" + padded[i:i + 3]] += 1
+    return counts
+
+
+class LinearClassifier:
+    """Multinomial logistic regression over TF-IDF features, trained with SGD"""
+
+    def __init__(self, epochs: int = 40, learning_rate: float = 0.5, l2: float = 1e-4):
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.idf: Dict[str, float] = {}
+        self.labels: List[str] = []
+        self.weights: Dict[str, Dict[str, float]] = {}
+        self.bias: Dict[str, float] = {}
+
+    def _vector(self, text: str) -> Dict[str, float]:
+        vector = {
+            feature: (1 + math.log(count)) * self.idf[feature]
+            for feature, count in features(text).items() if feature in self.idf
+        }
+        norm = math.sqrt(sum(v * v for v in vector.values()))
+        return {k: v / norm for k, v in vector.items()} if norm else {}
+
+    def _probabilities(self, vector: Dict[str, float]) -> Dict[str, float]:
+        scores = {
+            label: self.bias[label] + sum(v * self.weights[label].get(k, 0.0) for k, v in vector.items())
+            for label in self.labels
+        }
+        top = max(scores.values())
+        exp = {label: math.exp(score - top) for label, score in scores.items()}
+        total = sum(exp.values())
+        return {label: value / total for label, value in exp.items()}
+
+    def fit(self, examples: List[Tuple[str, str]]):
+        df: Counter = Counter()
+        for text, _ in examples:
+            df.update(features(text).keys())
+        total = len(examples)
+        self.idf = {feature: math.log((1 + total) / (1 + n)) + 1 for feature, n in df.items()}
+        self.labels = sorted({label for _, label in examples})
+        self.weights = {label: {} for label in self.labels}
+        self.bias = {label: 0.0 for label in self.labels}
+
+        data = [(self._vector(text), label) for text, label in examples]
+        rng = random.Random(0)
+        for epoch in range(self.epochs):
+            rng.shuffle(data)
+            rate = self.learning_rate / (1 + epoch * 0.1)
+            for vector, target in data:
+                probabilities = self._probabilities(vector)
+                for label in self.labels:
+                    gradient = probabilities[label] - (1.0 if label == target else 0.0)
+                    weights = self.weights[label]
+                    for k, v in vector.items():
+                        weights[k] = weights.get(k, 0.0) * (1 - rate * self.l2) - rate * gradient * v
+                    self.bias[label] -= rate * gradient
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """Most likely label and its probability"""
+        vector = self._vector(text)
+        if not vector:
+            return OTHER, 0.0
+        probabilities = self._probabilities(vector)
+        best = max(probabilities, key=probabilities.get)
+        return best, probabilities[best]
+
+
+class Route:
+    """A turn the fast path answers itself"""
+
+    def __init__(self, intent: str, reply: str, sentiment: str, confidence: float, source: str):
+        self.intent = intent
+        self.reply = reply
+        self.sentiment = sentiment
+        self.confidence = confidence
+        self.source = source  # "rule" or "model"
+
+
+class FastPath:
+    """Routes trivial turns to templated replies.
+
+    Exact (normalized) matches of the example phrases are routed with
+    confidence 1.0; otherwise the classifier's probability must reach
+    FAST_PATH_THRESHOLD and every word must occur in the intent examples, so
+    "ok lets book it" is not taken for "ok". Messages over
+    FAST_PATH_MAX_WORDS words are never routed, nor are intents marked "after_question": false (such as "ok")
+    when the assistant's last message asked something, since there the
+    message is an answer.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.enabled = os.getenv("FAST_PATH", "true").lower() == "true"
+        self.threshold = float(os.getenv("FAST_PATH_THRESHOLD", 0.75))
+        self.max_words = int(os.getenv("FAST_PATH_MAX_WORDS", 6))
+        self.path = path or os.getenv("FAST_PATH_DATA", DEFAULT_DATA_PATH)
+        self.examples_path = os.getenv("FAST_PATH_EXAMPLES", "")
+        self.intents: Dict[str, Dict] = {}
+        self.phrases: Dict[str, str] = {}
+        self.vocabulary: Set[str] = set()
+        self.classifier: Optional[LinearClassifier] = None
+        self.counters = {"checked": 0, "routed": 0, "passed": 0}
+        self.routed_by_intent: Counter = Counter()
+        self.passed_by_reason: Counter = Counter()
+
+    def load(self):
+        """Read the intents and fit the classifier on seed plus mined examples"""
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        examples = []
+        phrases = {}
+        for intent, spec in data["intents"].items():
+            for text in spec["examples"]:
+                phrases[normalize(text)] = intent
+                examples.append((normalize(text), intent))
+        examples += [(normalize(text), OTHER) for text in data.get("other_examples", [])]
+        if self.examples_path:
+            examples += [(normalize(text), label) for text, label in read_examples(self.examples_path)
+                         if label == OTHER or label in data["intents"]]
+
+        classifier = LinearClassifier()
+        classifier.fit([(text, label) for text, label in examples if text])
+        self.intents = data["intents"]
+        self.phrases = phrases
+        self.vocabulary = {word for text, label in examples if label != OTHER for word in text.split()}
+        self.classifier = classifier
+
+    def warm_up(self):
+        if self.classifier is None:
+            self.load()
+
+    def classify(self, message: str) -> Tuple[str, float, str]:
+        """(label, confidence, source) for a message, ignoring thresholds and context"""
+        self.warm_up()
+        text = normalize(message)
+        if text in self.phrases:
+            return self.phrases[text], 1.0, "rule"
+        label, score = self.classifier.predict(text)
+        return label, score, "model"
+
+    def _pass(self, reason: str) -> None:
+        self.counters["passed"] += 1
+        self.passed_by_reason[reason] += 1
+        return None
+
+    def route(self, message: str, previous_reply: Optional[str] = None) -> Optional[Route]:
+        """The templated answer for a trivial message, or None to run the agent"""
+        if not self.enabled:
+            return None
+        self.counters["checked"] += 1
+        if len(message.split()) > self.max_words:
+            return self._pass("long")
+        if _SUBSTANTIVE_RE.search(message.lower()):
+            return self._pass("substantive")
+
+        label, confidence, source = self.classify(message)
+        if label == OTHER:
+            return self._pass("other")
+        if confidence < self.threshold:
+            return self._pass("low_confidence")
+        if source == "model" and not set(normalize(message).split()) <= self.vocabulary:
+            return self._pass("unknown_words")
+        spec = self.intents[label]
+        if not spec.get("after_question", True) and previous_reply and previous_reply.rstrip().endswith("?"):
+            return self._pass("answers_question")
+
+        self.counters["routed"] += 1
+        self.routed_by_intent[label] += 1
+        return Route(label, spec["reply"], spec.get("sentiment", "neutral"), round(confidence, 3), source)
+
+    def stats(self) -> Dict:
+        checked = self.counters["checked"]
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            **self.counters,
+            "hit_rate": round(self.counters["routed"] / checked, 4) if checked else 0.0,
+            "routed_by_intent": dict(self.routed_by_intent),
+            "passed_by_reason": dict(self.passed_by_reason)
+        }
+
+
+def read_examples(path: str) -> List[Tuple[str, str]]:
+    """Labelled examples from a JSONL file of {"text", "label"} objects"""
+    examples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                examples.append((row["text"], row["label"]))
+    return examples
+
+
+def label_export(input_path: str, output_path: str):
+    """Write the distinct short user messages of an export, pre-labelled for review"""
+    from app.rescore import read_conversations
+    counts: Counter = Counter()
+    for conversation in read_conversations(input_path):
+        for message in conversation["user_messages"]:
+            text = normalize(message)
+            if text and len(text.split()) <= fast_path.max_words:
+                counts[text] += 1
+
+    with open(output_path, "w", encoding="utf-8") as out:
+        for text, count in counts.most_common():
+            label, confidence, source = fast_path.classify(text)
+            out.write(json.dumps({"text": text, "label": label, "confidence": round(confidence, 3),
+                                  "source": source, "count": count}) + "\n")
+    print(f"Wrote {len(counts)} distinct short messages to {output_path}")
+
+
+def evaluate(path: str):
+    """Precision and routed share of the labelled examples at several thresholds"""
+    examples = read_examples(path)
+    predictions = [(label, fast_path.classify(text)) for text, label in examples]
+    print(f"{'threshold':>10}{'routed':>10}{'precision':>11}")
+    for threshold in (0.5, 0.6, 0.7, 0.75, 0.8, 0.9):
+        routed = [(label, predicted) for label, (predicted, confidence, _) in predictions
+                  if predicted != OTHER and confidence >= threshold]
+        correct = sum(1 for label, predicted in routed if label == predicted)
+        precision = correct / len(routed) if routed else 1.0
+        print(f"{threshold:>10}{len(routed) / len(examples):>10.1%}{precision:>11.1%}")
+
+
+# Singleton instance
+fast_path = FastPath()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Mine and evaluate fast-path examples")
+    commands = parser.add_subparsers(dest="command", required=True)
+    label = commands.add_parser("label", help="pre-label short user messages from a conversations export")
+    label.add_argument("input", help="CSV or JSONL export of the conversations table")
+    label.add_argument("--output", default="fast_path_examples.jsonl")
+    check = commands.add_parser("evaluate", help="precision and hit rate on labelled examples")
+    check.add_argument("input", help="JSONL of {\"text\", \"label\"} objects")
+    args = parser.parse_args()
+
+    if args.command == "label":
+        label_export(args.input, args.output)
+    else:
+        evaluate(args.input)
+
+
+if __name__ == "__main__":
+    main()
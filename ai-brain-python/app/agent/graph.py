@@ -1,17 +1,18 @@
-from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
-from .state import AgentState
-from .nodes import agent_node, should_continue
-from .tools_enhanced import TOOLS
+_graph = None
 
 
 def create_graph():
     """Create and compile the LangGraph agent"""
+    # Imported here so importing the app does not pay for langgraph/langchain_openai
+    from langgraph.graph import StateGraph, END
+    from .state import AgentState
+    from .nodes import agent_node, tool_node, should_continue
+    
     workflow = StateGraph(AgentState)
     
     # Add nodes
     workflow.add_node("agent", agent_node)
-    workflow.add_node("tools", ToolNode(TOOLS))
+    workflow.add_node("tools", tool_node)
     
     # Set entry point
     workflow.set_entry_point("agent")
@@ -32,5 +33,9 @@ def create_graph():
     return workflow.compile()
 
 
-# Create singleton graph instance
-graph = create_graph()
+def get_graph():
+    """Compiled singleton graph, built on first use (or by the startup warm-up)"""
+    global _graph
+    if _graph is None:
+        _graph = create_graph()
+    return _graph
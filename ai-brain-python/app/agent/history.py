@@ -0,0 +1,191 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from .registry import registry
+from .resilience import resilience
+from app.metrics import track_llm
+import hashlib
+import os
+import time
+
+
+SUMMARY_PREFIX = "Summary of the earlier conversation (older messages were compacted):"
+
+SUMMARY_PROMPT = """You maintain a running summary of a sales chat between a user and the LeadGenLite assistant.
+
+**Current Summary:**
+{summary}
+
+**New Messages To Add:**
+{transcript}
+
+Rewrite the summary so it also covers the new messages. Keep every fact the user shared about themselves (name, email, phone, company, team size, budget, plan interest, use case), open questions, promises made by the assistant, and the user's current goal. Be concise: at most 200 words, plain text, no preamble."""
+
+
+def estimate_tokens(messages: List[BaseMessage]) -> int:
+    """Cheap token estimate (~4 characters per token plus per-message overhead)"""
+    return sum(len(str(msg.content)) // 4 + 4 for msg in messages)
+
+
+def fingerprint(messages: List[BaseMessage]) -> str:
+    digest = hashlib.sha256()
+    for msg in messages:
+        digest.update(msg.type.encode())
+        digest.update(str(msg.content).encode())
+    return digest.hexdigest()
+
+
+# Covered messages hashed at a summary's end, to recognize it after older ones were trimmed
+BOUNDARY_MESSAGES = 2
+
+
+class RollingSummary:
+    """Summary of a conversation's messages up to absolute index ``covered``.
+
+    ``start`` is the absolute index of the first message it was built from
+    (non-zero once the session dropped older messages); ``covered_fingerprint``
+    hashes messages start..covered and ``boundary_fingerprint`` the last
+    BOUNDARY_MESSAGES of them.
+    """
+
+    def __init__(self, text: str, start: int, covered: int, covered_fingerprint: str, boundary_fingerprint: str):
+        self.text = text
+        self.start = start
+        self.covered = covered
+        self.covered_fingerprint = covered_fingerprint
+        self.boundary_fingerprint = boundary_fingerprint
+        self.updated_at = time.time()
+
+    def matches(self, older: List[BaseMessage], offset: int) -> bool:
+        """Whether ``older`` (starting at absolute index ``offset``) continues this summary"""
+        end = self.covered - offset
+        if end > len(older):
+            return False
+        if offset == self.start:
+            return fingerprint(older[:end]) == self.covered_fingerprint
+        # Messages before offset were trimmed from the session; compare the summary's last ones
+        return (offset > self.start and end >= BOUNDARY_MESSAGES
+                and fingerprint(older[end - BOUNDARY_MESSAGES:end]) == self.boundary_fingerprint)
+
+
+class HistoryManager:
+    """Keeps agent prompts within a token budget.
+
+    When a conversation exceeds HISTORY_TOKEN_BUDGET, the last
+    HISTORY_KEEP_TURNS user turns stay verbatim and everything older is
+    replaced by a rolling summary. Summaries are cached per conversation and
+    only extended with the messages that aged out since the last turn.
+    """
+
+    def __init__(self):
+        self.token_budget = int(os.getenv("HISTORY_TOKEN_BUDGET", 3000))
+        self.keep_turns = int(os.getenv("HISTORY_KEEP_TURNS", 4))
+        self.max_size = int(os.getenv("HISTORY_SUMMARY_CACHE_SIZE", 10000))
+        self._summaries: "OrderedDict[str, RollingSummary]" = OrderedDict()
+        self.counters = {
+            "requests": 0, "compacted": 0, "summaries_created": 0, "summaries_extended": 0,
+            "summary_errors": 0, "tokens_before": 0, "tokens_after": 0
+        }
+
+    def _split(self, messages: List[BaseMessage]) -> int:
+        """Index where the verbatim tail (last keep_turns user turns) starts"""
+        turns = 0
+        for i in range(len(messages) - 1, -1, -1):
+            if isinstance(messages[i], HumanMessage):
+                turns += 1
+                if turns == self.keep_turns:
+                    return i
+        return 0
+
+    async def _summarize(self, summary: str, messages: List[BaseMessage], deadline: Optional[float] = None) -> str:
+        transcript = "\n".join(
+            f"{'User' if isinstance(msg, HumanMessage) else 'Assistant'}: {msg.content}"
+            for msg in messages
+        )
+        prompt = SUMMARY_PROMPT.format(summary=summary or "(empty)", transcript=transcript)
+        
+        async def attempt():
+            with track_llm("summary", registry.model_name) as call:
+                call["response"] = await registry.chat_model().ainvoke([SystemMessage(content=prompt)])
+                return call["response"]
+        
+        result = await resilience.call("summary", attempt, deadline=deadline)
+        return result.content.strip()
+
+    async def _summary_for(self, conversation_id: str, older: List[BaseMessage], offset: int = 0,
+                           deadline: Optional[float] = None) -> Optional[str]:
+        cached = self._summaries.get(conversation_id)
+        if cached is not None and cached.matches(older, offset):
+            if cached.covered == offset + len(older):
+                self._summaries.move_to_end(conversation_id)
+                return cached.text
+            base, new = cached.text, older[cached.covered - offset:]
+            start = cached.start
+            counter = "summaries_extended"
+        else:
+            base, new = "", older
+            start = offset
+            counter = "summaries_created"
+        
+        try:
+            text = await self._summarize(base, new, deadline)
+        except Exception as e:
+            print(f"History summary error: {e}")
+            self.counters["summary_errors"] += 1
+            return None
+        
+        self.counters[counter] += 1
+        covered = offset + len(older)
+        self._summaries[conversation_id] = RollingSummary(
+            text, start, covered,
+            # Once older messages are trimmed only the boundary can be checked
+            fingerprint(older) if start == offset else "",
+            fingerprint(older[-BOUNDARY_MESSAGES:])
+        )
+        self._summaries.move_to_end(conversation_id)
+        while len(self._summaries) > self.max_size:
+            self._summaries.popitem(last=False)
+        return text
+
+    async def compact(self, conversation_id: str, messages: List[BaseMessage],
+                      deadline: Optional[float] = None, offset: int = 0) -> List[BaseMessage]:
+        """Return the messages to send to the agent for this turn; summarizing stops at deadline.
+
+        ``offset`` is the absolute index of messages[0] when the session has
+        dropped its oldest messages.
+        """
+        before = estimate_tokens(messages)
+        self.counters["requests"] += 1
+        self.counters["tokens_before"] += before
+        
+        split = self._split(messages)
+        if before <= self.token_budget or split == 0:
+            self.counters["tokens_after"] += before
+            return messages
+        
+        older, recent = messages[:split], messages[split:]
+        summary = await self._summary_for(conversation_id, older, offset, deadline)
+        if summary is None:
+            # Without a summary, fall back to the verbatim tail only
+            compacted = recent
+        else:
+            compacted = [SystemMessage(content=f"{SUMMARY_PREFIX}\n{summary}")] + recent
+        
+        self.counters["compacted"] += 1
+        self.counters["tokens_after"] += estimate_tokens(compacted)
+        return compacted
+
+    def stats(self) -> Dict:
+        requests = self.counters["requests"]
+        return {
+            "token_budget": self.token_budget,
+            "keep_turns": self.keep_turns,
+            "cached_summaries": len(self._summaries),
+            **self.counters,
+            "avg_tokens_before": round(self.counters["tokens_before"] / requests, 1) if requests else 0.0,
+            "avg_tokens_after": round(self.counters["tokens_after"] / requests, 1) if requests else 0.0
+        }
+
+
+# Singleton instance
+history_manager = HistoryManager()
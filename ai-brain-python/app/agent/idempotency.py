@@ -0,0 +1,114 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import os
+import time
+
+
+class IdempotencyConflict(Exception):
+    """An idempotency key was reused for a different request"""
+
+
+class IdempotencyStore:
+    """Coalesces duplicate requests by idempotency key.
+
+    A duplicate that arrives while the original is running waits for the
+    same result; one that arrives within IDEMPOTENCY_TTL seconds after it
+    finished gets the stored result (at most IDEMPOTENCY_MAX are kept).
+    Failures are shared with waiting duplicates but never stored, so a
+    later retry runs again.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("IDEMPOTENCY", "true").lower() == "true"
+        self.ttl = float(os.getenv("IDEMPOTENCY_TTL", 300))
+        self.max_size = int(os.getenv("IDEMPOTENCY_MAX", 10000))
+        self._inflight: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self._done: "OrderedDict[str, Tuple[str, Any, float]]" = OrderedDict()
+        self.counters = {"executed": 0, "coalesced": 0, "replayed": 0, "conflicts": 0}
+
+    def lookup(self, key: str, fingerprint: str) -> Optional[asyncio.Future]:
+        """Future for an in-flight or stored result under this key, if any"""
+        entry = self._inflight.get(key)
+        if entry is not None:
+            self._check(entry[0], fingerprint)
+            self.counters["coalesced"] += 1
+            return entry[1]
+
+        stored = self._done.get(key)
+        if stored is None:
+            return None
+        if time.time() > stored[2]:
+            del self._done[key]
+            return None
+        self._check(stored[0], fingerprint)
+        self._done.move_to_end(key)
+        self.counters["replayed"] += 1
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(stored[1])
+        return future
+
+    def begin(self, key: str, fingerprint: str) -> asyncio.Future:
+        """Mark a key as in flight; settle it with finish()"""
+        future = asyncio.get_running_loop().create_future()
+        # Nobody may be waiting on a failed original; don't log it as unretrieved
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = (fingerprint, future)
+        self.counters["executed"] += 1
+        return future
+
+    def finish(self, key: str, result: Any = None, error: Optional[BaseException] = None):
+        """Settle an in-flight key; store the result if it succeeded"""
+        entry = self._inflight.pop(key, None)
+        if entry is None:
+            return
+        fingerprint, future = entry
+        if error is not None:
+            future.set_exception(error)
+            return
+        future.set_result(result)
+        self._done[key] = (fingerprint, result, time.time() + self.ttl)
+        self._done.move_to_end(key)
+        while len(self._done) > self.max_size:
+            self._done.popitem(last=False)
+
+    async def run(self, key: str, fingerprint: str, factory: Callable[[], Awaitable]) -> Tuple[Any, bool]:
+        """Run factory() once per key; returns (result, whether it was a duplicate).
+
+        The work runs in its own task, so a caller that disconnects does not
+        cancel it for duplicates that are waiting on it or about to retry.
+        """
+        existing = self.lookup(key, fingerprint)
+        if existing is not None:
+            return await asyncio.shield(existing), True
+
+        future = self.begin(key, fingerprint)
+        task = asyncio.create_task(factory())
+        task.add_done_callback(lambda t: self._settle(key, t))
+        return await asyncio.shield(future), False
+
+    def _settle(self, key: str, task: asyncio.Task):
+        if task.cancelled():
+            self.finish(key, error=RuntimeError("Request was cancelled"))
+        elif task.exception() is not None:
+            self.finish(key, error=task.exception())
+        else:
+            self.finish(key, result=task.result())
+
+    def _check(self, stored: str, fingerprint: str):
+        if stored != fingerprint:
+            self.counters["conflicts"] += 1
+            raise IdempotencyConflict("Idempotency key was already used for a different request")
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._inflight),
+            "stored": len(self._done),
+            "ttl_seconds": self.ttl,
+            **self.counters
+        }
+
+
+# Singleton instance
+idempotency = IdempotencyStore()
@@ -1,25 +1,277 @@
-from typing import Dict, List
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def new_session() -> Dict:
+    # offset: messages dropped from the front of history so far (absolute index of history[0])
+    return {"history": [], "known_entities": {}, "offset": 0, "updated_at": time.time()}
+
+
+def session_size(session: Dict) -> int:
+    """Approximate memory footprint of a session in bytes"""
+    size = sum(len(msg["content"]) + len(msg["role"]) for msg in session["history"])
+    return size + len(json.dumps(session["known_entities"]))
+
+
+class InMemoryBackend:
+    """LRU/TTL-bounded in-process session storage with memory accounting"""
+
+    name = "memory"
+
+    def __init__(self, ttl: float, max_entries: int, max_bytes: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[str, Dict]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self.bytes = 0
+        self.evictions = 0
+
+    def _remove(self, conversation_id: str):
+        self._sessions.pop(conversation_id, None)
+        self.bytes -= self._sizes.pop(conversation_id, 0)
+
+    async def get(self, conversation_id: str) -> Optional[Dict]:
+        session = self._sessions.get(conversation_id)
+        if session is None:
+            return None
+        if time.time() - session["updated_at"] > self.ttl:
+            self._remove(conversation_id)
+            return None
+        self._sessions.move_to_end(conversation_id)
+        return session
+
+    async def save(self, conversation_id: str, session: Dict):
+        self._remove(conversation_id)
+        size = session_size(session)
+        self._sessions[conversation_id] = session
+        self._sizes[conversation_id] = size
+        self.bytes += size
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_entries or self.bytes > self.max_bytes
+        ):
+            self._remove(next(iter(self._sessions)))
+            self.evictions += 1
+
+    async def delete(self, conversation_id: str):
+        self._remove(conversation_id)
+
+    async def stats(self) -> Dict:
+        return {"sessions": len(self._sessions), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                "evictions": self.evictions}
+
+    async def close(self):
+        pass
+
+
+class SQLiteBackend:
+    """Sessions in a local SQLite file; queries run in a worker thread"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, ttl: float, max_entries: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions "
+            "(id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+        self._conn.commit()
+        self._saves = 0
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, fn, *args)
+
+    def _get(self, conversation_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM sessions WHERE id = ? AND updated_at >= ?",
+                (conversation_id, time.time() - self.ttl)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _save(self, conversation_id: str, session: Dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, updated_at) VALUES (?, ?, ?)",
+                (conversation_id, json.dumps(session), session["updated_at"])
+            )
+            self._saves += 1
+            if self._saves % 100 == 0:
+                self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.ttl,))
+                self._conn.execute(
+                    "DELETE FROM sessions WHERE id NOT IN "
+                    "(SELECT id FROM sessions ORDER BY updated_at DESC LIMIT ?)",
+                    (self.max_entries,)
+                )
+            self._conn.commit()
+
+    def _delete(self, conversation_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (conversation_id,))
+            self._conn.commit()
+
+    def _stats(self) -> Dict:
+        with self._lock:
+            count, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM sessions"
+            ).fetchone()
+        return {"sessions": count, "bytes": size, "path": self.path}
+
+    async def get(self, conversation_id: str) -> Optional[Dict]:
+        return await self._run(self._get, conversation_id)
+
+    async def save(self, conversation_id: str, session: Dict):
+        await self._run(self._save, conversation_id, session)
+
+    async def delete(self, conversation_id: str):
+        await self._run(self._delete, conversation_id)
+
+    async def stats(self) -> Dict:
+        return await self._run(self._stats)
+
+    async def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RedisBackend:
+    """Sessions in Redis (or any Redis-compatible server); needs the redis package"""
+
+    name = "redis"
+
+    def __init__(self, url: str, ttl: float, prefix: str = "leadgenlite:session:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("SESSION_BACKEND=redis requires the 'redis' package (pip install redis)")
+        self._client = redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def get(self, conversation_id: str) -> Optional[Dict]:
+        data = await self._client.get(self.prefix + conversation_id)
+        return json.loads(data) if data else None
+
+    async def save(self, conversation_id: str, session: Dict):
+        await self._client.set(self.prefix + conversation_id, json.dumps(session), ex=int(self.ttl))
+
+    async def delete(self, conversation_id: str):
+        await self._client.delete(self.prefix + conversation_id)
+
+    async def stats(self) -> Dict:
+        info = await self._client.info("memory")
+        return {"bytes": info.get("used_memory")}
+
+    async def close(self):
+        await self._client.aclose()
+
+
+def create_backend():
+    """Build the session backend selected by SESSION_BACKEND"""
+    backend = os.getenv("SESSION_BACKEND", "memory").lower()
+    ttl = float(os.getenv("SESSION_TTL", 86400))
+    max_entries = int(os.getenv("SESSION_MAX_ENTRIES", 10000))
+    if backend == "sqlite":
+        return SQLiteBackend(os.getenv("SESSION_SQLITE_PATH", "sessions.db"), ttl, max_entries)
+    if backend == "redis":
+        return RedisBackend(os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0"), ttl)
+    if backend != "memory":
+        raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+    return InMemoryBackend(ttl, max_entries, int(os.getenv("SESSION_MAX_BYTES", 256 * 1024 * 1024)))
 
 
 class ConversationMemory:
-    """In-memory conversation storage"""
+    """Server-side conversation sessions (history plus known entities).
+
+    Lets callers send only a conversation_id and the new message instead of
+    the full history on every request.
+    """
     
     def __init__(self):
-        self._storage: Dict[str, List[BaseMessage]] = {}
+        self._backend = None
+        self.max_messages = int(os.getenv("SESSION_MAX_MESSAGES", 200))
+    
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = create_backend()
+        return self._backend
+    
+    async def get_session(self, conversation_id: str) -> Dict:
+        """Retrieve the session for a conversation (empty if unknown or expired)"""
+        return await self.backend.get(conversation_id) or new_session()
+    
+    async def session_version(self, conversation_id: str) -> float:
+        """Changes whenever a turn is saved; 0 for a new or expired session"""
+        session = await self.backend.get(conversation_id)
+        return session["updated_at"] if session else 0
+    
+    async def save_session(self, conversation_id: str, history: List[Dict], known_entities: Dict,
+                           offset: int = 0):
+        """Save conversation history and entities, keeping the newest messages.
+
+        ``offset`` is the absolute index of history[0]; it grows by the
+        number of messages trimmed, so positions stay stable across turns.
+        Entities stored meanwhile (by a deferred analysis) are kept.
+        """
+        stored = await self.backend.get(conversation_id)
+        dropped = max(0, len(history) - self.max_messages)
+        session = {
+            "history": history[dropped:],
+            "known_entities": {**(stored["known_entities"] if stored else {}), **known_entities},
+            "offset": offset + dropped,
+            "updated_at": time.time()
+        }
+        await self.backend.save(conversation_id, session)
+    
+    async def merge_entities(self, conversation_id: str, entities: Dict):
+        """Add entities found after the turn was saved (deferred analysis) to an existing session"""
+        entities = {k: v for k, v in entities.items() if v}
+        session = await self.backend.get(conversation_id)
+        if not entities or session is None:
+            return
+        # updated_at is kept: this is not a new turn
+        await self.backend.save(conversation_id, {
+            **session, "known_entities": {**session["known_entities"], **entities}
+        })
+    
+    @property
+    def shared(self) -> bool:
+        """Whether the backend is visible to every worker process (sqlite, redis)"""
+        return self.backend.name != "memory"
+    
+    async def save_record(self, key: str, data: Dict):
+        """Store a small JSON record (kept for SESSION_TTL) next to the sessions"""
+        await self.backend.save(f"record:{key}", {**new_session(), "record": data})
+    
+    async def get_record(self, key: str) -> Optional[Dict]:
+        session = await self.backend.get(f"record:{key}")
+        return session.get("record") if session else None
     
-    def get_history(self, user_id: str) -> List[BaseMessage]:
-        """Retrieve conversation history for a user"""
-        return self._storage.get(user_id, [])
+    async def clear_session(self, conversation_id: str):
+        """Clear the session for a conversation"""
+        await self.backend.delete(conversation_id)
     
-    def save_history(self, user_id: str, messages: List[BaseMessage]):
-        """Save conversation history for a user"""
-        self._storage[user_id] = messages
+    async def stats(self) -> Dict:
+        return {"backend": self.backend.name, "max_messages": self.max_messages, **await self.backend.stats()}
     
-    def clear_history(self, user_id: str):
-        """Clear conversation history for a user"""
-        if user_id in self._storage:
-            del self._storage[user_id]
+    async def close(self):
+        if self._backend is not None:
+            await self._backend.close()
+            self._backend = None
 
 
 # Singleton instance
@@ -1,27 +1,112 @@
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage
+from typing import Dict
+from langchain_core.messages import AIMessage, SystemMessage, ToolMessage
 from .state import AgentState
+from .registry import registry
+from .analyzer import COMBINED_REPLY_TOOL, combined_instructions, split_combined_reply
+from .deadline import deadlines
+from .resilience import parse_timeouts, resilience
 from .tools_enhanced import TOOLS
+from app.metrics import NODE_SECONDS, TOOL_SECONDS, track_llm
+import asyncio
+import json
 import os
+import time
 
 
-def load_system_prompt() -> str:
-    """Load system prompt from external file"""
-    prompt_path = os.path.join(os.path.dirname(__file__), "..", "prompts", "system.txt")
-    with open(prompt_path, "r") as f:
-        return f.read()
+TOOLS_BY_NAME = {t.name: t for t in TOOLS}
 
+# Sent when the model API is failing or the circuit breaker is open
+FALLBACK_REPLY = (
+    "Sorry, I'm having trouble answering right now. Please try again in a moment, "
+    "or leave your email and our team will get back to you."
+)
 
-def agent_node(state: AgentState) -> AgentState:
-    """Agent node that processes messages and calls tools if needed"""
-    model = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-    model_with_tools = model.bind_tools(TOOLS)
+# Sent when the turn's deadline leaves no time for another model call
+PARTIAL_REPLY = (
+    "Sorry, this is taking longer than expected. Could you ask again in a moment, "
+    "or leave your email so our team can follow up?"
+)
+
+
+def tool_timeouts() -> Dict[str, float]:
+    """Per-tool timeouts from TOOL_TIMEOUTS, e.g. schedule_demo=20,calculate_roi=2"""
+    return parse_timeouts(os.getenv("TOOL_TIMEOUTS", ""))
+
+
+async def agent_node(state: AgentState) -> AgentState:
+    """Agent node that processes messages and calls tools if needed.
+
+    Degrades as the turn's deadline approaches: after AGENT_MAX_TOOL_ROUNDS
+    tool rounds or with little time left it must answer without tools, and
+    with no time for a model call it returns a canned partial reply.
+    """
+    deadline = state.get("deadline")
+    remaining = deadlines.remaining(deadline)
+    if remaining < deadlines.min_model_seconds:
+        message = AIMessage(content=PARTIAL_REPLY, response_metadata={"fallback": True})
+        return {"messages": [message], "degradations": ["partial_answer"]}
     
-    system_prompt = load_system_prompt()
-    messages = [SystemMessage(content=system_prompt)] + state["messages"]
+    degradations = []
+    if state.get("tool_rounds", 0) >= deadlines.max_tool_rounds:
+        degradations.append("tool_rounds_capped")
+    elif remaining < deadlines.final_answer_seconds:
+        degradations.append("tools_skipped")
     
-    response = model_with_tools.invoke(messages)
-    return {"messages": [response]}
+    combined = state.get("combined", False) and not degradations
+    if combined:
+        model_with_tools = registry.combined_model(COMBINED_REPLY_TOOL)
+        system = SystemMessage(
+            content=registry.prompt.text() + "\n\n" + combined_instructions(state.get("known_entities") or {})
+        )
+    elif degradations:
+        model_with_tools = registry.final_answer_model()
+        system = registry.prompt.message()
+    else:
+        model_with_tools = registry.agent_model()
+        system = registry.prompt.message()
+    
+    streaming = state.get("streaming", False)
+    
+    async def invoke(model, system_message):
+        async def attempt():
+            with track_llm("agent", registry.model_name) as call:
+                call["response"] = await model.ainvoke([system_message] + state["messages"])
+                return call["response"]
+        return await resilience.call("agent", attempt, hedge=not streaming, retry_timeouts=not streaming,
+                                     deadline=deadline)
+    
+    with NODE_SECONDS.time(node="agent"):
+        try:
+            response = await invoke(model_with_tools, system)
+        except Exception as e:
+            return model_failure(e, deadline, degradations)
+        
+        final = split_combined_reply(response) if combined else None
+        if final is not None:
+            reply, analysis = final
+            if reply.strip():
+                # Keep only the reply in the transcript and hand the analysis to the caller
+                message = AIMessage(content=reply, id=response.id, response_metadata=response.response_metadata,
+                                    usage_metadata=response.usage_metadata)
+                return {"messages": [message], "analysis": analysis, "degradations": degradations}
+            # No usable reply in the tool call; answer again in plain text (the analyzer runs separately)
+            print("Combined reply was empty; answering without the reply tool")
+            try:
+                response = await invoke(registry.final_answer_model(), registry.prompt.message())
+            except Exception as e:
+                return model_failure(e, deadline, degradations)
+    return {"messages": [response], "degradations": degradations}
+
+
+def model_failure(error: Exception, deadline, degradations):
+    """Canned reply for a failed agent model call: partial if out of time, else the fallback"""
+    print(f"Agent model error: {error}")
+    if deadlines.remaining(deadline) <= 0:
+        content, degradation = PARTIAL_REPLY, "partial_answer"
+    else:
+        content, degradation = FALLBACK_REPLY, "fallback_reply"
+    message = AIMessage(content=content, response_metadata={"fallback": True})
+    return {"messages": [message], "degradations": degradations + [degradation]}
 
 
 def should_continue(state: AgentState) -> str:
@@ -30,3 +115,57 @@ def should_continue(state: AgentState) -> str:
     if hasattr(last_message, "tool_calls") and last_message.tool_calls:
         return "tools"
     return "end"
+
+
+def tool_content(output) -> str:
+    """Render a tool result as ToolMessage content"""
+    if isinstance(output, str):
+        return output
+    return json.dumps(output, ensure_ascii=False)
+
+
+async def run_tool_call(call: Dict, semaphore: asyncio.Semaphore, timeout: float) -> ToolMessage:
+    """Execute one tool call, turning failures and timeouts into error messages"""
+    tool = TOOLS_BY_NAME.get(call["name"])
+    if tool is None:
+        return ToolMessage(
+            content=f"Error: {call['name']} is not a valid tool, try one of [{', '.join(TOOLS_BY_NAME)}].",
+            name=call["name"], tool_call_id=call["id"], status="error"
+        )
+    
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            output = await asyncio.wait_for(tool.ainvoke(call["args"]), timeout)
+            TOOL_SECONDS.observe(time.perf_counter() - started, tool=call["name"], status="success")
+            return ToolMessage(content=tool_content(output), name=call["name"], tool_call_id=call["id"])
+        except asyncio.TimeoutError:
+            status = "timeout"
+            content = f"Error: {call['name']} timed out after {timeout:g}s. Continue without this result."
+        except Exception as e:
+            status = "error"
+            content = f"Error: {repr(e)}\n Please fix your mistakes."
+        TOOL_SECONDS.observe(time.perf_counter() - started, tool=call["name"], status=status)
+    return ToolMessage(content=content, name=call["name"], tool_call_id=call["id"], status="error")
+
+
+async def tool_node(state: AgentState) -> AgentState:
+    """Execute the tool calls of the last agent message concurrently.
+
+    At most TOOL_CONCURRENCY calls run at once, each bounded by its timeout
+    (TOOL_TIMEOUTS, default TOOL_TIMEOUT seconds) and by the turn's
+    deadline. Results keep the order of the tool calls.
+    """
+    calls = state["messages"][-1].tool_calls
+    semaphore = asyncio.Semaphore(int(os.getenv("TOOL_CONCURRENCY", 4)))
+    default_timeout = float(os.getenv("TOOL_TIMEOUT", 10))
+    timeouts = tool_timeouts()
+    # Leave the agent time to answer from the results before the deadline
+    budget = max(0.1, deadlines.remaining(state.get("deadline")) - deadlines.min_model_seconds)
+    
+    with NODE_SECONDS.time(node="tools"):
+        results = await asyncio.gather(*[
+            run_tool_call(call, semaphore, min(budget, timeouts.get(call["name"], default_timeout)))
+            for call in calls
+        ])
+    return {"messages": list(results), "tool_rounds": state.get("tool_rounds", 0) + 1}
@@ -0,0 +1,284 @@
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import httpx
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+
+class SalesOutbox:
+    """Durable outbox of qualified-lead events for the sales webhooks.
+
+    enqueue() commits the event to a SQLite file (WAL, in a worker thread)
+    before the turn is answered, so a crash or killed worker loses nothing;
+    the chat path never waits on the network. A background dispatcher
+    POSTs due events to each of OUTBOX_WEBHOOKS every
+    OUTBOX_FLUSH_INTERVAL seconds, in batches of up to OUTBOX_BATCH_SIZE
+    as {"events": [...]}.
+
+    There is one pending row per webhook and lead: new events for a lead
+    replace its undelivered one. A lead already delivered within
+    OUTBOX_DEDUP_TTL seconds is only notified again when its score went up.
+    Failed deliveries are retried with jittered exponential backoff up to
+    OUTBOX_MAX_ATTEMPTS times; 4xx answers other than 408/429 are not
+    retried. Rows are claimed with a lease, so several worker processes can
+    share one file.
+    """
+
+    def __init__(self):
+        self.webhooks = [url.strip() for url in os.getenv("OUTBOX_WEBHOOKS", "").split(",") if url.strip()]
+        self.path = os.getenv("OUTBOX_PATH", "outbox.db")
+        self.flush_interval = float(os.getenv("OUTBOX_FLUSH_INTERVAL", 1))
+        self.batch_size = int(os.getenv("OUTBOX_BATCH_SIZE", 50))
+        self.max_attempts = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 8))
+        self.backoff = float(os.getenv("OUTBOX_RETRY_BACKOFF", 2))
+        self.max_backoff = float(os.getenv("OUTBOX_MAX_BACKOFF", 300))
+        self.dedup_ttl = float(os.getenv("OUTBOX_DEDUP_TTL", 86400))
+        self.timeout = float(os.getenv("OUTBOX_TIMEOUT", 10))
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._http: Optional[httpx.AsyncClient] = None
+        self.counters = {
+            "enqueued": 0, "write_failed": 0, "coalesced": 0, "duplicates": 0, "delivered": 0,
+            "batches": 0, "failed_attempts": 0, "dead": 0
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.webhooks)
+
+    async def enqueue(self, user_id: str, platform: str, metadata: Dict,
+                      conversation_id: Optional[str] = None, known_entities: Optional[Dict] = None):
+        """Persist a qualified-lead event if should_notify_sales is set; delivery happens later"""
+        if not self.enabled or not metadata.get("should_notify_sales"):
+            return
+        entities = dict(known_entities or {})
+        entities.update({k: v for k, v in metadata.get("new_entities", {}).items() if v})
+        event = {
+            "event_id": uuid.uuid4().hex,
+            "type": "qualified_lead",
+            "lead_key": f"{platform}:{user_id}",
+            "user_id": user_id,
+            "platform": platform,
+            "conversation_id": conversation_id,
+            "lead_score": metadata.get("lead_score", 0),
+            "urgency": metadata.get("urgency"),
+            "intent": metadata.get("intent"),
+            "suggested_action": metadata.get("suggested_action"),
+            "entities": entities,
+            "occurred_at": time.time()
+        }
+        try:
+            await asyncio.to_thread(self._write, [event])
+        except Exception as e:
+            self.counters["write_failed"] += 1
+            print(f"Sales notification for {event['lead_key']} not recorded: {e}")
+            return
+        self.counters["enqueued"] += 1
+
+    # -- SQLite (runs in a worker thread) --
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                "webhook TEXT NOT NULL, lead_key TEXT NOT NULL, event TEXT NOT NULL, "
+                "lead_score INTEGER NOT NULL, events INTEGER NOT NULL, updated_at REAL NOT NULL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL, "
+                "claimed_until REAL NOT NULL DEFAULT 0, dead INTEGER NOT NULL DEFAULT 0, last_error TEXT, "
+                "PRIMARY KEY (webhook, lead_key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (webhook, dead, next_attempt_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox_delivered ("
+                "webhook TEXT NOT NULL, lead_key TEXT NOT NULL, lead_score INTEGER NOT NULL, "
+                "delivered_at REAL NOT NULL, PRIMARY KEY (webhook, lead_key))"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _write(self, events: List[Dict]):
+        """Persist events, coalescing per lead and dropping recent duplicates"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for event in events:
+                    for webhook in self.webhooks:
+                        row = conn.execute(
+                            "SELECT lead_score, delivered_at FROM outbox_delivered WHERE webhook = ? AND lead_key = ?",
+                            (webhook, event["lead_key"])
+                        ).fetchone()
+                        if row and event["occurred_at"] - row[1] < self.dedup_ttl and event["lead_score"] <= row[0]:
+                            self.counters["duplicates"] += 1
+                            continue
+                        cursor = conn.execute(
+                            "INSERT INTO outbox (webhook, lead_key, event, lead_score, events, updated_at, "
+                            "next_attempt_at) VALUES (?, ?, ?, ?, 1, ?, ?) "
+                            "ON CONFLICT (webhook, lead_key) DO UPDATE SET event = excluded.event, "
+                            "lead_score = excluded.lead_score, events = outbox.events + 1, "
+                            "updated_at = excluded.updated_at, dead = 0, attempts = 0, "
+                            "next_attempt_at = MIN(outbox.next_attempt_at, excluded.next_attempt_at) "
+                            "RETURNING events",
+                            (webhook, event["lead_key"], json.dumps(event), event["lead_score"],
+                             event["occurred_at"], event["occurred_at"])
+                        )
+                        if cursor.fetchone()[0] > 1:
+                            self.counters["coalesced"] += 1
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _claim(self, webhook: str) -> List[Tuple[str, float, str]]:
+        """Lease a batch of due events for this webhook: (lead_key, updated_at, event json)"""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    "SELECT lead_key, updated_at, event FROM outbox WHERE webhook = ? AND dead = 0 "
+                    "AND next_attempt_at <= ? AND claimed_until < ? ORDER BY next_attempt_at LIMIT ?",
+                    (webhook, now, now, self.batch_size)
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE outbox SET claimed_until = ? WHERE webhook = ? AND lead_key = ?",
+                    [(now + self.timeout * 2, webhook, row[0]) for row in rows]
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return rows
+
+    def _delivered(self, webhook: str, rows: List[Tuple[str, float, str]]):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for lead_key, updated_at, event in rows:
+                    # A newer event that arrived during delivery stays queued
+                    conn.execute(
+                        "DELETE FROM outbox WHERE webhook = ? AND lead_key = ? AND updated_at = ?",
+                        (webhook, lead_key, updated_at)
+                    )
+                    conn.execute(
+                        "INSERT OR REPLACE INTO outbox_delivered (webhook, lead_key, lead_score, delivered_at) "
+                        "VALUES (?, ?, ?, ?)",
+                        (webhook, lead_key, json.loads(event)["lead_score"], now)
+                    )
+                conn.execute("DELETE FROM outbox_delivered WHERE delivered_at < ?", (now - self.dedup_ttl,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _failed(self, webhook: str, rows: List[Tuple[str, float, str]], error: str, retry: bool):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                given_up = []
+                for lead_key, _, _ in rows:
+                    attempts = conn.execute(
+                        "SELECT attempts FROM outbox WHERE webhook = ? AND lead_key = ?", (webhook, lead_key)
+                    ).fetchone()
+                    if attempts is None:
+                        continue
+                    attempts = attempts[0] + 1
+                    dead = not retry or attempts >= self.max_attempts
+                    delay = random.uniform(0.5, 1) * min(self.max_backoff, self.backoff * 2 ** (attempts - 1))
+                    conn.execute(
+                        "UPDATE outbox SET attempts = ?, next_attempt_at = ?, claimed_until = 0, dead = ?, "
+                        "last_error = ? WHERE webhook = ? AND lead_key = ?",
+                        (attempts, now + delay, int(dead), error[:500], webhook, lead_key)
+                    )
+                    if dead:
+                        given_up.append((lead_key, attempts))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        for lead_key, attempts in given_up:
+            self.counters["dead"] += 1
+            print(f"Sales notification for {lead_key} to {webhook} given up after {attempts} attempts: {error}")
+
+    def _stats(self) -> Dict:
+        with self._lock:
+            pending, dead = self._connect().execute(
+                "SELECT COALESCE(SUM(dead = 0), 0), COALESCE(SUM(dead = 1), 0) FROM outbox"
+            ).fetchone()
+        return {"pending": pending, "dead": dead}
+
+    # -- dispatcher --
+
+    async def _deliver(self, webhook: str) -> int:
+        """Send one batch to a webhook; returns how many events it held"""
+        rows = await asyncio.to_thread(self._claim, webhook)
+        if not rows:
+            return 0
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=self.timeout)
+        try:
+            resp = await self._http.post(webhook, json={"events": [json.loads(row[2]) for row in rows]})
+            resp.raise_for_status()
+        except Exception as e:
+            status = getattr(getattr(e, "response", None), "status_code", None)
+            retry = status is None or status in (408, 429) or status >= 500
+            self.counters["failed_attempts"] += 1
+            await asyncio.to_thread(self._failed, webhook, rows, str(e), retry)
+            return 0
+        await asyncio.to_thread(self._delivered, webhook, rows)
+        self.counters["delivered"] += len(rows)
+        self.counters["batches"] += 1
+        return len(rows)
+
+    async def _run(self):
+        while True:
+            try:
+                for webhook in self.webhooks:
+                    # Keep sending while full batches are due
+                    while await self._deliver(webhook) >= self.batch_size:
+                        pass
+            except Exception as e:
+                print(f"Sales outbox error: {e}")
+            await asyncio.sleep(self.flush_interval)
+
+    def start(self):
+        """Start the dispatcher (after forking: each worker opens its own connection)"""
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop dispatching; undelivered events stay in the outbox file"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+                self._conn = None
+
+    async def stats(self) -> Dict:
+        stats = {"enabled": self.enabled, "webhooks": len(self.webhooks), **self.counters}
+        if self.enabled:
+            stats.update(await asyncio.to_thread(self._stats))
+        return stats
+
+
+# Singleton instance
+outbox = SalesOutbox()
@@ -0,0 +1,153 @@
+from typing import TYPE_CHECKING, Dict, Optional
+from langchain_core.messages import SystemMessage
+from .catalog import catalog
+import httpx
+import os
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+
+
+PROMPT_PATH = os.path.join(os.path.dirname(__file__), "..", "prompts", "system.txt")
+
+
+class PromptCache:
+    """Keeps a prompt file in memory and reloads it only when its mtime changes"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime: Optional[int] = None
+        self._text = ""
+        self._message: Optional[SystemMessage] = None
+
+    def _refresh(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime != self._mtime:
+            with open(self.path, "r") as f:
+                self._text = f.read()
+            self._message = SystemMessage(content=self._text)
+            self._mtime = mtime
+
+    @property
+    def version(self) -> Optional[int]:
+        """mtime of the currently loaded prompt (changes on every reload)"""
+        self._refresh()
+        return self._mtime
+
+    def text(self) -> str:
+        self._refresh()
+        return self._text
+
+    def message(self) -> SystemMessage:
+        self._refresh()
+        return self._message
+
+
+class ModelRegistry:
+    """Process-wide owner of long-lived LLM clients.
+
+    All clients share one keep-alive HTTP connection pool, and the tool-bound
+    agent model is built once instead of on every graph step (and again after
+    a catalog reload, since the tool schemas list the plans).
+    """
+
+    def __init__(self):
+        self.prompt = PromptCache(PROMPT_PATH)
+        self._http_client: Optional[httpx.Client] = None
+        self._http_async_client: Optional[httpx.AsyncClient] = None
+        self._chat_model: Optional["ChatOpenAI"] = None
+        self._agent_model = None
+        self._combined_model = None
+        self._final_answer_model = None
+        self._tools_version: Optional[str] = None  # catalog version the tool-bound models were built for
+
+    @property
+    def model_name(self) -> str:
+        return os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", 100)),
+            max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE", 20)),
+            keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", 60)),
+        )
+
+    @property
+    def http_client(self) -> httpx.Client:
+        if self._http_client is None:
+            self._http_client = httpx.Client(limits=self._limits(), timeout=None)
+        return self._http_client
+
+    @property
+    def http_async_client(self) -> httpx.AsyncClient:
+        if self._http_async_client is None:
+            self._http_async_client = httpx.AsyncClient(limits=self._limits(), timeout=None)
+        return self._http_async_client
+
+    def chat_model(self) -> "ChatOpenAI":
+        """Shared deterministic chat model (used by the analyzer)"""
+        if self._chat_model is None:
+            # langchain_openai (and openai) are slow to import; load them on first use
+            from langchain_openai import ChatOpenAI
+            self._chat_model = ChatOpenAI(
+                model=self.model_name,
+                temperature=0,
+                stream_usage=True,
+                max_retries=0,  # retries, timeouts and hedging live in resilience.py
+                http_client=self.http_client,
+                http_async_client=self.http_async_client,
+            )
+        return self._chat_model
+
+    def _check_catalog(self):
+        """Drop tool-bound models built for an older catalog version"""
+        if catalog.version != self._tools_version:
+            self._agent_model = None
+            self._combined_model = None
+            self._final_answer_model = None
+            self._tools_version = catalog.version
+
+    def agent_model(self):
+        """Chat model with the agent tools bound (schemas serialized once per catalog version)"""
+        self._check_catalog()
+        if self._agent_model is None:
+            from .tools_enhanced import agent_tools
+            self._agent_model = self.chat_model().bind_tools(agent_tools())
+        return self._agent_model
+
+    def combined_model(self, reply_tool: Dict):
+        """Agent model that must answer through reply_tool (combined reply + analysis)"""
+        self._check_catalog()
+        if self._combined_model is None:
+            from .tools_enhanced import agent_tools
+            self._combined_model = self.chat_model().bind_tools(agent_tools() + [reply_tool], tool_choice="required")
+        return self._combined_model
+
+    def final_answer_model(self):
+        """Agent model that may not call tools (same tool schemas, so the prompt prefix is unchanged)"""
+        self._check_catalog()
+        if self._final_answer_model is None:
+            from .tools_enhanced import agent_tools
+            self._final_answer_model = self.chat_model().bind_tools(agent_tools(), tool_choice="none")
+        return self._final_answer_model
+
+    def reset(self):
+        """Drop cached models so they are rebuilt on next use"""
+        self._chat_model = None
+        self._agent_model = None
+        self._combined_model = None
+        self._final_answer_model = None
+
+    async def aclose(self):
+        """Close the shared connection pools"""
+        self.reset()
+        if self._http_async_client is not None:
+            await self._http_async_client.aclose()
+            self._http_async_client = None
+        if self._http_client is not None:
+            self._http_client.close()
+            self._http_client = None
+
+
+# Singleton instance
+registry = ModelRegistry()
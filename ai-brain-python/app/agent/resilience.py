@@ -0,0 +1,263 @@
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+import asyncio
+import httpx
+import math
+import os
+import random
+import time
+
+
+class CircuitOpen(Exception):
+    """The model API is failing; callers should fall back immediately"""
+
+
+def parse_timeouts(spec: str) -> Dict[str, float]:
+    """Timeouts by name from a spec like agent=30,analyzer=15 (LLM_TIMEOUTS, TOOL_TIMEOUTS)"""
+    timeouts = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, seconds = item.split("=", 1)
+            timeouts[name.strip()] = float(seconds)
+    return timeouts
+
+
+def retryable(error: BaseException) -> bool:
+    """Timeouts, connection errors, 408/409/429 and 5xx are worth another try"""
+    if isinstance(error, (asyncio.TimeoutError, httpx.TransportError)):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    from openai import APIConnectionError
+    return isinstance(error, APIConnectionError)
+
+
+class CircuitBreaker:
+    """Error-rate circuit breaker over a sliding window of recent attempts.
+
+    The window holds the last BREAKER_WINDOW_SIZE attempts that are at most
+    BREAKER_WINDOW seconds old. The circuit opens when it holds at least
+    BREAKER_MIN_CALLS attempts and BREAKER_ERROR_RATE or more of them failed.
+    After BREAKER_COOLDOWN seconds one probe call is let through: success
+    closes the circuit, failure opens it again.
+    """
+
+    def __init__(self):
+        self.window = float(os.getenv("BREAKER_WINDOW", 30))
+        self.window_size = int(os.getenv("BREAKER_WINDOW_SIZE", 20))
+        self.min_calls = int(os.getenv("BREAKER_MIN_CALLS", 10))
+        self.error_rate = float(os.getenv("BREAKER_ERROR_RATE", 0.5))
+        self.cooldown = float(os.getenv("BREAKER_COOLDOWN", 15))
+        self.state = "closed"
+        self.trips = 0
+        self._events: Deque[Tuple[float, bool]] = deque()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._probes = 0  # id of the latest probe, so only its caller can release it
+
+    def _prune(self, now: float):
+        while self._events and now - self._events[0][0] > self.window:
+            _, ok = self._events.popleft()
+            if not ok:
+                self._failures -= 1
+
+    def _open(self, now: float):
+        self.state = "open"
+        self._opened_at = now
+        self._probing = False
+        self.trips += 1
+
+    def allow(self) -> Optional[int]:
+        """Whether a model call may be attempted now: None if not, else a probe id (0 unless half-open).
+
+        A caller that got a probe id must pass it to release() when its
+        attempt ends, whatever the outcome.
+        """
+        if self.state == "open":
+            if time.monotonic() - self._opened_at < self.cooldown:
+                return None
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probing:
+                return None
+            self._probing = True
+            self._probes += 1
+            return self._probes
+        return 0
+
+    def release(self, probe: int):
+        """Free the half-open probe slot if the probe ended without a verdict (e.g. it was cancelled)"""
+        if probe and probe == self._probes and self.state == "half_open":
+            self._probing = False
+
+    def record(self, ok: bool):
+        now = time.monotonic()
+        if self.state == "half_open":
+            self._probing = False
+            if ok:
+                self.state = "closed"
+                self._events.clear()
+                self._failures = 0
+            else:
+                self._open(now)
+            return
+        if self.state == "open":
+            return  # a straggler from before the circuit opened
+
+        self._events.append((now, ok))
+        if not ok:
+            self._failures += 1
+        if len(self._events) > self.window_size:
+            _, dropped = self._events.popleft()
+            if not dropped:
+                self._failures -= 1
+        self._prune(now)
+        if len(self._events) >= self.min_calls and self._failures / len(self._events) >= self.error_rate:
+            self._open(now)
+
+    def stats(self) -> Dict:
+        self._prune(time.monotonic())
+        calls = len(self._events)
+        return {
+            "state": self.state,
+            "trips": self.trips,
+            "window_calls": calls,
+            "window_error_rate": round(self._failures / calls, 4) if calls else 0.0
+        }
+
+
+class Resilience:
+    """Timeouts, retries, hedging and circuit breaking for model calls.
+
+    Every attempt is bounded by LLM_TIMEOUT seconds (per call kind via
+    LLM_TIMEOUTS). Retryable failures are retried up to LLM_RETRIES times
+    with full-jitter exponential backoff starting at LLM_RETRY_BACKOFF
+    seconds. With LLM_HEDGE=true, an attempt still running after the
+    observed LLM_HEDGE_QUANTILE latency of its call kind gets a second,
+    identical request, and whichever finishes first wins. While the circuit
+    breaker is open calls fail fast with CircuitOpen.
+    """
+
+    def __init__(self):
+        self.default_timeout = float(os.getenv("LLM_TIMEOUT", 30))
+        self.timeouts = parse_timeouts(os.getenv("LLM_TIMEOUTS", ""))
+        self.retries = int(os.getenv("LLM_RETRIES", 2))
+        self.backoff = float(os.getenv("LLM_RETRY_BACKOFF", 0.5))
+        self.hedge = os.getenv("LLM_HEDGE", "false").lower() == "true"
+        self.hedge_quantile = float(os.getenv("LLM_HEDGE_QUANTILE", 0.95))
+        self.hedge_min_samples = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", 20))
+        self.hedge_min_delay = float(os.getenv("LLM_HEDGE_MIN_DELAY", 0.2))
+        self.breaker = CircuitBreaker()
+        self._latencies: Dict[str, Deque[float]] = {}
+        self.counters = {
+            "calls": 0, "succeeded": 0, "failed": 0, "short_circuited": 0,
+            "timeouts": 0, "retries": 0, "hedged": 0, "hedge_wins": 0
+        }
+
+    def timeout_for(self, kind: str) -> float:
+        return self.timeouts.get(kind, self.default_timeout)
+
+    def hedge_delay(self, kind: str) -> Optional[float]:
+        """Observed latency quantile after which to hedge, or None if not enough data"""
+        samples = self._latencies.get(kind)
+        if not samples or len(samples) < self.hedge_min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, math.ceil(self.hedge_quantile * len(ordered)) - 1)
+        return max(self.hedge_min_delay, ordered[index])
+
+    async def _timed(self, kind: str, factory: Callable[[], Awaitable], timeout: float):
+        """One request under a timeout; feeds the latency window and the breaker"""
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(factory(), timeout)
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            self.breaker.record(False)
+            raise
+        except Exception as e:
+            # A non-retryable error (e.g. a 400) still means the API is up
+            self.breaker.record(not retryable(e))
+            raise
+        self.breaker.record(True)
+        self._latencies.setdefault(kind, deque(maxlen=200)).append(time.monotonic() - started)
+        return result
+
+    async def _attempt(self, kind: str, factory: Callable[[], Awaitable], hedge: bool, timeout: float):
+        delay = self.hedge_delay(kind) if hedge and self.hedge and self.breaker.state == "closed" else None
+        first = asyncio.ensure_future(self._timed(kind, factory, timeout))
+        tasks = {first}
+        try:
+            if delay is None or delay >= timeout:
+                return await first
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.counters["hedged"] += 1
+                second = asyncio.ensure_future(self._timed(kind, factory, timeout - delay))
+                tasks.add(second)
+            error: Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.counters["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def call(self, kind: str, factory: Callable[[], Awaitable], hedge: bool = True,
+                   retry_timeouts: bool = True, deadline: Optional[float] = None):
+        """Run factory() (one model request) with timeouts, retries and hedging.
+
+        Pass hedge=False, retry_timeouts=False for streamed calls, whose
+        tokens must not be emitted twice. With a deadline (time.monotonic()
+        value) attempts are cut short and not retried past it.
+        """
+        self.counters["calls"] += 1
+        for attempt in range(self.retries + 1):
+            timeout = self.timeout_for(kind)
+            if deadline is not None:
+                timeout = min(timeout, deadline - time.monotonic())
+                if timeout <= 0:
+                    self.counters["failed"] += 1
+                    raise asyncio.TimeoutError("Request deadline exceeded")
+            probe = self.breaker.allow()
+            if probe is None:
+                self.counters["short_circuited"] += 1
+                raise CircuitOpen("Model API circuit is open")
+            try:
+                result = await self._attempt(kind, factory, hedge, timeout)
+                self.counters["succeeded"] += 1
+                return result
+            except Exception as e:
+                last = attempt == self.retries
+                if last or not retryable(e) or (isinstance(e, asyncio.TimeoutError) and not retry_timeouts):
+                    self.counters["failed"] += 1
+                    raise
+            finally:
+                # Cancelled (or never started) probes must not keep the circuit half-open forever
+                self.breaker.release(probe)
+            self.counters["retries"] += 1
+            await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    def stats(self) -> Dict:
+        return {
+            **self.counters,
+            "breaker": self.breaker.stats(),
+            "hedge": self.hedge,
+            "hedge_after_seconds": {
+                kind: round(delay, 3) for kind in self._latencies
+                if (delay := self.hedge_delay(kind)) is not None
+            },
+            "timeouts_seconds": {kind: self.timeout_for(kind) for kind in ("agent", "analyzer", "summary")}
+        }
+
+
+# Singleton instance
+resilience = Resilience()
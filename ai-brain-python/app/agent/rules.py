@@ -0,0 +1,179 @@
+from typing import Dict, List, Optional
+from .catalog import catalog
+import re
+
+
+EMAIL_RE = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+PHONE_RE = re.compile(r"(?<![\w@])\+?\(?\d[\d\s().-]{6,}\d(?!\w)")
+# A digit run is only a phone number with a leading + or one of these words before it
+PHONE_CONTEXT_RE = re.compile(r"\b(?:phone|mobile|cell|tel|telephone|call|text|whatsapp|number|reach|contact)\b",
+                              re.IGNORECASE)
+NOT_PHONE_CONTEXT_RE = re.compile(r"\b(?:order|invoice|ticket|account|acct|ref|reference|tracking|id)\b",
+                                  re.IGNORECASE)
+DATE_TIME_RE = re.compile(r"\d{4}-\d{1,2}-\d{1,2}|\d{1,2}[/.]\d{1,2}[/.]\d{2,4}|\d{1,2}:\d{2}")
+NAME_RE = re.compile(r"\bmy name is ([A-Z][a-z]+(?: [A-Z][a-z]+)?)")
+# Plan pattern for the catalog version it was built from
+_plan_re: Optional[re.Pattern] = None
+_plan_version: Optional[str] = None
+
+# Words that suggest a message may change intent or sentiment
+SIGNAL_RE = re.compile(
+    r"\b(?:price|pricing|cost|costs|expensive|cheap|plan|plans|demo|trial|meeting|call|"
+    r"feature|features|integrat\w*|api|support|help|issue|problem|bug|error|broken|"
+    r"refund|cancel|complain\w*|disappoint\w*|frustrat\w*|angry|terrible|awful|worst|"
+    r"love|great|amazing|awesome|excellent|buy|purchase|subscribe|sign up|budget|"
+    r"team|company|compare|roi|discount|meet|meeting|schedul\w*|reschedul\w*|appointment|book\w*|"
+    r"order\w*|fail\w*|invoice|payment|charg\w*|"
+    # negation, withdrawal and negative sentiment ("not interested anymore", "stop messaging me")
+    r"no|not|nope|never|don'?t|won'?t|can'?t|isn'?t|anymore|stop\w*|forget|nevermind|never mind|"
+    r"unsubscribe|remove|leave|quit|pass|later|busy|changed my mind|"
+    r"useless|pointless|waste|suck\w*|hate\w*|bad|worse|poor|annoy\w*|spam\w*|scam\w*|ridiculous|stupid)\b",
+    re.IGNORECASE
+)
+
+INTENT_POINTS = {
+    "demo_request": 30,
+    "pricing_inquiry": 25,
+    "feature_inquiry": 20,
+    "general_inquiry": 10,
+    "support": 5,
+}
+SENTIMENT_POINTS = {"positive": 15, "neutral": 10, "negative": 0}
+ENTITY_POINTS = {"name": 10, "email": 15, "phone": 10, "company": 5, "plan_interest": 10, "budget": 5}
+
+
+def plan_pattern() -> Optional[re.Pattern]:
+    """Pattern for plan interest in the catalog's current plans, rebuilt after a catalog reload"""
+    global _plan_re, _plan_version
+    snapshot = catalog.snapshot
+    if snapshot.version != _plan_version:
+        plans = "|".join(re.escape(plan) for plan in snapshot.pricing)
+        _plan_re = re.compile(
+            r"\b(?:(" + plans + r")\s+(?:plan|tier|package|subscription)"
+            r"|(?:interested in|go with|choose|sign up for|upgrade to|buy|want)\s+(?:the\s+)?("
+            + plans + r"))\b",
+            re.IGNORECASE
+        ) if plans else None
+        _plan_version = snapshot.version
+    return _plan_re
+
+
+def find_phone(text: str) -> Optional[re.Match]:
+    """First phone number in text, ignoring dates, times and order or account numbers"""
+    for match in PHONE_RE.finditer(text):
+        candidate = match.group(0).strip()
+        digits = re.sub(r"\D", "", candidate)
+        if not 10 <= len(digits) <= 15 or DATE_TIME_RE.search(text, match.start(), match.end() + 3):
+            continue
+        if candidate.startswith("+"):
+            return match
+        before = text[max(0, match.start() - 40):match.start()]
+        if PHONE_CONTEXT_RE.search(before) and not NOT_PHONE_CONTEXT_RE.search(before):
+            return match
+    return None
+
+
+def extract_entities(text: str) -> Dict[str, str]:
+    """Pattern-extract email, phone, name and plan interest from user text"""
+    entities = {}
+    
+    email = EMAIL_RE.search(text)
+    if email:
+        entities["email"] = email.group(0)
+    
+    phone = find_phone(text)
+    if phone:
+        entities["phone"] = phone.group(0).strip()
+    
+    name = NAME_RE.search(text)
+    if name:
+        entities["name"] = name.group(1)
+    
+    pattern = plan_pattern()
+    plan = pattern.search(text) if pattern else None
+    if plan:
+        entities["plan_interest"] = (plan.group(1) or plan.group(2)).lower()
+    
+    return entities
+
+
+def score_components(entities: Dict, intent: str, sentiment: str) -> Dict[str, int]:
+    """Points per lead_score component, as defined in the analyzer prompt"""
+    components = {
+        key: points for key, points in ENTITY_POINTS.items() if entities.get(key)
+    }
+    components["intent"] = INTENT_POINTS.get(intent, 0)
+    components["sentiment"] = SENTIMENT_POINTS.get(sentiment, 0)
+    return components
+
+
+def compute_urgency(entities: Dict, intent: str, sentiment: str) -> str:
+    if intent in ("demo_request", "complaint") or (intent == "pricing_inquiry" and sentiment == "positive"):
+        return "high"
+    if entities.get("budget") or entities.get("plan_interest"):
+        return "medium"
+    return "low"
+
+
+def suggest_action(lead_score: int, intent: str) -> str:
+    if lead_score >= 70:
+        if intent == "demo_request":
+            return "schedule_demo"
+        if intent == "pricing_inquiry":
+            return "send_pricing_proposal"
+        return "sales_follow_up"
+    if lead_score >= 50:
+        if intent == "pricing_inquiry":
+            return "send_pricing_info"
+        if intent == "feature_inquiry":
+            return "send_feature_guide"
+        return "nurture_lead"
+    return "continue_conversation"
+
+
+def apply_rules(analysis: Dict, known_entities: Dict, user_text: str, extract: bool = True) -> Dict:
+    """Fill in pattern-extractable entities and score the lead in code.
+
+    Pattern matches only fill entities that are not known yet, and only
+    with extract=True: when the model read the messages (extract=False),
+    what it left out stays out. lead_score, urgency, suggested_action and
+    should_notify_sales are recomputed from the additive formula so they
+    are reproducible.
+    """
+    new_entities = dict(analysis.get("new_entities", {}))
+    if extract:
+        for key, value in extract_entities(user_text).items():
+            if not known_entities.get(key) and not new_entities.get(key):
+                new_entities[key] = value
+    
+    entities = {**known_entities, **new_entities}
+    intent = analysis.get("intent", "general_inquiry")
+    sentiment = analysis.get("sentiment", "neutral")
+    lead_score = min(100, sum(score_components(entities, intent, sentiment).values()))
+    
+    return {
+        **analysis,
+        "new_entities": new_entities,
+        "lead_score": lead_score,
+        "urgency": compute_urgency(entities, intent, sentiment),
+        "suggested_action": suggest_action(lead_score, intent),
+        "should_notify_sales": lead_score >= 70
+    }
+
+
+def needs_llm(new_messages: List[str], max_words: int = 12) -> bool:
+    """Whether new user messages plausibly change intent or sentiment.
+
+    Short follow-ups that only carry pattern-extractable details (an email,
+    a phone number, "thanks") can be scored locally.
+    """
+    for text in new_messages:
+        stripped = EMAIL_RE.sub(" ", text)
+        phone = find_phone(stripped)
+        if phone:
+            stripped = stripped[:phone.start()] + " " + stripped[phone.end():]
+        if "?" in stripped or SIGNAL_RE.search(stripped):
+            return True
+        if len(stripped.split()) > max_words:
+            return True
+    return False
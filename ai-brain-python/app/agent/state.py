@@ -1,9 +1,17 @@
-from typing import Annotated
+from typing import Annotated, Dict, List, Optional
 from typing_extensions import TypedDict
 from langgraph.graph.message import add_messages
+import operator
 
 
 class AgentState(TypedDict):
     messages: Annotated[list, add_messages]
     user_id: str
     platform: str
+    known_entities: Dict
+    combined: bool  # final answer is a JSON reply plus analysis
+    analysis: Optional[Dict]  # set by the agent node in combined mode
+    streaming: bool  # tokens are streamed to the client: no hedged or re-sent calls
+    deadline: Optional[float]  # time.monotonic() by which the turn should be answered
+    tool_rounds: int  # tool node runs so far this turn
+    degradations: Annotated[List[str], operator.add]  # see deadline.DEGRADATIONS
@@ -1,61 +1,21 @@
 from langchain_core.tools import tool
 from datetime import datetime, timedelta
+from .catalog import catalog
 
 
 def get_pricing_service(plan: str) -> dict:
     """Service function containing business logic for pricing"""
-    pricing = {
-        "basic": {
-            "price": 29,
-            "billing": "monthly",
-            "features": ["10 leads/day", "Email support", "Basic analytics"],
-            "best_for": "Small businesses and startups"
-        },
-        "pro": {
-            "price": 99,
-            "billing": "monthly",
-            "features": ["100 leads/day", "Priority support", "API access", "Advanced analytics", "Custom integrations"],
-            "best_for": "Growing businesses"
-        },
-        "enterprise": {
-            "price": 299,
-            "billing": "monthly",
-            "features": ["Unlimited leads", "24/7 support", "Custom integration", "Dedicated account manager", "SLA guarantee"],
-            "best_for": "Large enterprises"
-        }
-    }
-    return pricing.get(plan.lower(), {"error": "Plan not found. Available plans: basic, pro, enterprise"})
+    return catalog.get_pricing(plan)
 
 
 def get_features_service(plan: str = "all") -> dict:
     """Service function for feature information"""
-    features = {
-        "basic": {
-            "lead_capture": "10 leads per day",
-            "platforms": ["Web chat"],
-            "analytics": "Basic dashboard",
-            "support": "Email support (24h response)",
-            "integrations": "None"
-        },
-        "pro": {
-            "lead_capture": "100 leads per day",
-            "platforms": ["Web chat", "Telegram", "WhatsApp"],
-            "analytics": "Advanced analytics with exports",
-            "support": "Priority email + chat support",
-            "integrations": "Zapier, Webhooks, REST API"
-        },
-        "enterprise": {
-            "lead_capture": "Unlimited",
-            "platforms": ["All platforms + custom"],
-            "analytics": "Full analytics suite + custom reports",
-            "support": "24/7 phone + dedicated manager",
-            "integrations": "All integrations + custom development"
-        }
-    }
-    
-    if plan.lower() == "all":
-        return features
-    return features.get(plan.lower(), {"error": "Plan not found"})
+    return catalog.get_features(plan)
+
+
+def get_company_info_service() -> dict:
+    """Service function for company information"""
+    return catalog.get_company_info()
 
 
 def schedule_demo_service(name: str, email: str, preferred_date: str = None) -> dict:
@@ -107,16 +67,23 @@ def calculate_roi_service(current_leads: int, conversion_rate: float, avg_deal_v
     }
 
 
+# Catalog tools return payloads pre-serialized by the catalog
 @tool
-def get_pricing(plan: str) -> dict:
-    """Get pricing information for a specific plan. Available plans: basic, pro, enterprise."""
-    return get_pricing_service(plan)
+def get_pricing(plan: str) -> str:
+    """Get pricing information for a specific plan."""
+    return catalog.get_pricing_json(plan)
 
 
 @tool
-def get_features(plan: str = "all") -> dict:
+def get_features(plan: str = "all") -> str:
     """Get detailed features for a plan. Use 'all' to compare all plans."""
-    return get_features_service(plan)
+    return catalog.get_features_json(plan)
+
+
+@tool
+def get_company_info() -> str:
+    """Get general information about LeadGenLite company, mission, benefits, and contact details."""
+    return catalog.get_company_info_json()
 
 
 @tool
@@ -136,4 +103,11 @@ def calculate_roi(current_leads: int, conversion_rate: float, avg_deal_value: fl
     return calculate_roi_service(current_leads, conversion_rate, avg_deal_value)
 
 
-TOOLS = [get_pricing, get_features, schedule_demo, calculate_roi]
+TOOLS = [get_pricing, get_features, schedule_demo, calculate_roi, get_company_info]
+
+
+def agent_tools() -> list:
+    """TOOLS as bound to the model, with the catalog's current plans in the get_pricing description"""
+    plans = ", ".join(catalog.plans())
+    pricing = get_pricing.model_copy(update={"description": f"{get_pricing.description} Available plans: {plans}."})
+    return [pricing if t is get_pricing else t for t in TOOLS]
@@ -1,9 +1,29 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel, Field
+from fastapi import APIRouter, Header, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, Field, PrivateAttr, field_validator
 from typing import List, Dict, Optional
 from langchain_core.messages import HumanMessage, AIMessage
-from app.agent.graph import graph
-from app.agent.analyzer import analyze_conversation
+from app.agent.graph import get_graph
+from app.agent.admission import admission, AdmissionRejected, Ticket
+from app.agent.analysis_state import analysis_states
+from app.agent.analyzer import (
+    analyze_conversation, remember_analysis, accept_combined_analysis, combined_enabled, deadline_analysis,
+    fast_path_analysis
+)
+from app.agent.analysis_queue import analysis_queue
+from app.agent.answer_cache import answer_cache
+from app.agent.deadline import deadlines
+from app.agent.fast_path import fast_path
+from app.agent.history import history_manager
+from app.agent.idempotency import idempotency, IdempotencyConflict
+from app.agent.memory import memory
+from app.agent.outbox import outbox
+from app.agent.resilience import resilience
+import asyncio
+import hashlib
+import json
+import os
 
 
 router = APIRouter()
@@ -21,6 +41,19 @@ class ChatRequest(BaseModel):
     history: List[MessageHistory] = Field(default_factory=list)
     platform_data: Dict = Field(default_factory=dict)
     known_entities: Dict = Field(default_factory=dict)
+    defer_analysis: bool = False  # return the reply now, analyze on the worker pool
+    callback_url: Optional[str] = None  # POST deferred analysis results here (ANALYSIS_CALLBACK_ALLOWLIST)
+    conversation_id: Optional[str] = None  # use the server-side session; history may be omitted
+    idempotency_key: Optional[str] = None  # or the Idempotency-Key header; derived if omitted
+    deadline_ms: Optional[int] = Field(None, gt=0)  # time budget for the turn; default CHAT_DEADLINE
+    _history_offset: int = PrivateAttr(0)  # messages the server-side session has trimmed before history
+
+    @field_validator("callback_url")
+    @classmethod
+    def check_callback_url(cls, url: Optional[str]) -> Optional[str]:
+        if url is not None and not analysis_queue.callback_allowed(url):
+            raise ValueError("callback_url is not in ANALYSIS_CALLBACK_ALLOWLIST")
+        return url
 
 
 class Metadata(BaseModel):
@@ -40,88 +73,682 @@ class ChatResponse(BaseModel):
     response: str
     success: bool
     metadata: Metadata
+    analysis_id: Optional[str] = None  # set when analysis was deferred
+    conversation_id: Optional[str] = None
+    degradations: List[str] = Field(default_factory=list)  # shortcuts taken to meet the deadline or survive failures
 
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
-    """Handle chat requests with conversation history and AI analysis"""
+class BatchChatRequest(BaseModel):
+    requests: List[ChatRequest]
+    concurrency: Optional[int] = None  # capped by CHAT_BATCH_CONCURRENCY
+    stream: bool = False  # NDJSON lines in completion order
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    success: bool
+    result: Optional[ChatResponse] = None
+    error: Optional[str] = None
+
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchItemResult]
+    succeeded: int
+    failed: int
+
+
+def build_state(request: ChatRequest, deadline: Optional[float] = None) -> Dict:
+    """Convert a chat request into the initial agent graph state"""
+    messages = []
+    for msg in request.history:
+        if msg.role == "user":
+            messages.append(HumanMessage(content=msg.content))
+        else:
+            messages.append(AIMessage(content=msg.content))
+    
+    # Add current user message
+    messages.append(HumanMessage(content=request.message))
+    
+    return {
+        "messages": messages,
+        "user_id": request.user_id,
+        "platform": request.platform,
+        "known_entities": request.known_entities,
+        "combined": False,
+        "streaming": False,
+        "deadline": deadline,
+        "tool_rounds": 0,
+        "degradations": []
+    }
+
+
+async def compact_state(request: ChatRequest, state: Dict) -> Dict:
+    """Graph input with older history replaced by a rolling summary if over budget.
+
+    The summary must leave DEADLINE_FINAL_ANSWER_SECONDS of the turn's
+    budget for the agent; past that, the verbatim tail is used alone.
+    """
+    deadline = state.get("deadline")
+    if deadline is not None:
+        deadline -= deadlines.final_answer_seconds
+    messages = await history_manager.compact(conversation_id(request), state["messages"], deadline,
+                                             request._history_offset)
+    return {**state, "messages": messages}
+
+
+def full_messages(state: Dict, agent_state: Dict, result: Dict) -> List:
+    """Full transcript: the uncompacted input plus what the agent added"""
+    return state["messages"] + result["messages"][len(agent_state["messages"]):]
+
+
+def sse_event(event: str, data: Dict) -> str:
+    """Format a single server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def conversation_id(request: ChatRequest) -> str:
+    """Key for per-conversation server-side state"""
+    return request.conversation_id or f"{request.platform}:{request.user_id}"
+
+
+def request_fingerprint(request: ChatRequest) -> str:
+    """Hash of what makes two chat requests the same turn"""
+    payload = json.dumps({
+        "conversation_id": request.conversation_id,
+        "message": request.message,
+        "history": [[msg.role, msg.content] for msg in request.history]
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+async def idempotency_key(request: ChatRequest, header: Optional[str] = None) -> Optional[str]:
+    """Per-user idempotency key: client-supplied, else derived from the message and history.
+
+    Without history (server-side session) the derived key also includes
+    the session version, so the same message sent again in a later turn
+    ("yes please") is a new turn, not a duplicate.
+    """
+    if not idempotency.enabled:
+        return None
+    scope = f"{request.platform}:{request.user_id}"
+    key = header or request.idempotency_key
+    if key:
+        return f"{scope}:key:{key}"
+    if request.conversation_id and not request.history:
+        version = await memory.session_version(request.conversation_id)
+        return f"{scope}:auto:{version}:{request_fingerprint(request)}"
+    return f"{scope}:auto:{request_fingerprint(request)}"
+
+
+async def admit(request: ChatRequest) -> Ticket:
+    """Admit a turn: one at a time per user, urgent conversations first; 429 when saturated"""
+    state = analysis_states.get(conversation_id(request))
     try:
-        # Convert history to LangChain messages
-        messages = []
-        for msg in request.history:
-            if msg.role == "user":
-                messages.append(HumanMessage(content=msg.content))
+        return await admission.acquire(
+            f"{request.platform}:{request.user_id}",
+            state.urgency if state is not None else None
+        )
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+async def load_session(request: ChatRequest) -> ChatRequest:
+    """Fill history and known entities from the server-side session.
+
+    A request that still carries its full history is authoritative and
+    replaces the stored one (compatibility mode).
+    """
+    if not request.conversation_id:
+        return request
+    session = await memory.get_session(request.conversation_id)
+    update = {"known_entities": {**session["known_entities"], **request.known_entities}}
+    if not request.history:
+        update["history"] = [MessageHistory.model_construct(**msg) for msg in session["history"]]
+    loaded = request.model_copy(update=update)
+    if not request.history:
+        loaded._history_offset = session.get("offset", 0)
+    return loaded
+
+
+async def save_session(request: ChatRequest, response_text: str, metadata):
+    """Append this turn to the server-side session"""
+    if not request.conversation_id:
+        return
+    history = [{"role": msg.role, "content": msg.content} for msg in request.history]
+    history.append({"role": "user", "content": request.message})
+    history.append({"role": "assistant", "content": response_text})
+    known_entities = dict(request.known_entities)
+    if isinstance(metadata, dict):
+        known_entities.update({k: v for k, v in metadata.get("new_entities", {}).items() if v})
+    await memory.save_session(request.conversation_id, history, known_entities, request._history_offset)
+
+
+async def notify_sales(request: ChatRequest, metadata):
+    """Record a qualified-lead notification; delivery happens off the request path"""
+    if isinstance(metadata, dict):
+        await outbox.enqueue(request.user_id, request.platform, metadata,
+                       conversation_id(request), request.known_entities)
+
+
+def start_analysis(request: ChatRequest, state: Dict) -> Optional[asyncio.Task]:
+    """Speculatively start analysis of the incoming user messages.
+
+    The analyzer only reads user messages, which are all known before the
+    agent runs, so it can run in parallel with the graph. Disabled with
+    SPECULATIVE_ANALYSIS=false.
+    """
+    if os.getenv("SPECULATIVE_ANALYSIS", "true").lower() != "true":
+        return None
+    return asyncio.create_task(analyze_conversation(
+        messages=list(state["messages"]),
+        known_entities=request.known_entities,
+        conversation_id=conversation_id(request),
+        offset=request._history_offset
+    ))
+
+
+def queue_analysis(request: ChatRequest, messages: List) -> Optional[str]:
+    """Submit the turn's analysis to the worker pool; its entities are added to the session when done"""
+    return analysis_queue.submit(
+        messages=messages,
+        known_entities=request.known_entities,
+        conversation_id=conversation_id(request),
+        callback_url=request.callback_url,
+        context={"user_id": request.user_id, "platform": request.platform},
+        offset=request._history_offset,
+        session_id=request.conversation_id
+    )
+
+
+async def finish_analysis(task: Optional[asyncio.Task], request: ChatRequest, messages: List,
+                          deadline: Optional[float] = None, degradations: Optional[List[str]] = None):
+    """Join a speculative analysis, or run the analysis now if none was started.
+
+    The analyzer only gets the time left before the deadline. If that is
+    less than DEADLINE_ANALYSIS_SECONDS or runs out, rule-based metadata are
+    returned and the full analysis is queued. Returns (metadata, analysis id
+    or None); degradations applied are appended to ``degradations``.
+    """
+    degradations = degradations if degradations is not None else []
+    remaining = deadlines.remaining(deadline)
+    if task is None and remaining >= deadlines.analysis_seconds:
+        task = asyncio.create_task(analyze_conversation(
+            messages=messages,
+            known_entities=request.known_entities,
+            conversation_id=conversation_id(request),
+            offset=request._history_offset
+        ))
+    
+    if task is not None:
+        try:
+            if deadline is None:
+                metadata = await task
             else:
-                messages.append(AIMessage(content=msg.content))
-        
-        # Add current user message
-        messages.append(HumanMessage(content=request.message))
-        
-        # Prepare state
-        state = {
-            "messages": messages,
-            "user_id": request.user_id,
-            "platform": request.platform
-        }
-        
+                metadata = await asyncio.wait_for(asyncio.shield(task), max(0.0, deadlines.remaining(deadline)))
+            if metadata.get("fallback"):
+                degradations.append("analysis_fallback")
+            return metadata, None
+        except asyncio.TimeoutError:
+            await cancel_analysis(task)
+    
+    metadata = deadline_analysis(messages, request.known_entities, conversation_id(request),
+                                 request._history_offset)
+    analysis_id = queue_analysis(request, messages)
+    degradations.append("analysis_deferred" if analysis_id else "analysis_skipped")
+    return metadata, analysis_id
+
+
+def lookup_answer(request: ChatRequest):
+    """Look up a cached first-turn answer.
+
+    Returns (cacheable, cached answer or None, cached metadata or None).
+    Cached metadata is only reused when the caller knows nothing about the
+    user yet, since the analysis depends on known_entities.
+    """
+    if not answer_cache.cacheable(request.message, request.history):
+        return False, None, None
+    cached = answer_cache.get(request.message)
+    if cached is None or request.known_entities:
+        return True, cached, None
+    return True, cached, cached.metadata
+
+
+def store_answer(request: ChatRequest, cached, response_text: str, messages: List, metadata,
+                 degradations: List[str]):
+    """Cache a fresh first-turn answer and its analysis (never fallbacks or degraded turns)"""
+    if degradations:
+        # e.g. answered without the pricing tool under deadline pressure
+        return
+    if cached is None:
+        if messages[-1].response_metadata.get("fallback"):
+            return
+        cached = answer_cache.put(request.message, response_text, messages)
+    if (
+        cached is not None
+        and not request.known_entities
+        and isinstance(metadata, dict)
+        and not metadata.get("fallback")
+    ):
+        cached.metadata = metadata
+
+
+async def cancel_analysis(task: Optional[asyncio.Task]):
+    """Cancel a speculative analysis that is no longer needed"""
+    if task is None or task.done():
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+async def fast_path_turn(request: ChatRequest, state: Dict) -> Optional[ChatResponse]:
+    """Answer a trivial turn ("hi", "thanks", "bye") from a template, or None to run the agent.
+
+    The metadata is returned inline even when analysis was deferred, since
+    producing it costs nothing.
+    """
+    previous = request.history[-1] if request.history else None
+    route = fast_path.route(request.message, previous.content if previous and previous.role != "user" else None)
+    if route is None:
+        return None
+    messages = state["messages"] + [AIMessage(content=route.reply)]
+    metadata = fast_path_analysis(messages, request.known_entities, conversation_id(request), route.sentiment,
+                                  request._history_offset)
+    await save_session(request, route.reply, metadata)
+    return ChatResponse(
+        user_id=request.user_id,
+        platform=request.platform,
+        response=route.reply,
+        success=True,
+        metadata=metadata,
+        conversation_id=request.conversation_id
+    )
+
+
+async def run_chat(request: ChatRequest, deadline: Optional[float] = None) -> ChatResponse:
+    """Run one chat turn: agent reply plus (possibly deferred) analysis"""
+    request = await load_session(request)
+    state = build_state(request, deadline)
+    routed = await fast_path_turn(request, state)
+    if routed is not None:
+        return routed
+    cacheable, cached, cached_metadata = lookup_answer(request)
+    # Combined mode: the agent's final answer includes the analysis
+    state["combined"] = cached is None and combined_enabled()
+    
+    analysis = None
+    if cached_metadata is None and not request.defer_analysis and not state["combined"]:
+        analysis = start_analysis(request, state)
+    
+    combined_metadata = None
+    degradations: List[str] = []
+    if cached is not None:
+        messages = state["messages"] + [AIMessage(content=cached.response)]
+    else:
         # Run agent
-        result = graph.invoke(state)
-        
-        # Extract response
-        last_message = result["messages"][-1]
-        response_text = last_message.content
-        
-        # Analyze conversation for metadata
-        metadata = analyze_conversation(
-            messages=result["messages"],
-            known_entities=request.known_entities
+        try:
+            agent_state = await compact_state(request, state)
+            result = await get_graph().ainvoke(agent_state)
+        except BaseException:
+            await cancel_analysis(analysis)
+            raise
+        messages = full_messages(state, agent_state, result)
+        combined_metadata = result.get("analysis")
+        degradations = list(result.get("degradations", []))
+    
+    # Extract response
+    last_message = messages[-1]
+    response_text = last_message.content
+    
+    analysis_id = None
+    if cached_metadata is not None:
+        metadata = remember_analysis(
+            messages, request.known_entities, conversation_id(request), cached_metadata,
+            offset=request._history_offset
         )
-        
-        return ChatResponse(
-            user_id=request.user_id,
-            platform=request.platform,
-            response=response_text,
-            success=True,
-            metadata=metadata
+    elif combined_metadata is not None:
+        metadata = accept_combined_analysis(
+            messages, request.known_entities, conversation_id(request), combined_metadata,
+            request._history_offset
         )
+    elif request.defer_analysis:
+        analysis_id = queue_analysis(request, messages)
     
+    if analysis_id:
+        metadata = Metadata()
+    elif cached_metadata is None and combined_metadata is None:
+        # Analyze conversation for metadata (also when the queue is full,
+        # or when the combined answer did not validate)
+        metadata, analysis_id = await finish_analysis(analysis, request, messages, deadline, degradations)
+    deadlines.record(degradations)
+    
+    if cacheable:
+        store_answer(request, cached, response_text, messages, metadata, degradations)
+    
+    await notify_sales(request, metadata)
+    await save_session(request, response_text, metadata)
+    
+    return ChatResponse(
+        user_id=request.user_id,
+        platform=request.platform,
+        response=response_text,
+        success=True,
+        metadata=metadata,
+        analysis_id=analysis_id,
+        conversation_id=request.conversation_id,
+        degradations=degradations
+    )
+
+
+async def run_admitted(request: ChatRequest) -> ChatResponse:
+    """Run a chat turn once admission control lets it through"""
+    # The deadline also covers time spent waiting for admission
+    deadline = deadlines.deadline(request.deadline_ms)
+    ticket = await admit(request)
+    try:
+        return await run_chat(request, deadline)
+    finally:
+        admission.release(ticket)
+
+
+async def run_deduplicated(request: ChatRequest, key: Optional[str]):
+    """Run a chat turn, or share the result of an identical one.
+
+    Returns (response, whether it was a duplicate).
+    """
+    if key is None:
+        return await run_admitted(request), False
+    try:
+        return await idempotency.run(key, request_fingerprint(request), lambda: run_admitted(request))
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat(request: ChatRequest, response: Response,
+               key_header: Optional[str] = Header(None, alias="Idempotency-Key")):
+    """Handle chat requests with conversation history and AI analysis"""
+    try:
+        result, replayed = await run_deduplicated(request, await idempotency_key(request, key_header))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
 
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
-    """Handle chat requests with conversation history"""
+async def run_batch_item(index: int, request: ChatRequest, semaphore: asyncio.Semaphore) -> BatchItemResult:
+    """Run one batch item; failures are reported per item"""
+    async with semaphore:
+        try:
+            result, _ = await run_deduplicated(request, await idempotency_key(request))
+            return BatchItemResult(index=index, success=True, result=result)
+        except HTTPException as e:
+            return BatchItemResult(index=index, success=False, error=e.detail)
+        except Exception as e:
+            return BatchItemResult(index=index, success=False, error=str(e))
+
+
+async def stream_batch_results(tasks: List[asyncio.Task]):
+    """Yield NDJSON results as items finish; cancel the rest on disconnect"""
     try:
-        # Load conversation history
-        history = memory.get_history(request.user_id)
-        
-        # Create new user message
-        user_message = HumanMessage(content=request.message)
-        
-        # Prepare state
-        state = {
-            "messages": history + [user_message],
-            "user_id": request.user_id,
-            "platform": request.platform
-        }
-        
-        # Run agent
-        result = graph.invoke(state)
+        for next_done in asyncio.as_completed(tasks):
+            item = await next_done
+            yield item.model_dump_json() + "\n"
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+@router.post("/chat/batch", response_model=BatchChatResponse)
+async def chat_batch(batch: BatchChatRequest):
+    """Run many chat requests concurrently under a concurrency cap"""
+    max_items = int(os.getenv("CHAT_BATCH_MAX_ITEMS", 100))
+    if len(batch.requests) > max_items:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {max_items} requests")
+    
+    limit = int(os.getenv("CHAT_BATCH_CONCURRENCY", 10))
+    if batch.concurrency:
+        limit = max(1, min(limit, batch.concurrency))
+    semaphore = asyncio.Semaphore(limit)
+    tasks = [
+        asyncio.create_task(run_batch_item(i, request, semaphore))
+        for i, request in enumerate(batch.requests)
+    ]
+    
+    if batch.stream:
+        return StreamingResponse(stream_batch_results(tasks), media_type="application/x-ndjson")
+    
+    results = await asyncio.gather(*tasks)
+    succeeded = sum(1 for item in results if item.success)
+    return BatchChatResponse(results=results, succeeded=succeeded, failed=len(results) - succeeded)
+
+
+@router.get("/admission/stats")
+async def admission_stats():
+    """In-flight and queued chat turns, rejections and wait times"""
+    return admission.stats()
+
+
+@router.get("/fast-path/stats")
+async def fast_path_stats():
+    """Turns answered locally vs passed to the agent, by intent and reason"""
+    return fast_path.stats()
+
+
+@router.get("/deadline/stats")
+async def deadline_stats():
+    """Turn deadline settings and how often each degradation was applied"""
+    return deadlines.stats()
+
+
+@router.get("/resilience/stats")
+async def resilience_stats():
+    """Model call timeouts, retries, hedges and circuit breaker state"""
+    return resilience.stats()
+
+
+@router.get("/outbox/stats")
+async def outbox_stats():
+    """Sales notification outbox: pending and dead events, deliveries, coalesced and duplicate leads"""
+    return await outbox.stats()
+
+
+@router.get("/idempotency/stats")
+async def idempotency_stats():
+    """Executed vs coalesced and replayed duplicate requests"""
+    return idempotency.stats()
+
+
+@router.get("/session/stats")
+async def session_stats():
+    """Session store size and memory accounting"""
+    return await memory.stats()
+
+
+@router.delete("/session/{session_id}")
+async def delete_session(session_id: str):
+    """Forget a server-side conversation session"""
+    await memory.clear_session(session_id)
+    return {"conversation_id": session_id, "deleted": True}
+
+
+@router.get("/history/stats")
+async def history_stats():
+    """Prompt token counts before and after history compaction"""
+    return history_manager.stats()
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """First-turn answer cache hit/miss counters"""
+    return answer_cache.stats()
+
+
+@router.get("/analysis/stats")
+async def analysis_stats():
+    """Deferred analysis queue depth and worker metrics"""
+    return analysis_queue.stats()
+
+
+@router.get("/analysis/{analysis_id}")
+async def get_analysis(analysis_id: str):
+    """Poll the status and result of a deferred analysis"""
+    job = await analysis_queue.lookup(analysis_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Analysis not found or expired")
+    return job
+
+
+def response_events(response: ChatResponse, replayed: bool = False):
+    """SSE events describing an already finished turn"""
+    yield sse_event("token", {"content": response.response})
+    yield sse_event("response", {"response": response.response})
+    yield sse_event("metadata", response.metadata.model_dump())
+    yield sse_event("done", {"user_id": response.user_id, "platform": response.platform,
+                             "conversation_id": response.conversation_id, "success": True,
+                             "analysis_id": response.analysis_id, "degradations": response.degradations,
+                             "replayed": replayed})
+
+
+async def replay_chat_events(existing: asyncio.Future):
+    """Stream the result of an identical in-flight or finished turn"""
+    try:
+        for event in response_events(await asyncio.shield(existing), replayed=True):
+            yield event
+    except Exception as e:
+        yield sse_event("error", {"detail": str(e), "success": False})
+
+
+def finish_stream(ticket: Ticket, key: Optional[str]):
+    """Release the stream's slot; fail its idempotency key if it never completed"""
+    admission.release(ticket)
+    if key is not None:
+        idempotency.finish(key, error=RuntimeError("Stream ended before the reply was complete"))
+
+
+async def stream_chat_events(request: ChatRequest, ticket: Ticket, key: Optional[str] = None,
+                             deadline: Optional[float] = None):
+    """Run the agent and yield SSE events: tokens, tool progress, then metadata"""
+    analysis = None
+    try:
+        request = await load_session(request)
+        state = build_state(request, deadline)
+        routed = await fast_path_turn(request, state)
+        if routed is not None:
+            if key is not None:
+                idempotency.finish(key, result=routed)
+            for event in response_events(routed):
+                yield event
+            return
+        cacheable, cached, cached_metadata = lookup_answer(request)
+        if cached_metadata is None:
+            analysis = start_analysis(request, state)
+        state["streaming"] = True
+        final_state = state
         
-        # Save updated history
-        memory.save_history(request.user_id, result["messages"])
+        if cached is not None:
+            yield sse_event("token", {"content": cached.response})
+            final_state = {**state, "messages": state["messages"] + [AIMessage(content=cached.response)]}
+        else:
+            agent_state = await compact_state(request, state)
+            async for mode, payload in get_graph().astream(
+                agent_state, stream_mode=["messages", "updates", "values"]
+            ):
+                if mode == "messages":
+                    chunk, info = payload
+                    if info.get("langgraph_node") == "agent" and chunk.content:
+                        yield sse_event("token", {"content": chunk.content})
+                elif mode == "updates":
+                    for node, update in payload.items():
+                        for message in (update or {}).get("messages", []):
+                            if node == "agent" and getattr(message, "tool_calls", None):
+                                for call in message.tool_calls:
+                                    yield sse_event("tool_call", {"name": call["name"], "args": call["args"]})
+                            elif node == "tools":
+                                yield sse_event("tool_result", {"name": message.name})
+                else:
+                    final_state = {**payload, "messages": full_messages(state, agent_state, payload)}
         
-        # Extract response
-        last_message = result["messages"][-1]
-        response_text = last_message.content
+        last_message = final_state["messages"][-1]
+        yield sse_event("response", {"response": last_message.content})
         
-        return ChatResponse(
-            user_id=request.user_id,
-            platform=request.platform,
-            response=response_text,
-            success=True
-        )
+        degradations = list(final_state.get("degradations", []))
+        analysis_id = None
+        if cached_metadata is not None:
+            metadata = remember_analysis(
+                final_state["messages"], request.known_entities, conversation_id(request), cached_metadata,
+                offset=request._history_offset
+            )
+        else:
+            metadata, analysis_id = await finish_analysis(
+                analysis, request, final_state["messages"], deadline, degradations
+            )
+        deadlines.record(degradations)
+        if cacheable:
+            store_answer(request, cached, last_message.content, final_state["messages"], metadata,
+                         degradations)
+        await notify_sales(request, metadata)
+        await save_session(request, last_message.content, metadata)
+        if key is not None:
+            idempotency.finish(key, result=ChatResponse(
+                user_id=request.user_id,
+                platform=request.platform,
+                response=last_message.content,
+                success=True,
+                metadata=metadata,
+                analysis_id=analysis_id,
+                conversation_id=request.conversation_id,
+                degradations=degradations
+            ))
+        yield sse_event("metadata", Metadata(**metadata).model_dump())
+        yield sse_event("done", {"user_id": request.user_id, "platform": request.platform,
+                                 "conversation_id": request.conversation_id, "success": True,
+                                 "analysis_id": analysis_id, "degradations": degradations})
     
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        yield sse_event("error", {"detail": str(e), "success": False})
+    
+    finally:
+        # Client disconnects and agent failures must not leak the analyzer call
+        await cancel_analysis(analysis)
+        finish_stream(ticket, key)
+
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest,
+                      key_header: Optional[str] = Header(None, alias="Idempotency-Key")):
+    """Stream the agent reply as server-sent events, with metadata as the final event"""
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    deadline = deadlines.deadline(request.deadline_ms)
+    key = await idempotency_key(request, key_header)
+    if key is not None:
+        try:
+            existing = idempotency.lookup(key, request_fingerprint(request))
+        except IdempotencyConflict as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        if existing is not None:
+            return StreamingResponse(
+                replay_chat_events(existing),
+                media_type="text/event-stream",
+                headers={**headers, "Idempotent-Replayed": "true"}
+            )
+        idempotency.begin(key, request_fingerprint(request))
+    
+    try:
+        ticket = await admit(request)
+    except BaseException as e:
+        if key is not None:
+            idempotency.finish(key, error=e if isinstance(e, Exception) else RuntimeError(str(e)))
+        raise
+    return StreamingResponse(
+        stream_chat_events(request, ticket, key, deadline),
+        media_type="text/event-stream",
+        headers=headers,
+        # Also covers a client that disconnects before the stream starts
+        background=BackgroundTask(finish_stream, ticket, key)
+    )
@@ -1,22 +1,137 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from app.api.chat import router as chat_router
 from dotenv import load_dotenv
-import os
 
-# Load environment variables from .env file
+# Load environment variables from .env file (before app modules read their settings)
 load_dotenv()
 
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.api.chat import router as chat_router
+from app.agent.graph import get_graph
+from app.agent.registry import registry
+from app.agent.admission import admission
+from app.agent.analysis_queue import analysis_queue
+from app.agent.analyzer import ANALYSIS_COUNTERS
+from app.agent.answer_cache import answer_cache
+from app.agent.catalog import catalog
+from app.agent.deadline import deadlines
+from app.agent.fast_path import fast_path
+from app.agent.history import history_manager
+from app.agent.idempotency import idempotency
+from app.agent.memory import memory
+from app.agent.outbox import outbox
+from app.agent.resilience import resilience
+from app.metrics import metrics, REQUEST_SECONDS
+import asyncio
+import os
+import time
+
 # Verify OpenAI API key is loaded
 if not os.getenv("OPENAI_API_KEY"):
     raise ValueError("OPENAI_API_KEY not found in environment variables. Check your .env file.")
 
+
+# Readiness state reported by /ready
+readiness = {"status": "starting", "checks": {}, "warmup_seconds": None, "error": None}
+
+
+def preload():
+    """Warm-up that is safe before forking workers: heavy imports, graph compile, prompt, catalog"""
+    checks = readiness["checks"]
+    get_graph()
+    checks["graph"] = "ok"
+    import langchain_openai  # noqa: F401  (so forked workers inherit the import)
+    registry.prompt.text()
+    checks["prompt"] = "ok"
+    catalog.plans()
+    checks["catalog"] = "ok"
+    answer_cache.warm_up()
+    checks["answer_cache"] = "ok"
+    fast_path.warm_up()
+    checks["fast_path"] = "ok"
+
+
+def warm_up_sync():
+    """Blocking part of the warm-up: preload (a no-op after the supervisor ran it) plus model clients"""
+    preload()
+    registry.agent_model()
+    readiness["checks"]["model_clients"] = "ok"
+
+
+async def warm_connections():
+    """Open a pooled keep-alive connection to the model API (best effort)"""
+    base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+    try:
+        await registry.http_async_client.get(
+            f"{base_url}/models",
+            headers={"Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}"},
+            timeout=float(os.getenv("WARMUP_CONNECT_TIMEOUT", 5))
+        )
+        readiness["checks"]["llm_connection"] = "ok"
+    except Exception as e:
+        print(f"Connection warm-up failed: {e}")
+        readiness["checks"]["llm_connection"] = f"skipped: {e.__class__.__name__}"
+
+
+async def warm_up():
+    """Prepare everything the first chat turn needs, then report ready"""
+    started = time.perf_counter()
+    try:
+        if os.getenv("STARTUP_WARMUP", "true").lower() == "true":
+            # Off the event loop so /health keeps answering while imports and compiles run
+            await asyncio.to_thread(warm_up_sync)
+            await memory.stats()
+            readiness["checks"]["sessions"] = "ok"
+            if os.getenv("WARMUP_CONNECTIONS", "true").lower() == "true":
+                await warm_connections()
+        readiness["warmup_seconds"] = round(time.perf_counter() - started, 3)
+        readiness["status"] = "ready"
+    except Exception as e:
+        print(f"Warm-up failed: {e}")
+        readiness["status"] = "failed"
+        readiness["error"] = str(e)
+
+
+async def publish_metrics():
+    """Write this worker's metrics snapshot (also its heartbeat) for the other workers and the supervisor"""
+    interval = float(os.getenv("METRICS_FLUSH_INTERVAL", 2))
+    while True:
+        try:
+            metrics.write_snapshot()
+        except OSError as e:
+            print(f"Metrics snapshot failed: {e}")
+        await asyncio.sleep(interval)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmup = asyncio.create_task(warm_up())
+    publisher = asyncio.create_task(publish_metrics()) if os.getenv("METRICS_DIR") else None
+    # Each worker dispatches from the shared outbox file with its own connection
+    outbox.start()
+    yield
+    # uvicorn has already stopped accepting and finished in-flight requests
+    readiness["status"] = "stopping"
+    warmup.cancel()
+    # Stop background work and close sessions and pooled connections on shutdown
+    await analysis_queue.stop(drain_timeout=float(os.getenv("ANALYSIS_DRAIN_TIMEOUT", 10)))
+    # After the queue, whose last analyses may still qualify leads
+    await outbox.stop()
+    await memory.close()
+    await registry.aclose()
+    if publisher is not None:
+        publisher.cancel()
+        metrics.write_snapshot()
+
+
 app = FastAPI(
     title="AI Agent Service",
     version="1.0.0",
     description="Production-grade AI agent with LangGraph and OpenAI",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -32,12 +147,116 @@ app.add_middleware(
 app.include_router(chat_router, prefix="/agent", tags=["agent"])
 
 
+def route_label(request: Request) -> str:
+    """Path template of the matched route, with the prefix of the router it was included from"""
+    route = request.scope.get("route")
+    if route is None:
+        return "unmatched"
+    template = route.path_format
+    try:
+        concrete = template.format(**request.path_params)
+    except (KeyError, IndexError, ValueError):
+        return template
+    path = request.url.path
+    if path.endswith(concrete):
+        return path[:len(path) - len(concrete)] + template
+    return template
+
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    """Record total request time (until response headers for streams)"""
+    started = time.perf_counter()
+    response = await call_next(request)
+    REQUEST_SECONDS.observe(
+        time.perf_counter() - started,
+        method=request.method,
+        path=route_label(request),
+        status=response.status_code
+    )
+    return response
+
+
+def component_metrics():
+    """Counters and gauges owned by other components, read at scrape time"""
+    queue = analysis_queue.stats()
+    admitted = admission.stats()
+    history = history_manager.stats()
+    breaker = resilience.breaker.stats()
+    return [
+        ("agent_answer_cache_total", "counter", "Answer cache lookups and stores",
+         [({"result": key}, value) for key, value in answer_cache.counters.items()]),
+        ("agent_answer_cache_entries", "gauge", "Cached first-turn answers",
+         [({}, answer_cache.stats()["size"])]),
+        ("agent_analysis_total", "counter", "Analyses by source (fallback = analyzer failed)",
+         [({"source": key}, value) for key, value in ANALYSIS_COUNTERS.items()]),
+        ("agent_analysis_queue_depth", "gauge", "Deferred analyses waiting for a worker",
+         [({}, queue["queue_depth"])]),
+        ("agent_analysis_queue_busy_workers", "gauge", "Analysis workers currently busy",
+         [({}, queue["busy_workers"])]),
+        ("agent_analysis_jobs_total", "counter", "Deferred analysis jobs by outcome",
+         [({"outcome": key}, queue[key]) for key in ("submitted", "rejected", "completed", "failed")]),
+        ("agent_history_prompt_tokens_total", "counter", "Estimated prompt tokens before/after compaction",
+         [({"stage": "before"}, history["tokens_before"]), ({"stage": "after"}, history["tokens_after"])]),
+        ("agent_history_compactions_total", "counter", "Requests whose history was compacted",
+         [({}, history["compacted"])]),
+        ("agent_admission_active", "gauge", "Chat turns currently running",
+         [({}, admitted["active"])]),
+        ("agent_admission_waiting", "gauge", "Chat turns waiting for a slot",
+         [({}, admitted["waiting"])]),
+        ("agent_admission_total", "counter", "Chat admission outcomes",
+         [({"outcome": key}, admitted[key])
+          for key in ("admitted", "rejected_full", "rejected_user", "timed_out")]),
+        ("agent_idempotency_total", "counter", "Chat requests executed vs served from a duplicate",
+         [({"outcome": key}, value) for key, value in idempotency.counters.items()]),
+        ("agent_fast_path_total", "counter", "Chat turns answered locally (routed) or passed to the agent",
+         [({"outcome": "routed", "kind": intent}, value) for intent, value in fast_path.routed_by_intent.items()]
+         + [({"outcome": "passed", "kind": reason}, value)
+            for reason, value in fast_path.passed_by_reason.items()]),
+        ("agent_llm_resilience_total", "counter", "Model call outcomes, retries, timeouts and hedged requests",
+         [({"event": key}, value) for key, value in resilience.counters.items()]),
+        ("agent_llm_circuit_open", "gauge", "1 while the model API circuit breaker is open or half-open",
+         [({}, 0 if breaker["state"] == "closed" else 1)]),
+        ("agent_llm_circuit_trips_total", "counter", "Times the model API circuit breaker opened",
+         [({}, breaker["trips"])]),
+        ("agent_degradations_total", "counter", "Chat turns degraded to meet the deadline or survive failures",
+         [({"degradation": key}, value) for key, value in deadlines.counters.items()]),
+        ("agent_outbox_events_total", "counter", "Sales notification events and delivery batches by outcome",
+         [({"outcome": key}, value) for key, value in outbox.counters.items()]),
+        ("agent_catalog_reloads_total", "counter", "Product catalog (re)loads",
+         [({}, catalog.reloads)]),
+    ]
+
+
+metrics.register_collector(component_metrics)
+
+
 @app.get("/health")
 async def health_check():
+    """Liveness: the process is up and serving requests"""
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+async def ready_check():
+    """Readiness: graph compiled and clients warmed; 503 while starting, failed or stopping"""
+    return JSONResponse(readiness, status_code=200 if readiness["status"] == "ready" else 503)
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8001))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    workers = int(os.getenv("WORKERS", 1))
+    if workers > 1:
+        from app.serve import serve
+        serve(app, preload, host="0.0.0.0", port=port, workers=workers)
+    else:
+        # Finish in-flight conversations on SIGTERM before shutting down
+        uvicorn.run(app, host="0.0.0.0", port=port,
+                    timeout_graceful_shutdown=float(os.getenv("DRAIN_TIMEOUT", 30)))
@@ -0,0 +1,224 @@
+"""Lightweight in-process metrics with Prometheus text exposition.
+
+Updates are plain dict operations on the event loop thread, cheap enough to
+leave on under load. Values owned by other components (cache counters,
+queue depth) are read at scrape time through registered collectors.
+
+With several worker processes (app.serve), each worker periodically writes
+a snapshot to METRICS_DIR and /metrics on any worker sums all of them.
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from contextlib import contextmanager
+import glob
+import json
+import os
+import time
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def format_labels(labelnames: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        return [(self.name, format_labels(self.labelnames, key), value) for key, value in self.values.items()]
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values: Dict[Tuple, List] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        state = self.values.get(key)
+        if state is None:
+            state = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[i] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        result = []
+        for key, state in self.values.items():
+            for bound, count in zip(self.buckets, state):
+                result.append((f"{self.name}_bucket", format_labels(self.labelnames, key, f'le="{bound}"'), count))
+            result.append((f"{self.name}_bucket", format_labels(self.labelnames, key, 'le="+Inf"'), state[-1]))
+            result.append((f"{self.name}_sum", format_labels(self.labelnames, key), state[-2]))
+            result.append((f"{self.name}_count", format_labels(self.labelnames, key), state[-1]))
+        return result
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._collectors: List[Callable] = []
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, help, labelnames, buckets))
+
+    def register_collector(self, collector: Callable):
+        """collector() -> [(name, type, help, [(labels dict, value), ...]), ...]"""
+        self._collectors.append(collector)
+
+    def collect(self) -> List[Tuple[str, str, str, List[Tuple[str, str, float]]]]:
+        families = [(m.name, m.type, m.help, m.samples()) for m in self._metrics.values()]
+        for collector in self._collectors:
+            try:
+                for name, kind, help, samples in collector():
+                    families.append((name, kind, help, [
+                        (name, format_labels(tuple(labels), tuple(labels.values())), value)
+                        for labels, value in samples
+                    ]))
+            except Exception as e:
+                print(f"Metrics collector error: {e}")
+        return families
+
+    def write_snapshot(self):
+        """Publish this worker's metrics for aggregation (no-op without METRICS_DIR).
+
+        The file's mtime doubles as the worker heartbeat for the supervisor.
+        """
+        directory = os.getenv("METRICS_DIR")
+        if not directory:
+            return
+        path = snapshot_path(directory, os.getpid())
+        with open(path + ".tmp", "w") as f:
+            json.dump({"pid": os.getpid(), "updated_at": time.time(), "families": self.collect()}, f)
+        os.replace(path + ".tmp", path)
+
+    def collect_all(self) -> List[Tuple[str, str, str, List[Tuple[str, str, float]]]]:
+        """This process's metrics summed with the other workers' snapshots.
+
+        Counters and histograms of exited workers are kept so totals do not
+        go backwards; their gauges are dropped.
+        """
+        families = self.collect()
+        directory = os.getenv("METRICS_DIR")
+        if not directory:
+            return families
+
+        merged: Dict[str, List] = {}
+        live_workers = 1
+
+        def add(family_list):
+            for name, kind, help, samples in family_list:
+                entry = merged.setdefault(name, [kind, help, {}])
+                for sample_name, labels, value in samples:
+                    key = (sample_name, labels)
+                    entry[2][key] = entry[2].get(key, 0) + value
+
+        add(families)
+        for path in glob.glob(os.path.join(directory, "worker-*.json")):
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if snapshot["pid"] == os.getpid():
+                continue
+            alive = process_alive(snapshot["pid"])
+            live_workers += alive
+            add([tuple(family) for family in snapshot["families"] if alive or family[1] != "gauge"])
+
+        result = [
+            (name, kind, help, [(sample, labels, value) for (sample, labels), value in samples.items()])
+            for name, (kind, help, samples) in merged.items()
+        ]
+        result.append(("agent_workers", "gauge", "Live worker processes", [("agent_workers", "", live_workers)]))
+        return result
+
+    def render(self) -> str:
+        lines = []
+        for name, kind, help, samples in self.collect_all():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def snapshot_path(directory: str, pid: int) -> str:
+    return os.path.join(directory, f"worker-{pid}.json")
+
+
+def process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# Singleton instance
+metrics = MetricsRegistry()
+
+REQUEST_SECONDS = metrics.histogram(
+    "agent_http_request_seconds", "Total HTTP request time", ("method", "path", "status")
+)
+NODE_SECONDS = metrics.histogram("agent_graph_node_seconds", "Time spent in each graph node", ("node",))
+LLM_SECONDS = metrics.histogram("agent_llm_request_seconds", "Model call latency", ("call", "model"))
+LLM_TOKENS = metrics.counter("agent_llm_tokens_total", "Tokens used per model", ("call", "model", "type"))
+LLM_ERRORS = metrics.counter("agent_llm_errors_total", "Failed model calls", ("call", "model"))
+TOOL_SECONDS = metrics.histogram("agent_tool_seconds", "Tool execution time", ("tool", "status"))
+ANALYZER_SECONDS = metrics.histogram("agent_analyzer_seconds", "Conversation analysis time", ("mode",))
+
+
+@contextmanager
+def track_llm(call: str, model: str):
+    """Time a model call; set ``holder["response"]`` to also count its tokens"""
+    holder: Dict = {}
+    started = time.perf_counter()
+    try:
+        yield holder
+    except BaseException:
+        LLM_ERRORS.inc(call=call, model=model)
+        raise
+    finally:
+        LLM_SECONDS.observe(time.perf_counter() - started, call=call, model=model)
+        record_usage(call, model, holder.get("response"))
+
+
+def record_usage(call: str, model: str, response):
+    usage: Optional[Dict] = getattr(response, "usage_metadata", None)
+    if usage:
+        LLM_TOKENS.inc(usage.get("input_tokens", 0), call=call, model=model, type="prompt")
+        LLM_TOKENS.inc(usage.get("output_tokens", 0), call=call, model=model, type="completion")
@@ -0,0 +1,282 @@
+"""Re-score stored conversations offline with the current analyzer rules.
+
+Reads a JSONL or CSV export of the conversations table, packs several
+conversations into one analyzer request while the token budget allows,
+runs the batches concurrently with rate-limit-aware pacing and appends one
+JSON line per lead to the output file as results arrive. Leads already in
+the output file are skipped, so an interrupted run resumes where it stopped.
+
+Export from PostgreSQL (rows must be grouped by lead):
+    \\copy (SELECT lead_id, role, content FROM conversations ORDER BY lead_id, timestamp) TO 'conversations.csv' CSV HEADER
+
+JSONL input may hold the same per-message rows, or one conversation per line:
+    {"lead_id": "...", "messages": [{"role": "user", "content": "..."}], "known_entities": {}}
+
+Usage (from ai-brain-python/):
+    python -m app.rescore conversations.csv --output rescored.jsonl
+"""
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from typing import Dict, Iterator, List, Optional
+from langchain_core.messages import HumanMessage, SystemMessage
+from openai import RateLimitError
+from app.agent.analyzer import (
+    ANALYST_INTRO, ANALYSIS_INSTRUCTIONS, analyze_conversation_with_ai, finalize_analysis,
+    normalize_analysis, parse_json_content
+)
+from app.agent.registry import registry
+from app.agent.resilience import resilience
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import time
+
+
+BATCH_FORMAT = """**Batch Output Format:**
+Analyze every conversation above independently. Return ONLY a JSON object of the form
+{"results": [{"id": "<conversation id>", ...analysis object as described above...}]}
+with exactly one entry per conversation, in the same order."""
+
+# Rough completion size of one analysis object, for pacing
+COMPLETION_TOKENS_PER_CONVERSATION = 250
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def read_rows(path: str) -> Iterator[Dict]:
+    """Yield raw rows from a CSV or JSONL file"""
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def read_conversations(path: str) -> Iterator[Dict]:
+    """Group the export into conversations: {"id", "user_messages", "known_entities"}"""
+    current: Optional[Dict] = None
+    for row in read_rows(path):
+        if "messages" in row:
+            yield {
+                "id": str(row["lead_id"]),
+                "user_messages": [m["content"] for m in row["messages"] if m["role"] == "user"],
+                "known_entities": row.get("known_entities") or {}
+            }
+            continue
+        lead_id = str(row["lead_id"])
+        if current is None or current["id"] != lead_id:
+            if current is not None:
+                yield current
+            current = {"id": lead_id, "user_messages": [], "known_entities": {}}
+        if row["role"] == "user":
+            current["user_messages"].append(row["content"])
+    if current is not None:
+        yield current
+
+
+def conversation_section(conversation: Dict) -> str:
+    transcript = "\n".join(f"User: {msg}" for msg in conversation["user_messages"])
+    return f"""**Conversation id: {conversation['id']}**
+Already Known Information:
+{json.dumps(conversation['known_entities'])}
+User Conversation:
+{transcript}
+"""
+
+
+def build_batches(conversations: Iterator[Dict], done: set, max_size: int,
+                  max_tokens: int) -> Iterator[List[Dict]]:
+    """Pack conversations into batches bounded by count and prompt tokens"""
+    batch, tokens = [], 0
+    for conversation in conversations:
+        if conversation["id"] in done or not conversation["user_messages"]:
+            continue
+        conversation["section"] = conversation_section(conversation)
+        size = estimate_tokens(conversation["section"])
+        if batch and (len(batch) >= max_size or tokens + size > max_tokens):
+            yield batch
+            batch, tokens = [], 0
+        batch.append(conversation)
+        tokens += size
+    if batch:
+        yield batch
+
+
+class RatePacer:
+    """Token buckets for requests and tokens per minute, plus a shared pause after 429s"""
+
+    def __init__(self, rpm: float, tpm: float):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = rpm
+        self._tokens = tpm
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    async def acquire(self, tokens: int):
+        tokens = min(tokens, self.tpm)
+        async with self._lock:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                    continue
+                self._refill()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                wait = max(
+                    (1 - self._requests) * 60 / self.rpm,
+                    (tokens - self._tokens) * 60 / self.tpm
+                )
+                await asyncio.sleep(max(wait, 0.01))
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+async def analyze_batch(batch: List[Dict], pacer: RatePacer, retries: int) -> Dict[str, Dict]:
+    """One analyzer call for the whole batch; missing entries fall back to single analysis.
+
+    The call goes through the resilience layer (timeout "rescore" in
+    LLM_TIMEOUTS, LLM_RETRIES, circuit breaker; never hedged). Rate limits
+    left after its retries pause the pacer and are retried ``retries`` times.
+    """
+    prompt = "\n".join([
+        ANALYST_INTRO,
+        "",
+        "Analyze each of the following user conversations independently.",
+        "",
+        *[conversation["section"] for conversation in batch],
+        ANALYSIS_INSTRUCTIONS,
+        "",
+        BATCH_FORMAT
+    ])
+    tokens = estimate_tokens(prompt) + COMPLETION_TOKENS_PER_CONVERSATION * len(batch)
+    
+    results: Dict[str, Dict] = {}
+    for attempt in range(retries + 1):
+        await pacer.acquire(tokens)
+        try:
+            response = await resilience.call(
+                "rescore", lambda: registry.chat_model().ainvoke([SystemMessage(content=prompt)]), hedge=False
+            )
+            for item in parse_json_content(response.content).get("results", []):
+                results[str(item.pop("id", ""))] = normalize_analysis(item)
+            break
+        except RateLimitError:
+            delay = min(60, 2 ** attempt) + random.uniform(0, 1)
+            print(f"Rate limited, pausing {delay:.1f}s")
+            pacer.pause(delay)
+        except Exception as e:
+            print(f"Batch analysis error ({len(batch)} conversations): {e}")
+            break
+    
+    scored = {}
+    for conversation in batch:
+        result = results.get(conversation["id"])
+        if result is None:
+            await pacer.acquire(estimate_tokens(conversation["section"]) + COMPLETION_TOKENS_PER_CONVERSATION)
+            messages = [HumanMessage(content=msg) for msg in conversation["user_messages"]]
+            scored[conversation["id"]] = await analyze_conversation_with_ai(messages, conversation["known_entities"])
+        else:
+            scored[conversation["id"]] = finalize_analysis(
+                result, conversation["known_entities"], conversation["user_messages"]
+            )
+    return scored
+
+
+def load_checkpoint(output: str) -> set:
+    """Lead ids already written to the output file (fallback scores are redone)"""
+    done = set()
+    if os.path.exists(output):
+        with open(output, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                    if not row.get("fallback"):
+                        done.add(str(row["lead_id"]))
+                except (ValueError, KeyError, AttributeError):
+                    pass  # a partially written last line is redone
+    return done
+
+
+async def rescore(args) -> Dict:
+    done = load_checkpoint(args.output)
+    pacer = RatePacer(args.rpm, args.tpm)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=args.concurrency * 2)
+    stats = {"skipped": len(done), "scored": 0, "failed": 0, "batches": 0}
+    started = time.monotonic()
+    
+    with open(args.output, "a", encoding="utf-8") as out:
+        async def worker():
+            while True:
+                batch = await queue.get()
+                try:
+                    scored = await analyze_batch(batch, pacer, args.retries)
+                    for lead_id, metadata in scored.items():
+                        if metadata.get("fallback"):
+                            # The analyzer failed; leave it for the next run instead of a bogus score
+                            stats["failed"] += 1
+                            continue
+                        out.write(json.dumps({"lead_id": lead_id, **metadata}) + "\n")
+                        stats["scored"] += 1
+                    out.flush()
+                    stats["batches"] += 1
+                    if stats["batches"] % 10 == 0:
+                        rate = stats["scored"] / (time.monotonic() - started)
+                        print(f"{stats['scored']} conversations re-scored ({rate:.1f}/s)")
+                finally:
+                    queue.task_done()
+        
+        workers = [asyncio.create_task(worker()) for _ in range(args.concurrency)]
+        for batch in build_batches(read_conversations(args.input), done, args.batch_size, args.batch_tokens):
+            await queue.put(batch)
+        await queue.join()
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+    
+    await registry.aclose()
+    stats["seconds"] = round(time.monotonic() - started, 2)
+    if stats["failed"]:
+        print(f"{stats['failed']} conversations could not be analyzed; run again to retry them")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score exported conversations with the current analyzer")
+    parser.add_argument("input", help="CSV or JSONL export of the conversations table")
+    parser.add_argument("--output", default="rescored.jsonl", help="JSONL results, also the resume checkpoint")
+    parser.add_argument("--batch-size", type=int, default=8, help="max conversations per analyzer call")
+    parser.add_argument("--batch-tokens", type=int, default=6000, help="max transcript tokens per analyzer call")
+    parser.add_argument("--concurrency", type=int, default=4, help="analyzer calls in flight")
+    parser.add_argument("--rpm", type=float, default=500, help="requests per minute limit")
+    parser.add_argument("--tpm", type=float, default=200000, help="tokens per minute limit")
+    parser.add_argument("--retries", type=int, default=5, help="retries per batch on rate limiting")
+    args = parser.parse_args()
+    
+    stats = asyncio.run(rescore(args))
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()
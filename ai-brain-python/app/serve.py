@@ -0,0 +1,174 @@
+"""Multi-process serving: preforked uvicorn workers sharing one listening socket.
+
+The supervisor compiles the graph and loads the prompt and catalog once,
+then forks WORKERS processes that inherit them. It restarts workers that
+exit or stop heartbeating, and on SIGTERM/SIGINT lets every worker finish
+its in-flight conversations (up to DRAIN_TIMEOUT seconds) before exiting.
+Metrics from all workers are summed on /metrics.
+
+Sessions and deferred analysis results are shared through the session
+backend (SESSION_BACKEND=sqlite or redis). Everything else is per worker:
+duplicate requests (idempotency) are only coalesced, and one user's turns
+only run one at a time, when they reach the same worker; the answer cache
+and incremental-analysis state are per-worker caches.
+
+Usage (from ai-brain-python/):
+    python -m app.serve --workers 4 --port 8001
+    WORKERS=4 python -m app.main
+"""
+from typing import Callable, Dict, Optional
+from app.metrics import snapshot_path
+import argparse
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import time
+
+
+class Supervisor:
+    """Forks, watches and drains the worker processes"""
+
+    def __init__(self, app, host: str, port: int, workers: int):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.drain_timeout = float(os.getenv("DRAIN_TIMEOUT", 30))
+        self.heartbeat_timeout = float(os.getenv("WORKER_HEARTBEAT_TIMEOUT", 30))
+        self.metrics_dir = tempfile.mkdtemp(prefix="agent-metrics-")
+        self._socket: Optional[socket.socket] = None
+        self._children: Dict[int, float] = {}  # pid -> start time
+        self._stopping = False
+        self.restarts = 0
+
+    def bind(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        self._socket = sock
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._run_worker()
+            except BaseException as e:
+                print(f"Worker {os.getpid()} crashed: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        self._children[pid] = time.monotonic()
+
+    def _run_worker(self):
+        import uvicorn
+        # uvicorn installs its own SIGTERM/SIGINT handlers for a graceful shutdown
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        os.environ["METRICS_DIR"] = self.metrics_dir
+        config = uvicorn.Config(
+            self.app,
+            log_level=os.getenv("LOG_LEVEL", "info"),
+            timeout_graceful_shutdown=self.drain_timeout
+        )
+        uvicorn.Server(config).run(sockets=[self._socket])
+
+    def _stop(self, signum, frame):
+        self._stopping = True
+
+    def _reap(self):
+        """Collect exited workers; replace them unless shutting down"""
+        while self._children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            started = self._children.pop(pid, None)
+            if started is None or self._stopping:
+                continue
+            print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; restarting")
+            if time.monotonic() - started < 5:
+                time.sleep(1)  # don't spin on a worker that crashes at startup
+            self.restarts += 1
+            self.spawn()
+
+    def _check_heartbeats(self):
+        """Kill workers whose event loop stopped writing metrics snapshots"""
+        now = time.time()
+        for pid, started in list(self._children.items()):
+            try:
+                last = os.stat(snapshot_path(self.metrics_dir, pid)).st_mtime
+            except FileNotFoundError:
+                last = now - (time.monotonic() - started)
+            if now - last > self.heartbeat_timeout:
+                print(f"Worker {pid} missed its heartbeat for {now - last:.0f}s; killing it")
+                os.kill(pid, signal.SIGKILL)
+
+    def drain(self):
+        """Ask every worker to finish in-flight requests, then force the stragglers"""
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.drain_timeout + 15
+        while self._children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in list(self._children):
+            print(f"Worker {pid} did not drain in time; killing it")
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            self._children.pop(pid, None)
+
+    def run(self):
+        self.bind()
+        for _ in range(self.workers):
+            self.spawn()
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        print(f"Serving on http://{self.host}:{self.port} with {self.workers} workers")
+        try:
+            while not self._stopping:
+                self._reap()
+                self._check_heartbeats()
+                time.sleep(0.5)
+            print("Draining workers...")
+            self.drain()
+        finally:
+            self._socket.close()
+            shutil.rmtree(self.metrics_dir, ignore_errors=True)
+
+
+def serve(app, preload: Callable, host: str = "0.0.0.0", port: int = 8001, workers: int = 2):
+    """Preload shared state once, then serve with preforked workers"""
+    started = time.perf_counter()
+    preload()
+    print(f"Preloaded graph, prompt and catalog in {time.perf_counter() - started:.2f}s")
+    if os.getenv("SESSION_BACKEND", "memory").lower() == "memory":
+        print("Warning: SESSION_BACKEND=memory keeps sessions and deferred analysis results per worker; "
+              "use sqlite or redis with several workers")
+    print("Note: with several workers, idempotent request coalescing, per-user turn ordering and the "
+          "answer and incremental-analysis caches apply within each worker only")
+    Supervisor(app, host, port, workers).run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the agent API with several worker processes")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 8001)))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WORKERS", os.cpu_count() or 1)))
+    args = parser.parse_args()
+
+    from app.main import app, preload
+    serve(app, preload, args.host, args.port, max(1, args.workers))
+
+
+if __name__ == "__main__":
+    main()
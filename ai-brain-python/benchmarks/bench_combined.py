@@ -0,0 +1,125 @@
+"""Compare separate agent + analyzer calls with the combined respond+analyze mode.
+
+Plays the same scripted conversations turn by turn through /agent/chat in
+both modes and reports LLM calls, tokens (as counted by the fake server) and
+latency per turn.
+
+Usage (from ai-brain-python/):
+    python -m benchmarks.bench_combined --latency 0.3
+    python -m benchmarks.bench_combined --invalid-rate 0.2   # exercise the analyzer fallback
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import httpx
+
+from benchmarks.fake_openai import FakeOpenAIServer
+
+
+CONVERSATIONS = [
+    [
+        "hi",
+        "How much is the pro plan?",
+        "We are a team of 12 at Acme Corp, budget around $200/month",
+        "Can I book a demo next week? My email is jane@acme.com",
+        "thanks!",
+    ],
+    [
+        "hello there",
+        "What features do you have for agencies?",
+        "How does that compare with the enterprise plan pricing?",
+        "I'm Raj, head of growth at Brightline. Call me on +91 98765 43210",
+    ],
+    [
+        "Your outreach emails keep landing in spam, this is frustrating",
+        "We are on the basic plan, does pro fix deliverability?",
+        "ok",
+    ],
+]
+
+
+async def run_mode(app, fake_app, mode: str) -> dict:
+    from app.agent.analyzer import ANALYSIS_COUNTERS
+
+    os.environ["COMBINED_ANALYSIS"] = "true" if mode == "combined" else "false"
+    fake_app.state.stats = {}
+    counters_before = dict(ANALYSIS_COUNTERS)
+    latencies = []
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                 timeout=120) as client:
+        for index, conversation in enumerate(CONVERSATIONS):
+            history = []
+            for message in conversation:
+                payload = {"user_id": f"{mode}-{index}", "platform": "web", "message": message, "history": history}
+                started = time.perf_counter()
+                resp = await client.post("/agent/chat", json=payload)
+                resp.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+                history = history + [
+                    {"role": "user", "content": message},
+                    {"role": "assistant", "content": resp.json()["response"]},
+                ]
+
+    turns = len(latencies)
+    stats = fake_app.state.stats
+    calls = sum(s["count"] for s in stats.values())
+    prompt_tokens = sum(s["prompt_tokens"] for s in stats.values())
+    completion_tokens = sum(s["completion_tokens"] for s in stats.values())
+    return {
+        "turns": turns,
+        "llm_calls_per_turn": round(calls / turns, 2),
+        "prompt_tokens_per_turn": round(prompt_tokens / turns, 1),
+        "completion_tokens_per_turn": round(completion_tokens / turns, 1),
+        "mean_latency_ms": round(sum(latencies) / turns * 1000, 1),
+        "calls_by_kind": {kind: s["count"] for kind, s in sorted(stats.items())},
+        "analysis_sources": {
+            key: ANALYSIS_COUNTERS[key] - counters_before.get(key, 0)
+            for key in ANALYSIS_COUNTERS if ANALYSIS_COUNTERS[key] != counters_before.get(key, 0)
+        },
+    }
+
+
+async def run_all(app, fake_app) -> dict:
+    # One event loop for both modes: the pooled LLM clients are bound to it
+    return {mode: await run_mode(app, fake_app, mode) for mode in ("separate", "combined")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.3, help="fake LLM latency (s)")
+    parser.add_argument("--invalid-rate", type=float, default=0.0,
+                        help="fraction of combined answers the fake returns as plain text")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    with FakeOpenAIServer(port=args.port, latency=args.latency, token_delay=0,
+                          invalid_rate=args.invalid_rate) as server:
+        os.environ["OPENAI_API_KEY"] = "sk-fake"
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        # Every turn should reach the model
+        os.environ.setdefault("ANSWER_CACHE", "false")
+        os.environ.setdefault("IDEMPOTENCY", "false")
+        os.environ.setdefault("FAST_PATH", "false")
+        from app.main import app
+
+        results = asyncio.run(run_all(app, server.app))
+
+    separate, combined = results["separate"], results["combined"]
+    print(f"{'':28}{'separate':>12}{'combined':>12}")
+    for key in ("llm_calls_per_turn", "prompt_tokens_per_turn", "completion_tokens_per_turn", "mean_latency_ms"):
+        print(f"{key:28}{separate[key]:>12}{combined[key]:>12}")
+    for mode, result in results.items():
+        print(f"{mode} calls: {result['calls_by_kind']}  analyses: {result['analysis_sources']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Check that concurrent /agent/chat requests overlap instead of serializing.
+
+Usage (from ai-brain-python/):
+    python -m benchmarks.bench_concurrency --requests 20 --latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import httpx
+
+from benchmarks.fake_openai import FakeOpenAIServer
+
+
+def chat_payload(i: int) -> dict:
+    return {
+        "user_id": f"bench-{i}",
+        "platform": "web",
+        "message": "How much is the pro plan?",
+        "history": [],
+        "known_entities": {},
+    }
+
+
+async def run(app, requests: int, samples: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        # The first request pays for lazy imports and graph compilation. Baseline
+        # users come after the batch's, so no batch request replays one of them
+        resp = await client.post("/agent/chat", json=chat_payload(requests))
+        resp.raise_for_status()
+
+        timings = []
+        for i in range(samples):
+            start = time.perf_counter()
+            resp = await client.post("/agent/chat", json=chat_payload(requests + 1 + i))
+            resp.raise_for_status()
+            timings.append(time.perf_counter() - start)
+        single = statistics.median(timings)
+
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.post("/agent/chat", json=chat_payload(i)) for i in range(requests)
+        ])
+        wall = time.perf_counter() - start
+
+    failed = sum(1 for r in responses if r.status_code != 200)
+    return {"single": single, "wall": wall, "failed": failed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--samples", type=int, default=5, help="warm sequential requests for the baseline")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    with FakeOpenAIServer(port=args.port, latency=args.latency) as server:
+        os.environ["OPENAI_API_KEY"] = "sk-fake"
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        # Measure the full agent path, not first-turn cache hits or fast-path replies
+        os.environ.setdefault("ANSWER_CACHE", "false")
+        os.environ.setdefault("FAST_PATH", "false")
+        from app.main import app
+
+        result = asyncio.run(run(app, args.requests, max(1, args.samples)))
+
+    serial = result["single"] * args.requests
+    print(f"requests:          {args.requests}")
+    print(f"fake LLM latency:  {args.latency:.2f}s")
+    print(f"single request:    {result['single']:.2f}s (median of {max(1, args.samples)} warm requests)")
+    print(f"concurrent wall:   {result['wall']:.2f}s (serial would be ~{serial:.2f}s)")
+    print(f"overlap factor:    {serial / result['wall']:.1f}x")
+    print(f"failed:            {result['failed']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Exercise model-call timeouts, hedging and the circuit breaker against injected faults.
+
+Runs /agent/chat turns against the fake OpenAI server in three phases:
+
+1. tail latency: the first model call of a fraction of turns is slow;
+   compares latency percentiles with hedged requests off and on. Both runs
+   slow the same turns (chosen with --seed), so only hedging differs
+2. outage: every model call fails; the circuit breaker should open and
+   turns should get the canned reply and rule-based metadata quickly
+3. recovery: faults cleared; after the cooldown a probe closes the circuit
+
+Usage (from ai-brain-python/):
+    python -m benchmarks.bench_resilience --requests 100 --slow-rate 0.03 --slow-latency 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+import httpx
+
+from benchmarks.fake_openai import FakeOpenAIServer
+
+
+MESSAGES = [
+    "How much is the pro plan?",
+    "What features do you have for agencies?",
+    "We are a team of 12 at Acme Corp, budget around $200/month",
+]
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run_turns(client: httpx.AsyncClient, count: int, concurrency: int, tag: str, slow=()) -> dict:
+    """Run ``count`` turns; the first model call of each turn index in ``slow`` is slow"""
+    from app.agent.nodes import FALLBACK_REPLY
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, fallbacks, errors = [], 0, 0
+
+    async def turn(i: int):
+        nonlocal fallbacks, errors
+        message = MESSAGES[i % len(MESSAGES)]
+        if i in slow:
+            # Scripted on the fake server, so both tail runs see the same slow calls
+            message += f" [slow:{tag}-{i}]"
+        payload = {"user_id": f"{tag}-{i}", "platform": "web", "message": message}
+        async with semaphore:
+            started = time.perf_counter()
+            resp = await client.post("/agent/chat", json=payload)
+            latencies.append(time.perf_counter() - started)
+        if resp.status_code != 200:
+            errors += 1
+        elif resp.json()["response"] == FALLBACK_REPLY:
+            fallbacks += 1
+
+    await asyncio.gather(*[turn(i) for i in range(count)])
+    return {
+        "turns": count,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1),
+        "fallback_replies": fallbacks,
+        "errors": errors,
+    }
+
+
+def counter_delta(before: dict, after: dict) -> dict:
+    return {key: after[key] - before[key] for key in after if after[key] != before[key]}
+
+
+async def run_all(app, fake_app, args) -> dict:
+    from app.agent.resilience import resilience
+
+    results = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                 timeout=120) as client:
+        # Collect latency samples so hedging has a p95 to work from
+        await run_turns(client, resilience.hedge_min_samples, args.concurrency, "warmup")
+
+        fake_app.state.slow_latency = args.slow_latency
+        slow = set(random.Random(args.seed).sample(range(args.requests), round(args.slow_rate * args.requests)))
+        for hedge in (False, True):
+            resilience.hedge = hedge
+            before = dict(resilience.counters)
+            result = await run_turns(client, args.requests, args.concurrency, f"hedge-{hedge}", slow)
+            result["slow_turns"] = len(slow)
+            result["model_calls"] = counter_delta(before, resilience.counters)
+            results["tail_hedged" if hedge else "tail_unhedged"] = result
+
+        fake_app.state.error_rate = 1.0
+        before = dict(resilience.counters)
+        result = await run_turns(client, args.requests, args.concurrency, "outage")
+        result["model_calls"] = counter_delta(before, resilience.counters)
+        result["breaker"] = resilience.breaker.stats()
+        results["outage"] = result
+
+        fake_app.state.error_rate = 0.0
+        await asyncio.sleep(resilience.breaker.cooldown)
+        result = await run_turns(client, args.requests // 4 or 1, 1, "recovery")
+        result["breaker"] = resilience.breaker.stats()
+        results["recovery"] = result
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100, help="chat turns per phase")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.1, help="normal fake LLM latency (s)")
+    parser.add_argument("--slow-rate", type=float, default=0.03,
+                        help="fraction of turns with a slow model call (hedging helps while this is below 1 - quantile)")
+    parser.add_argument("--seed", type=int, default=0, help="picks the slow turns")
+    parser.add_argument("--slow-latency", type=float, default=2.0, help="latency of slow model calls (s)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    with FakeOpenAIServer(port=args.port, latency=args.latency, token_delay=0) as server:
+        os.environ["OPENAI_API_KEY"] = "sk-fake"
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        # Every turn should reach the model
+        os.environ.setdefault("ANSWER_CACHE", "false")
+        os.environ.setdefault("IDEMPOTENCY", "false")
+        os.environ.setdefault("FAST_PATH", "false")
+        os.environ.setdefault("INCREMENTAL_ANALYSIS", "false")
+        os.environ.setdefault("LLM_TIMEOUT", str(args.slow_latency * 2))
+        os.environ.setdefault("LLM_RETRY_BACKOFF", "0.05")
+        os.environ.setdefault("BREAKER_COOLDOWN", "2")
+        from app.main import app
+
+        results = asyncio.run(run_all(app, server.app, args))
+
+    for phase, result in results.items():
+        print(f"{phase:16} p50={result['p50_ms']:>8}ms p95={result['p95_ms']:>8}ms p99={result['p99_ms']:>8}ms "
+              f"fallbacks={result['fallback_replies']} errors={result['errors']}")
+        for key in ("slow_turns", "model_calls", "breaker"):
+            if key in result:
+                print(f"{'':16} {key}: {result[key]}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Measure service cold start: import time of app.main and time until /health and /ready.
+
+Each run starts a fresh uvicorn process pointed at the fake OpenAI server.
+
+Usage (from ai-brain-python/):
+    python -m benchmarks.bench_startup --runs 5
+    python -m benchmarks.bench_startup --runs 5 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.bench_concurrency import chat_payload
+from benchmarks.fake_openai import FakeOpenAIServer
+
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+
+
+def service_env(base_url: str) -> dict:
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "sk-fake")
+    env["OPENAI_BASE_URL"] = base_url
+    env.setdefault("ANSWER_CACHE", "false")
+    return env
+
+
+def measure_import(env: dict) -> float:
+    """Seconds to import app.main in a fresh interpreter"""
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], env=env, check=True,
+                         capture_output=True, text=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(env: dict, top: int) -> list:
+    """Third-party packages with the largest import time under app.main (-X importtime)"""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"], env=env,
+                         check=True, capture_output=True, text=True)
+    totals = {}
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        package = name.strip().split(".")[0]
+        if cumulative.strip().isdigit() and package not in ("app", ""):
+            totals[package] = max(totals.get(package, 0.0), int(cumulative.strip()) / 1e6)
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def measure_boot(env: dict, port: int, timeout: float) -> dict:
+    """Start the service and time /health, /ready and the first chat turn"""
+    url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env
+    )
+    result = {"health": None, "ready": None, "first_chat": None}
+    try:
+        with httpx.Client(base_url=url, timeout=30) as client:
+            while time.perf_counter() - started < timeout:
+                try:
+                    if result["health"] is None and client.get("/health").status_code == 200:
+                        result["health"] = time.perf_counter() - started
+                    ready = client.get("/ready")
+                    if ready.status_code == 200:
+                        result["ready"] = time.perf_counter() - started
+                        break
+                    if ready.json()["status"] == "failed":
+                        print(f"warm-up failed: {ready.json()['error']}")
+                        break
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.01)
+            if result["ready"] is not None:
+                chat_started = time.perf_counter()
+                client.post("/agent/chat", json=chat_payload(0)).raise_for_status()
+                result["first_chat"] = time.perf_counter() - chat_started
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    return result
+
+
+def summarize(values: list) -> dict:
+    values = [v for v in values if v is not None]
+    if not values:
+        return {"median": None, "min": None, "max": None}
+    return {"median": statistics.median(values), "min": min(values), "max": max(values)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.1, help="fake LLM latency (s)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--app-port", type=int, default=8766)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--top", type=int, default=8, help="slowest imports to list")
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    with FakeOpenAIServer(port=args.port, latency=args.latency, token_delay=0) as server:
+        env = service_env(server.base_url)
+        imports = [measure_import(env) for _ in range(args.runs)]
+        boots = [measure_boot(env, args.app_port, args.timeout) for _ in range(args.runs)]
+        slowest = slowest_imports(env, args.top)
+
+    results = {
+        "runs": args.runs,
+        "import_app_main": summarize(imports),
+        "time_to_health": summarize([b["health"] for b in boots]),
+        "time_to_ready": summarize([b["ready"] for b in boots]),
+        "first_chat": summarize([b["first_chat"] for b in boots]),
+        "slowest_imports": dict(slowest),
+    }
+
+    for name in ("import_app_main", "time_to_health", "time_to_ready", "first_chat"):
+        stats = results[name]
+        if stats["median"] is None:
+            print(f"{name:16} n/a")
+        else:
+            print(f"{name:16} median {stats['median']:.3f}s  min {stats['min']:.3f}s  max {stats['max']:.3f}s")
+    print("slowest imports:")
+    for name, seconds in slowest:
+        print(f"  {name:40} {seconds:.3f}s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Measure time-to-first-token of /agent/chat/stream against /agent/chat.
+
+Usage (from ai-brain-python/):
+    python -m benchmarks.bench_streaming --latency 0.5 --token-delay 0.05
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+from benchmarks.bench_concurrency import chat_payload
+from benchmarks.fake_openai import FakeOpenAIServer, ServerThread
+
+
+async def run(base_url: str) -> dict:
+    # A real server is needed here: ASGITransport buffers streamed bodies
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        start = time.perf_counter()
+        resp = await client.post("/agent/chat", json=chat_payload(0))
+        resp.raise_for_status()
+        blocking = time.perf_counter() - start
+
+        first_token = None
+        events = []
+        start = time.perf_counter()
+        async with client.stream("POST", "/agent/chat/stream", json=chat_payload(1)) as resp:
+            async for line in resp.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                    events.append(event)
+                    if event == "token" and first_token is None:
+                        first_token = time.perf_counter() - start
+        streamed = time.perf_counter() - start
+
+    return {"blocking": blocking, "first_token": first_token, "streamed": streamed, "events": events}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--token-delay", type=float, default=0.05)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--app-port", type=int, default=8766)
+    args = parser.parse_args()
+
+    with FakeOpenAIServer(port=args.port, latency=args.latency, token_delay=args.token_delay) as server:
+        os.environ["OPENAI_API_KEY"] = "sk-fake"
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        # Measure the full agent path, not first-turn cache hits or fast-path replies
+        os.environ.setdefault("ANSWER_CACHE", "false")
+        os.environ.setdefault("FAST_PATH", "false")
+        from app.main import app
+
+        with ServerThread(app, port=args.app_port) as app_server:
+            result = asyncio.run(run(app_server.url))
+
+    print(f"/agent/chat full response:     {result['blocking']:.2f}s")
+    print(f"/agent/chat/stream first token: {result['first_token']:.2f}s")
+    print(f"/agent/chat/stream complete:    {result['streamed']:.2f}s")
+    print(f"events: {', '.join(sorted(set(result['events'])))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""Local OpenAI-compatible stub server used by the benchmarks.
+
+Serves ``POST /v1/chat/completions`` with a configurable artificial latency so
+the agent service can be exercised without network access or API costs.
+Streaming requests are answered word by word with ``token_delay`` between
+chunks. Agent requests whose last user message matches a tool script get
+scripted tool calls back, so the agent -> tools -> agent loop runs too.
+Agent requests offering the combined reply_with_analysis tool get their final
+answer as a call to it (or, with ``invalid_rate``, sometimes as plain text to
+exercise the analyzer fallback).
+
+Faults can be injected to exercise timeouts, retries, hedging and the circuit
+breaker: ``error_rate`` answers a fraction of requests with HTTP 500, and
+``slow_rate`` delays a fraction by ``slow_latency`` seconds instead of
+``latency``. They can be changed while running with ``POST /_faults``.
+For reproducible runs, an agent request whose last user message contains
+``[slow:<id>]`` is delayed by ``slow_latency`` the first time that id is
+seen; its retried or hedged copy is answered at normal speed.
+"""
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+ANALYSIS_MARKER = "lead qualification analyst"
+BATCH_MARKER = "Batch Output Format"
+SUMMARY_MARKER = "running summary"
+COMBINED_TOOL_NAME = "reply_with_analysis"
+BATCH_ID_RE = re.compile(r"\*\*Conversation id: (\S+?)\*\*")
+SLOW_MARKER_RE = re.compile(r"\[slow:(\S+?)\]")
+
+ANALYSIS_RESULT = {
+    "new_entities": {},
+    "intent": "pricing_inquiry",
+    "sentiment": "neutral",
+    "confidence": 0.8,
+    "lead_score": 35,
+    "urgency": "medium",
+    "suggested_action": "continue_conversation",
+    "should_notify_sales": False,
+    "reasoning": "Scripted benchmark analysis",
+}
+
+AGENT_REPLY = "Thanks for reaching out! Our Pro plan is the most popular choice for growing businesses."
+SUMMARY_REPLY = "The user asked about plans and pricing and is evaluating the Pro plan."
+
+# (pattern on the last user message, tool calls to return)
+DEFAULT_TOOL_SCRIPTS = [
+    (r"\b(price|pricing|cost|how much)\b", [{"name": "get_pricing", "args": {"plan": "pro"}}]),
+    (r"\b(features?|compare)\b", [{"name": "get_features", "args": {"plan": "all"}}]),
+]
+
+
+def usage(prompt: str, content: str, tool_calls=None) -> dict:
+    # Tool-call arguments are generated tokens too
+    content += "".join(call["function"]["arguments"] for call in tool_calls or [])
+    return {
+        "prompt_tokens": len(prompt) // 4,
+        "completion_tokens": len(content) // 4,
+        "total_tokens": (len(prompt) + len(content)) // 4,
+    }
+
+
+def combined_reply_call() -> list:
+    analysis = {key: value for key, value in ANALYSIS_RESULT.items() if key != "reasoning"}
+    return [{
+        "id": f"call_{uuid.uuid4().hex[:24]}",
+        "type": "function",
+        "function": {"name": COMBINED_TOOL_NAME, "arguments": json.dumps({"reply": AGENT_REPLY, "analysis": analysis})},
+    }]
+
+
+def wants_combined(body: dict) -> bool:
+    return any((tool.get("function") or {}).get("name") == COMBINED_TOOL_NAME for tool in body.get("tools") or [])
+
+
+def classify(prompt: str) -> str:
+    if BATCH_MARKER in prompt:
+        return "batch"
+    if ANALYSIS_MARKER in prompt:
+        return "analyzer"
+    if SUMMARY_MARKER in prompt:
+        return "summary"
+    return "agent"
+
+
+def slow_marker(body: dict):
+    """Id of a ``[slow:<id>]`` marker in the last message if it is the user's, else None"""
+    messages = body.get("messages", [])
+    if not messages or messages[-1].get("role") != "user":
+        return None
+    match = SLOW_MARKER_RE.search(str(messages[-1].get("content", "")))
+    return match.group(1) if match else None
+
+
+def scripted_tool_calls(app: FastAPI, body: dict):
+    """Tool calls for an agent request, or None for a plain text answer"""
+    messages = body.get("messages", [])
+    if not body.get("tools") or body.get("tool_choice") == "none":
+        return None
+    if not messages or messages[-1].get("role") != "user":
+        return None
+    text = str(messages[-1].get("content", "")).lower()
+    for pattern, calls in app.state.tool_scripts:
+        if re.search(pattern, text):
+            return [
+                {
+                    "id": f"call_{uuid.uuid4().hex[:24]}",
+                    "type": "function",
+                    "function": {"name": call["name"], "arguments": json.dumps(call["args"])},
+                }
+                for call in calls
+            ]
+    return None
+
+
+async def stream_chunks(app: FastAPI, body: dict, prompt: str, content: str, tool_calls=None):
+    """Yield OpenAI-style ``chat.completion.chunk`` SSE lines"""
+    chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+    base = {
+        "id": chunk_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o-mini"),
+    }
+
+    def chunk(delta: dict, finish_reason=None) -> str:
+        data = dict(base, choices=[{"index": 0, "delta": delta, "finish_reason": finish_reason}])
+        return f"data: {json.dumps(data)}\n\n"
+
+    yield chunk({"role": "assistant", "content": ""})
+    if tool_calls:
+        yield chunk({"tool_calls": [dict(call, index=i) for i, call in enumerate(tool_calls)]})
+        yield chunk({}, finish_reason="tool_calls")
+    else:
+        words = content.split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(app.state.token_delay)
+            yield chunk({"content": word if i == 0 else " " + word})
+        yield chunk({}, finish_reason="stop")
+    if (body.get("stream_options") or {}).get("include_usage"):
+        yield f"data: {json.dumps(dict(base, choices=[], usage=usage(prompt, content, tool_calls)))}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+FAULTS = ("error_rate", "slow_rate", "slow_latency")
+
+
+def create_app(latency: float = 0.5, token_delay: float = 0.02, jitter: float = 0.0,
+               tool_scripts=None, invalid_rate: float = 0.0, error_rate: float = 0.0,
+               slow_rate: float = 0.0, slow_latency: float = 5.0) -> FastAPI:
+    """Create the stub app; every completion waits ``latency`` seconds (+/- ``jitter`` fraction)"""
+    app = FastAPI(title="Fake OpenAI")
+    app.state.latency = latency
+    app.state.token_delay = token_delay
+    app.state.jitter = jitter
+    app.state.tool_scripts = DEFAULT_TOOL_SCRIPTS if tool_scripts is None else tool_scripts
+    app.state.invalid_rate = invalid_rate
+    app.state.error_rate = error_rate
+    app.state.slow_rate = slow_rate
+    app.state.slow_latency = slow_latency
+    app.state.requests = 0
+    app.state.slowed = set()  # [slow:<id>] markers already delayed once
+    app.state.faults_injected = {"errors": 0, "slow": 0}
+    app.state.stats = {}
+
+    @app.post("/_faults")
+    async def set_faults(request: Request):
+        body = await request.json()
+        for key in FAULTS:
+            if key in body:
+                setattr(app.state, key, float(body[key]))
+        return {key: getattr(app.state, key) for key in FAULTS}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        started = time.perf_counter()
+        latency = app.state.latency * random.uniform(1 - app.state.jitter, 1 + app.state.jitter)
+        marker = slow_marker(body)
+        if marker is not None and marker not in app.state.slowed:
+            app.state.slowed.add(marker)
+            app.state.faults_injected["slow"] += 1
+            latency = app.state.slow_latency
+        elif random.random() < app.state.slow_rate:
+            app.state.faults_injected["slow"] += 1
+            latency = app.state.slow_latency
+        await asyncio.sleep(latency)
+        if random.random() < app.state.error_rate:
+            app.state.faults_injected["errors"] += 1
+            return JSONResponse(status_code=500, content={"error": {
+                "message": "Injected server error", "type": "server_error", "code": None
+            }})
+
+        prompt = " ".join(str(m.get("content", "")) for m in body.get("messages", []))
+        kind = classify(prompt)
+        tool_calls = scripted_tool_calls(app, body) if kind == "agent" else None
+        if kind == "batch":
+            ids = BATCH_ID_RE.findall(prompt)
+            content = json.dumps({"results": [dict(ANALYSIS_RESULT, id=i) for i in ids]})
+        elif kind == "analyzer":
+            content = json.dumps(ANALYSIS_RESULT)
+        elif kind == "summary":
+            content = SUMMARY_REPLY
+        elif tool_calls:
+            content = ""
+        elif wants_combined(body) and random.random() >= app.state.invalid_rate:
+            kind = "agent_combined"
+            content = ""
+            tool_calls = combined_reply_call()
+        else:
+            content = AGENT_REPLY
+        if tool_calls and kind != "agent_combined":
+            kind = "agent_tool_call"
+
+        stats = app.state.stats.setdefault(
+            kind, {"count": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0}
+        )
+        stats["count"] += 1
+        stats["seconds"] += time.perf_counter() - started
+        tokens = usage(prompt, content, tool_calls)
+        stats["prompt_tokens"] += tokens["prompt_tokens"]
+        stats["completion_tokens"] += tokens["completion_tokens"]
+
+        if body.get("stream"):
+            return StreamingResponse(
+                stream_chunks(app, body, prompt, content, tool_calls), media_type="text/event-stream"
+            )
+
+        message = {"role": "assistant", "content": content or None}
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [{
+                "index": 0,
+                "message": message,
+                "finish_reason": "tool_calls" if tool_calls else "stop",
+            }],
+            "usage": usage(prompt, content, tool_calls),
+        }
+
+    return app
+
+
+class ServerThread:
+    """Runs an ASGI app with uvicorn in a background thread"""
+
+    def __init__(self, app, host: str = "127.0.0.1", port: int = 8765):
+        self.host = host
+        self.port = port
+        self.app = app
+        self._server = uvicorn.Server(
+            uvicorn.Config(app, host=host, port=port, log_level="warning")
+        )
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class FakeOpenAIServer(ServerThread):
+    """The stub app running in a background thread"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, latency: float = 0.5,
+                 token_delay: float = 0.02, jitter: float = 0.0, tool_scripts=None,
+                 invalid_rate: float = 0.0, error_rate: float = 0.0, slow_rate: float = 0.0,
+                 slow_latency: float = 5.0):
+        super().__init__(
+            create_app(latency, token_delay, jitter, tool_scripts, invalid_rate, error_rate, slow_rate, slow_latency),
+            host, port
+        )
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.url}/v1"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI-compatible server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with HTTP 500")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of requests delayed by --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=5.0)
+    args = parser.parse_args()
+    app = create_app(args.latency, args.token_delay, args.jitter, error_rate=args.error_rate,
+                     slow_rate=args.slow_rate, slow_latency=args.slow_latency)
+    uvicorn.run(app, host=args.host, port=args.port)
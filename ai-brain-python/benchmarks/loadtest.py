@@ -0,0 +1,215 @@
+"""Load test /agent/chat against the fake OpenAI server.
+
+Runs each scenario with a concurrent load generator and reports requests/s,
+latency percentiles, event-loop lag and a per-stage breakdown of the LLM
+calls as seen by the fake server. Results are written as JSON so runs from
+different commits can be compared.
+
+Usage (from ai-brain-python/):
+    python -m benchmarks.loadtest --requests 200 --concurrency 20 --output bench-results.json
+    python -m benchmarks.loadtest --compare bench-results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import time
+
+import httpx
+
+from benchmarks.fake_openai import FakeOpenAIServer
+
+
+def long_history(turns: int = 40) -> list:
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"Question {i}: how would LeadGenLite help my agency with client number {i}?"})
+        history.append({"role": "assistant", "content": "LeadGenLite finds qualified leads, writes personalized outreach and tracks every client in one place."})
+    return history
+
+
+SCENARIOS = {
+    "greeting": {"message": "hi", "history": []},
+    "pricing_tool_loop": {"message": "How much is the pro plan?", "history": []},
+    "long_history": {"message": "ok, what would you recommend?", "history": long_history()},
+}
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class LoopLagMonitor:
+    """Measures how late a periodic timer fires on the shared event loop"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+async def run_scenario(app, fake_app, name: str, requests: int, concurrency: int) -> dict:
+    scenario = SCENARIOS[name]
+    fake_app.state.stats = {}
+    latencies, errors = [], 0
+    counter = iter(range(requests))
+
+    async def worker(client):
+        nonlocal errors
+        for i in counter:
+            payload = {
+                "user_id": f"{name}-{i}",
+                "platform": "web",
+                "message": scenario["message"],
+                "history": scenario["history"],
+            }
+            started = time.perf_counter()
+            try:
+                resp = await client.post("/agent/chat", json=payload)
+                ok = resp.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += 0 if ok else 1
+
+    monitor = LoopLagMonitor()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        monitor.start()
+        started = time.perf_counter()
+        await asyncio.gather(*[worker(client) for _ in range(concurrency)])
+        wall = time.perf_counter() - started
+        await monitor.stop()
+
+    stages = {
+        kind: {
+            "calls": stats["count"],
+            "calls_per_request": round(stats["count"] / requests, 2),
+            "mean_ms": round(stats["seconds"] / stats["count"] * 1000, 2),
+        }
+        for kind, stats in sorted(fake_app.state.stats.items())
+    }
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "requests_per_second": round(requests / wall, 2),
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies) * 1000, 2),
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "max": round(max(latencies) * 1000, 2),
+        },
+        "loop_lag_ms": {
+            "p99": round(percentile(monitor.samples, 99) * 1000, 2),
+            "max": round(max(monitor.samples, default=0.0) * 1000, 2),
+        },
+        "llm_stages": stages,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(previous: dict, current: dict):
+    print(f"\ncompared with {previous.get('commit')}:")
+    for name, result in current["scenarios"].items():
+        old = previous.get("scenarios", {}).get(name)
+        if not old:
+            continue
+        for label, new_value, old_value in [
+            ("req/s", result["requests_per_second"], old["requests_per_second"]),
+            ("p50 ms", result["latency_ms"]["p50"], old["latency_ms"]["p50"]),
+            ("p95 ms", result["latency_ms"]["p95"], old["latency_ms"]["p95"]),
+            ("p99 ms", result["latency_ms"]["p99"], old["latency_ms"]["p99"]),
+        ]:
+            change = (new_value - old_value) / old_value * 100 if old_value else 0.0
+            print(f"  {name:<18} {label:<7} {old_value:>9} -> {new_value:>9} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.3, help="fake LLM latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="fake LLM latency jitter (fraction)")
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    args = parser.parse_args()
+
+    previous = None
+    if args.compare and os.path.exists(args.compare):
+        with open(args.compare) as f:
+            previous = json.load(f)
+
+    with FakeOpenAIServer(port=args.port, latency=args.latency, token_delay=args.token_delay,
+                          jitter=args.jitter) as server:
+        os.environ["OPENAI_API_KEY"] = "sk-fake"
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        # Measure the full agent path, not first-turn cache hits or fast-path replies
+        os.environ.setdefault("ANSWER_CACHE", "false")
+        os.environ.setdefault("FAST_PATH", "false")
+        from app.main import app
+
+        async def run_all():
+            results = {}
+            for name in args.scenarios.split(","):
+                results[name] = await run_scenario(app, server.app, name, args.requests, args.concurrency)
+                lat = results[name]["latency_ms"]
+                print(f"{name:<18} {results[name]['requests_per_second']:>8} req/s  "
+                      f"p50 {lat['p50']:>8} ms  p95 {lat['p95']:>8} ms  p99 {lat['p99']:>8} ms  "
+                      f"errors {results[name]['errors']}")
+            return results
+
+        scenarios = asyncio.run(run_all())
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "token_delay": args.token_delay,
+        },
+        "scenarios": scenarios,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if previous:
+        compare(previous, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import time
+
+import pytest
+from pydantic import ValidationError
+
+from app.agent.analysis_queue import AnalysisJob, AnalysisQueue
+from app.api.chat import ChatRequest
+
+
+@pytest.mark.parametrize("url, allowed", [
+    ("https://hooks.example.com/leads/analysis", True),
+    ("https://hooks.example.com/leads", True),
+    ("https://hooks.example.com/leadsx", False),
+    ("https://hooks.example.com.evil.io/leads", False),
+    ("http://hooks.example.com/leads", False),
+    ("https://hooks.example.com:8443/leads", False),
+    ("http://169.254.169.254/latest/meta-data", False),
+])
+def test_callback_allowlist(url, allowed):
+    queue = AnalysisQueue()
+    queue.callback_allowlist = ["https://hooks.example.com/leads"]
+    assert queue.callback_allowed(url) == allowed
+
+
+def test_request_with_unlisted_callback_is_rejected():
+    with pytest.raises(ValidationError):
+        ChatRequest(user_id="u", platform="web", message="hi", callback_url="http://127.0.0.1:6379/")
+
+
+def test_finished_jobs_behind_a_running_job_are_evicted():
+    queue = AnalysisQueue()
+    queue.result_ttl = 60
+    slow = AnalysisJob([], {})
+    queue._jobs[slow.id] = slow
+    for _ in range(3):
+        job = AnalysisJob([], {})
+        job.finished_at = time.time() - 120
+        queue._jobs[job.id] = job
+        queue._finished[job.id] = job.finished_at
+    queue._evict()
+    assert list(queue._jobs) == [slow.id]
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.agent import analyzer
+from app.agent.analysis_state import analysis_states
+
+
+@pytest.fixture
+def prompts(monkeypatch):
+    """Fake analyzer model; records which user messages each prompt carried"""
+    seen = []
+
+    async def run_analysis_prompt(prompt):
+        seen.append(prompt)
+        return {**analyzer.EMPTY_ANALYSIS, "intent": "pricing_inquiry", "new_entities": {}}
+
+    monkeypatch.setattr(analyzer, "run_analysis_prompt", run_analysis_prompt)
+    monkeypatch.setenv("RULE_SCORING", "false")
+    analysis_states.clear("c1")
+    return seen
+
+
+def analyze(messages, offset=0):
+    return asyncio.run(analyzer.analyze_conversation(messages, {}, "c1", offset))
+
+
+@pytest.mark.parametrize("with_offset", [False, True])
+def test_new_messages_are_analyzed_when_history_is_capped(prompts, with_offset):
+    history, offset = [], 0
+    for i in range(8):
+        messages = history + [HumanMessage(content=f"question {i} about pricing")]
+        analyze(messages, offset if with_offset else 0)
+        assert f"question {i} about pricing" in prompts[-1]
+        assert len(prompts) == i + 1
+        history = messages + [AIMessage(content=f"answer {i}")]
+        dropped = max(0, len(history) - 4)
+        history, offset = history[dropped:], offset + dropped
+
+
+def test_repeated_analysis_is_cached_but_counts_toward_full_refresh(prompts, monkeypatch):
+    monkeypatch.setenv("ANALYSIS_FULL_EVERY", "3")
+    messages = [HumanMessage(content="how much is the pro plan")]
+    for _ in range(3):
+        analyze(messages)
+    assert len(prompts) == 1
+    analyze(messages)
+    assert len(prompts) == 2
+    assert "Analyze the following user conversation" in prompts[-1]
@@ -0,0 +1,53 @@
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.agent.history import HistoryManager
+
+
+def make_manager() -> HistoryManager:
+    manager = HistoryManager()
+    manager.token_budget = 50
+    manager.keep_turns = 2
+    calls = []
+
+    async def summarize(summary, messages, deadline=None):
+        calls.append(len(messages))
+        return f"{summary}+{len(messages)}"
+
+    manager._summarize = summarize
+    manager.calls = calls
+    return manager
+
+
+def turn(i: int):
+    return [HumanMessage(content=f"user message number {i} " * 3), AIMessage(content=f"assistant reply {i} " * 3)]
+
+
+def run_session(manager: HistoryManager, turns: int, max_messages: int):
+    """Replay a server-side session that keeps at most max_messages, like memory.save_session"""
+    history, offset = [], 0
+    for i in range(turns):
+        messages = history + [turn(i)[0]]
+        asyncio.run(manager.compact("c1", messages, offset=offset))
+        history = messages + [turn(i)[1]]
+        dropped = max(0, len(history) - max_messages)
+        history, offset = history[dropped:], offset + dropped
+
+
+def test_summary_is_extended_not_rebuilt_after_session_trimming():
+    manager = make_manager()
+    run_session(manager, turns=20, max_messages=10)
+    assert manager.counters["summaries_created"] == 1
+    assert manager.counters["summaries_extended"] == manager.counters["compacted"] - 1
+    # Each extension only summarizes the messages that aged out since the last turn
+    assert max(manager.calls[1:]) == 2
+
+
+def test_changed_history_rebuilds_summary():
+    manager = make_manager()
+    messages = [m for i in range(6) for m in turn(i)] + [turn(6)[0]]
+    asyncio.run(manager.compact("c1", messages))
+    edited = [HumanMessage(content="something else entirely " * 3)] + messages[1:]
+    asyncio.run(manager.compact("c1", edited))
+    assert manager.counters["summaries_created"] == 2
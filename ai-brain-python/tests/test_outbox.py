@@ -0,0 +1,25 @@
+import asyncio
+
+from app.agent.outbox import SalesOutbox
+
+
+def make_outbox(path) -> SalesOutbox:
+    outbox = SalesOutbox()
+    outbox.webhooks = ["http://127.0.0.1:9/hook"]
+    outbox.path = str(path)
+    return outbox
+
+
+def test_event_is_on_disk_when_enqueue_returns(tmp_path):
+    outbox = make_outbox(tmp_path / "outbox.db")
+    metadata = {"should_notify_sales": True, "lead_score": 80, "new_entities": {"email": "bob@example.com"}}
+    asyncio.run(outbox.enqueue("u1", "web", metadata))
+    # A process that never stops cleanly (crash, SIGKILL) still leaves the event behind
+    other = make_outbox(tmp_path / "outbox.db")
+    assert asyncio.run(other.stats())["pending"] == 1
+
+
+def test_unqualified_turns_are_not_recorded(tmp_path):
+    outbox = make_outbox(tmp_path / "outbox.db")
+    asyncio.run(outbox.enqueue("u1", "web", {"should_notify_sales": False}))
+    assert asyncio.run(outbox.stats())["pending"] == 0
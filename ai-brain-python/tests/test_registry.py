@@ -0,0 +1,30 @@
+import os
+
+from app.agent import registry as registry_module
+from app.agent import tools_enhanced
+from app.agent.catalog import Catalog
+from app.agent.registry import ModelRegistry
+
+
+def pricing_description(model) -> str:
+    return next(t["function"]["description"] for t in model.kwargs["tools"] if t["function"]["name"] == "get_pricing")
+
+
+def test_tool_schemas_follow_catalog_reload(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    path = tmp_path / "catalog.json"
+    path.write_text('{"pricing": {"basic": {}, "pro": {}}}')
+    test_catalog = Catalog(str(path))
+    test_catalog.check_interval = 0
+    monkeypatch.setattr(registry_module, "catalog", test_catalog)
+    monkeypatch.setattr(tools_enhanced, "catalog", test_catalog)
+    registry = ModelRegistry()
+
+    model = registry.agent_model()
+    assert pricing_description(model).endswith("Available plans: basic, pro.")
+    assert registry.agent_model() is model
+
+    path.write_text('{"pricing": {"basic": {}, "pro": {}, "growth": {}}}')
+    os.utime(path, ns=(0, path.stat().st_mtime_ns + 1_000_000_000))
+    assert pricing_description(registry.agent_model()).endswith("Available plans: basic, pro, growth.")
+    assert pricing_description(registry.final_answer_model()).endswith("Available plans: basic, pro, growth.")
@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+
+from app.agent.resilience import CircuitBreaker, CircuitOpen, Resilience
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def make_resilience() -> Resilience:
+    res = Resilience()
+    res.retries = 0
+    res.backoff = 0
+    res.hedge = False
+    res.breaker.window = 60
+    res.breaker.window_size = 4
+    res.breaker.min_calls = 4
+    res.breaker.error_rate = 0.5
+    res.breaker.cooldown = 0
+    return res
+
+
+def trip(res: Resilience):
+    async def fail():
+        raise StatusError(503)
+    for _ in range(res.breaker.min_calls):
+        with pytest.raises(StatusError):
+            asyncio.run(res.call("agent", fail))
+    assert res.breaker.state == "open"
+
+
+async def ok():
+    return "ok"
+
+
+def test_opens_at_error_rate_and_closes_after_successful_probe():
+    res = make_resilience()
+    trip(res)
+    assert asyncio.run(res.call("agent", ok)) == "ok"
+    assert res.breaker.state == "closed"
+
+
+def test_fails_fast_while_open():
+    res = make_resilience()
+    trip(res)
+    res.breaker.cooldown = 60
+    with pytest.raises(CircuitOpen):
+        asyncio.run(res.call("agent", ok))
+
+
+def test_failed_probe_reopens():
+    res = make_resilience()
+    trip(res)
+
+    async def fail():
+        raise StatusError(500)
+    with pytest.raises(StatusError):
+        asyncio.run(res.call("agent", fail))
+    assert res.breaker.state == "open"
+    assert res.breaker.trips == 2
+
+
+def test_only_one_probe_at_a_time():
+    breaker = CircuitBreaker()
+    breaker.cooldown = 0
+    breaker._open(0)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert breaker.allow() is None
+
+
+def test_non_retryable_probe_error_closes():
+    res = make_resilience()
+    trip(res)
+
+    async def bad_request():
+        raise StatusError(400)
+    with pytest.raises(StatusError):
+        asyncio.run(res.call("agent", bad_request))
+    assert res.breaker.state == "closed"
+    assert asyncio.run(res.call("agent", ok)) == "ok"
+
+
+def test_cancelled_probe_releases_slot():
+    res = make_resilience()
+    trip(res)
+
+    async def scenario():
+        task = asyncio.create_task(res.call("agent", lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0.01)
+        assert res.breaker.state == "half_open"
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return await res.call("agent", ok)
+
+    assert asyncio.run(scenario()) == "ok"
+    assert res.breaker.state == "closed"
+
+
+def test_expired_deadline_does_not_take_probe():
+    res = make_resilience()
+    trip(res)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(res.call("agent", ok, deadline=0.0))
+    assert asyncio.run(res.call("agent", ok)) == "ok"
+    assert res.breaker.state == "closed"
+
+
+def test_stale_release_does_not_free_newer_probe():
+    breaker = CircuitBreaker()
+    breaker.cooldown = 0
+    breaker._open(0)
+    first = breaker.allow()
+    breaker.record(False)
+    second = breaker.allow()
+    breaker.release(first)
+    assert second != first
+    assert breaker.allow() is None
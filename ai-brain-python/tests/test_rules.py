@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+from app.agent.rules import apply_rules, extract_entities, needs_llm
+
+
+@pytest.mark.parametrize("text, phone", [
+    ("call me at 555-123-4567", "555-123-4567"),
+    ("my number is (555) 123 4567", "(555) 123 4567"),
+    ("+44 20 7946 0958", "+44 20 7946 0958"),
+    ("can we meet on 2024-01-15 10:00", None),
+    ("our order 1234567890 failed", None),
+    ("order number 1234567890", None),
+    ("sure, 12/03/2024 works", None),
+])
+def test_phone_extraction(text, phone):
+    assert extract_entities(text).get("phone") == phone
+
+
+@pytest.mark.parametrize("text", ["can we meet on 2024-01-15 10:00", "our order 1234567890 failed"])
+def test_scheduling_and_support_messages_need_the_model(text):
+    assert needs_llm([text])
+
+
+@pytest.mark.parametrize("text", [
+    "not interested anymore", "no thanks, forget it", "stop messaging me", "this is useless", "you guys suck"
+])
+def test_withdrawal_and_negative_messages_need_the_model(text):
+    assert needs_llm([text])
+
+
+def test_contact_details_alone_are_scored_locally():
+    assert not needs_llm(["jane@acme.com", "my phone 9876543210"])
+
+
+def test_model_result_is_not_overridden_by_patterns():
+    analysis = {"new_entities": {}, "intent": "support", "sentiment": "neutral"}
+    result = apply_rules(analysis, {}, "my phone 9876543210", extract=False)
+    assert result["new_entities"] == {}
+    assert apply_rules(analysis, {}, "my phone 9876543210")["new_entities"] == {"phone": "9876543210"}
+
+
+def test_plan_pattern_follows_catalog_reload(tmp_path, monkeypatch):
+    from app.agent import rules
+    from app.agent.catalog import Catalog
+
+    path = tmp_path / "catalog.json"
+    path.write_text('{"pricing": {"basic": {}}}')
+    test_catalog = Catalog(str(path))
+    test_catalog.check_interval = 0
+    monkeypatch.setattr(rules, "catalog", test_catalog)
+    assert extract_entities("I want the basic plan")["plan_interest"] == "basic"
+    assert "plan_interest" not in extract_entities("interested in growth")
+
+    path.write_text('{"pricing": {"basic": {}, "growth": {}}}')
+    os.utime(path, ns=(0, path.stat().st_mtime_ns + 1_000_000_000))
+    assert extract_entities("interested in growth")["plan_interest"] == "growth"
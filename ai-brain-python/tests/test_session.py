@@ -0,0 +1,52 @@
+import asyncio
+
+from langchain_core.messages import HumanMessage
+
+from app.agent import analysis_queue as queue_module
+from app.agent.analysis_queue import AnalysisQueue
+from app.agent.memory import ConversationMemory
+
+
+def test_deferred_analysis_entities_reach_the_session(monkeypatch):
+    memory = ConversationMemory()
+    monkeypatch.setattr(queue_module, "memory", memory)
+    seen = {}
+
+    async def analyze_conversation(messages, known_entities, conversation_id=None, offset=0):
+        seen["offset"] = offset
+        return {"new_entities": {"email": "bob@example.com", "phone": None}, "should_notify_sales": False}
+
+    monkeypatch.setattr(queue_module, "analyze_conversation", analyze_conversation)
+
+    async def scenario():
+        queue = AnalysisQueue()
+        await memory.save_session("s1", [{"role": "user", "content": "bob@example.com"}], {"name": "Bob"})
+        queue.submit([HumanMessage(content="bob@example.com")], {"name": "Bob"}, "s1", offset=6, session_id="s1")
+        for _ in range(100):
+            session = await memory.get_session("s1")
+            if "email" in session["known_entities"]:
+                break
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return session
+
+    session = asyncio.run(scenario())
+    assert session["known_entities"] == {"name": "Bob", "email": "bob@example.com"}
+    assert seen["offset"] == 6
+
+
+def test_saving_a_turn_keeps_entities_merged_meanwhile():
+    memory = ConversationMemory()
+    memory.max_messages = 2
+
+    async def scenario():
+        await memory.save_session("s1", [{"role": "user", "content": "hi"}], {})
+        await memory.merge_entities("s1", {"email": "bob@example.com"})
+        history = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"},
+                   {"role": "user", "content": "pricing?"}]
+        await memory.save_session("s1", history, {"name": "Bob"})
+        return await memory.get_session("s1")
+
+    session = asyncio.run(scenario())
+    assert session["known_entities"] == {"email": "bob@example.com", "name": "Bob"}
+    assert session["offset"] == 1
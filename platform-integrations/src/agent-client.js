@@ -10,7 +10,7 @@ class AgentClient {
     });
   }
 
-  async chat(userId, platform, message, history = [], knownEntities = {}) {
+  async chat(userId, platform, message, history = [], knownEntities = {}, idempotencyKey = null) {
     try {
       const payload = {
         user_id: userId,
@@ -18,14 +18,18 @@ class AgentClient {
         message: message,
         history: history,
         platform_data: {},
-        known_entities: knownEntities
+        known_entities: knownEntities,
+        // Leave the agent time to answer (degraded if needed) before our own timeout fires
+        deadline_ms: this.client.defaults.timeout - 2000
       };
 
       console.log('\n🚀 AGENT API REQUEST:');
       console.log('URL:', `${this.baseURL}/agent/chat`);
       console.log('Payload:', JSON.stringify(payload, null, 2));
 
-      const response = await this.client.post('/agent/chat', payload);
+      // Retries with the same key reuse the original reply instead of re-running the agent
+      const config = idempotencyKey ? { headers: { 'Idempotency-Key': idempotencyKey } } : {};
+      const response = await this.client.post('/agent/chat', payload, config);
 
       console.log('\n✅ AGENT API RESPONSE:');
       console.log('Status:', response.status);
@@ -49,6 +53,80 @@ class AgentClient {
       };
     }
   }
+
+  async chatStream(userId, platform, message, history = [], knownEntities = {}, onEvent = () => {}) {
+    const payload = {
+      user_id: userId,
+      platform: platform,
+      message: message,
+      history: history,
+      platform_data: {},
+      known_entities: knownEntities
+    };
+
+    console.log('\n🚀 AGENT STREAM REQUEST:');
+    console.log('URL:', `${this.baseURL}/agent/chat/stream`);
+
+    try {
+      const response = await this.client.post('/agent/chat/stream', payload, {
+        responseType: 'stream',
+        headers: { Accept: 'text/event-stream' }
+      });
+
+      const result = {
+        user_id: userId,
+        platform: platform,
+        response: '',
+        success: false,
+        metadata: null
+      };
+      let buffer = '';
+
+      await new Promise((resolve, reject) => {
+        response.data.on('data', (chunk) => {
+          buffer += chunk.toString('utf8');
+          let boundary;
+          while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const raw = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = 'message';
+            let data = '';
+            for (const line of raw.split('\n')) {
+              if (line.startsWith('event: ')) event = line.slice(7);
+              else if (line.startsWith('data: ')) data += line.slice(6);
+            }
+            const parsed = data ? JSON.parse(data) : {};
+
+            if (event === 'response') result.response = parsed.response;
+            else if (event === 'metadata') result.metadata = parsed;
+            else if (event === 'done') result.success = true;
+            else if (event === 'error') result.error = parsed.detail;
+
+            onEvent(event, parsed);
+          }
+        });
+        response.data.on('end', resolve);
+        response.data.on('error', reject);
+      });
+
+      console.log('\n✅ AGENT STREAM COMPLETE:', result.success ? 'ok' : result.error);
+
+      return {
+        success: result.success,
+        error: result.error,
+        data: result.success ? result : null
+      };
+    } catch (error) {
+      console.error('\n❌ AGENT STREAM ERROR:');
+      console.error('Message:', error.message);
+      return {
+        success: false,
+        error: error.message,
+        data: null
+      };
+    }
+  }
 }
 
 module.exports = AgentClient;